@@ -0,0 +1,35 @@
+import sys
+import types
+from unittest import mock
+
+
+def _stub_gi():
+    gobject = types.SimpleNamespace(GObject=object, Property=lambda *args, **kwargs: None)
+    repository = types.ModuleType("gi.repository")
+    repository.GObject = gobject
+    for name in ("GLib", "Gdk", "GdkPixbuf", "Pango", "PangoCairo"):
+        setattr(repository, name, mock.MagicMock(name=name))
+    gi = types.ModuleType("gi")
+    gi.require_version = lambda *args, **kwargs: None
+    gi.repository = repository
+    sys.modules["gi"] = gi
+    sys.modules["gi.repository"] = repository
+
+
+def _stub_cairo():
+    cairo = mock.MagicMock(name="cairo")
+    cairo.FORMAT_ARGB32 = 0
+    cairo.FORMAT_RGB24 = 1
+    sys.modules["cairo"] = cairo
+
+
+try:
+    import gi
+    from gi.repository import GObject, GdkPixbuf
+except (ImportError, ValueError):
+    _stub_gi()
+
+try:
+    import cairo
+except ImportError:
+    _stub_cairo()
@@ -0,0 +1,66 @@
+import fitz
+import pytest
+
+from word_sys_pdf_editor import pdf_handler
+
+
+@pytest.fixture
+def image_path(tmp_path):
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 120, 120))
+    pix.set_rect(pix.irect, (30, 140, 90))
+    path = tmp_path / "stamp.png"
+    pix.save(path)
+    return str(path)
+
+
+def _image_xrefs(doc):
+    return {info[0] for page in doc for info in page.get_images()}
+
+
+def test_repeat_placements_share_one_xref(image_path):
+    doc = fitz.open()
+    for _ in range(4):
+        doc.new_page()
+    for page_number in range(4):
+        assert pdf_handler.add_image_to_page(doc, page_number, image_path, fitz.Rect(10, 10, 110, 110)) == (True, None)
+    assert len(_image_xrefs(doc)) == 1
+    pdf_handler.close_pdf_document(doc)
+
+
+def test_stale_registry_entry_is_not_reused(image_path):
+    doc = fitz.open()
+    doc.new_page()
+    doc.new_page()
+    pdf_handler.add_image_to_page(doc, 0, image_path, fitz.Rect(10, 10, 110, 110))
+    registry = pdf_handler.get_session(doc).image_registry
+    digest = next(iter(registry))
+    registry[digest] = (doc.page_xref(0), registry[digest][1])
+
+    assert pdf_handler.add_image_to_page(doc, 1, image_path, fitz.Rect(10, 10, 110, 110)) == (True, None)
+    xref = doc.load_page(1).get_images()[0][0]
+    assert doc.xref_get_key(xref, "Subtype") == ("name", "/Image")
+    pdf_handler.close_pdf_document(doc)
+
+
+@pytest.mark.parametrize("profile", sorted(pdf_handler.SAVE_PROFILES))
+def test_full_save_merges_identical_streams(image_path, tmp_path, profile):
+    source = tmp_path / "duplicates.pdf"
+    with fitz.open() as build:
+        for _ in range(3):
+            build.new_page()
+        original = build.load_page(0).insert_image(fitz.Rect(0, 0, 100, 100), filename=image_path)
+        for page_number in (1, 2):
+            copy_xref = build.get_new_xref()
+            build.update_object(copy_xref, build.xref_object(original))
+            build.update_stream(copy_xref, build.xref_stream_raw(original), compress=False)
+            build.load_page(page_number).insert_image(fitz.Rect(0, 0, 100, 100), xref=copy_xref)
+        build.save(source)
+
+    doc = fitz.open(source)
+    assert len(_image_xrefs(doc)) == 3
+    out = tmp_path / "merged.pdf"
+    assert pdf_handler.save_document(doc, str(out), profile=profile) == (True, None)
+    assert pdf_handler.xref_epoch(doc) == 0
+    with fitz.open(out) as saved:
+        assert len(_image_xrefs(saved)) < 3
+    pdf_handler.close_pdf_document(doc)
@@ -0,0 +1,111 @@
+import subprocess
+
+import fitz
+import pytest
+
+from word_sys_pdf_editor import pdf_handler
+from word_sys_pdf_editor.models import EditableShape
+
+
+def _shape(page_number, x, y, size=30):
+    shape = EditableShape(EditableShape.SHAPE_RECTANGLE, (x, y, x + size, y + size),
+                          fill_color=(0.2, 0.6, 0.2), page_number=page_number, is_new=True)
+    return shape
+
+
+def _drawing_rects(doc, page_number):
+    return [tuple(round(v) for v in d["rect"]) for d in doc.load_page(page_number).get_drawings()]
+
+
+@pytest.fixture
+def doc(tmp_path):
+    path = tmp_path / "source.pdf"
+    with fitz.open() as source:
+        source.new_page()
+        source.new_page()
+        source.load_page(1).insert_text((72, 72), "Original text", fontsize=12)
+        source.save(path)
+    document = fitz.open(path)
+    yield document
+    pdf_handler.close_pdf_document(document)
+
+
+def test_add_and_remove_layer(doc):
+    kept, removed = _shape(1, 50, 50), _shape(1, 200, 200)
+    assert pdf_handler.apply_object_edit(doc, kept) == (True, None)
+    assert pdf_handler.apply_object_edit(doc, removed) == (True, None)
+    assert len(_drawing_rects(doc, 1)) == 2
+
+    assert pdf_handler.remove_object_edit(doc, removed)
+    assert _drawing_rects(doc, 1) == [(50, 50, 80, 80)]
+    assert not pdf_handler.remove_object_edit(doc, removed)
+    assert "Original text" in doc.load_page(1).get_text()
+
+
+def test_reapplying_an_owner_replaces_its_layer(doc):
+    shape = _shape(0, 50, 50)
+    pdf_handler.apply_object_edit(doc, shape)
+    shape.set_position(300, 300)
+    pdf_handler.apply_object_edit(doc, shape)
+    assert _drawing_rects(doc, 0) == [(300, 300, 330, 330)]
+
+
+@pytest.mark.parametrize("profile", sorted(pdf_handler.SAVE_PROFILES))
+def test_layer_removal_after_save(doc, tmp_path, profile):
+    shapes = [_shape(1, 40 * i, 100) for i in range(1, 4)]
+    for shape in shapes:
+        pdf_handler.apply_object_edit(doc, shape)
+    epoch = pdf_handler.xref_epoch(doc)
+
+    out = tmp_path / f"{profile}.pdf"
+    assert pdf_handler.save_document(doc, str(out), profile=profile) == (True, None)
+    assert pdf_handler.xref_epoch(doc) == epoch
+
+    assert pdf_handler.remove_object_edit(doc, shapes[1])
+    assert sorted(_drawing_rects(doc, 1)) == [(40, 100, 70, 130), (120, 100, 150, 130)]
+    with fitz.open(out) as saved:
+        assert len(saved.load_page(1).get_drawings()) == 3
+
+
+def test_layer_removal_after_export(doc, tmp_path, monkeypatch):
+    shapes = [_shape(1, 40 * i, 100) for i in range(1, 3)]
+    for shape in shapes:
+        pdf_handler.apply_object_edit(doc, shape)
+    page_xref = doc.page_xref(1)
+    exported = {}
+
+    def fake_run(command, **kwargs):
+        source = command[-1]
+        with fitz.open(source) as temp:
+            exported["drawings"] = len(temp.load_page(1).get_drawings())
+        outdir = command[command.index("--outdir") + 1]
+        stem = source.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+        with open(f"{outdir}/{stem}.odt", "wb") as f:
+            f.write(b"odt")
+        return subprocess.CompletedProcess(command, 0, "", "")
+
+    monkeypatch.setattr(pdf_handler.shutil, "which", lambda name: "/usr/bin/soffice")
+    monkeypatch.setattr(pdf_handler.subprocess, "run", fake_run)
+    assert pdf_handler.export_pdf_as_odt(doc, None, str(tmp_path / "out.odt")) == (True, None)
+    assert exported["drawings"] == 2
+
+    assert doc.page_xref(1) == page_xref
+    assert pdf_handler.remove_object_edit(doc, shapes[0])
+    assert _drawing_rects(doc, 1) == [(80, 100, 110, 130)]
+
+
+def test_layer_forms_do_not_carry_earlier_layers(doc):
+    for i in range(40):
+        pdf_handler.apply_object_edit(doc, _shape(0, 10 + i * 5, 10, size=4))
+    layers = pdf_handler.get_session(doc).layers[doc.page_xref(0)]
+    forms = [layer["form"] for _, layer in layers.values()]
+    assert "WsLyr" not in doc.xref_object(forms[-1])
+    assert doc.xref_get_key(forms[-1], "Resources") == doc.xref_get_key(forms[1], "Resources")
+
+
+def test_flatten_keeps_content_and_drops_layer_tracking(doc):
+    shape = _shape(1, 60, 60)
+    pdf_handler.apply_object_edit(doc, shape)
+    assert pdf_handler.flatten_object_layers(doc, 1)
+    assert not pdf_handler.remove_object_edit(doc, shape)
+    assert _drawing_rects(doc, 1) == [(60, 60, 90, 90)]
@@ -0,0 +1,74 @@
+import os
+
+from word_sys_pdf_editor.snapshot_store import PageSnapshotStore
+
+
+def _content(page_num, size=20000):
+    return os.urandom(size // 2) + (b"%d BT ET\n" % page_num) * (size // 20)
+
+
+def test_round_trip_in_memory():
+    store = PageSnapshotStore()
+    store.put(0, b"q 1 0 0 1 0 0 cm Q")
+    assert 0 in store
+    assert store.get(0) == b"q 1 0 0 1 0 0 cm Q"
+    assert store.get(1) is None
+
+
+def test_spilled_pages_round_trip_from_disk():
+    store = PageSnapshotStore(memory_limit=30000)
+    contents = {page: _content(page) for page in range(8)}
+    for page, content in contents.items():
+        store.put(page, content)
+
+    usage = store.memory_usage()
+    assert usage["pages"] == 8
+    assert usage["memory_bytes"] <= 30000
+    assert usage["disk_bytes"] > 0
+    assert usage["raw_bytes"] == sum(len(c) for c in contents.values())
+
+    for page in (0, 5, 1, 7, 0, 3):
+        assert store.get(page) == contents[page]
+    assert len(store) == 8
+    store.close()
+
+
+def test_replace_and_discard_spilled_page():
+    store = PageSnapshotStore(memory_limit=30000)
+    for page in range(6):
+        store.put(page, _content(page))
+
+    store.put(0, b"replacement")
+    assert store.get(0) == b"replacement"
+
+    store.discard(1)
+    assert 1 not in store
+    assert store.get(1) is None
+    assert len(store) == 5
+
+
+def test_disk_space_is_compacted_after_reads():
+    store = PageSnapshotStore(memory_limit=30000)
+    contents = {page: _content(page) for page in range(10)}
+    for page, content in contents.items():
+        store.put(page, content)
+
+    for _ in range(3):
+        for page, content in contents.items():
+            assert store.get(page) == content
+    usage = store.memory_usage()
+    assert store._spill_dead * 2 <= store._spill_end
+    assert usage["disk_bytes"] == sum(length for _, length in store._spilled.values())
+
+
+def test_clear_and_close():
+    store = PageSnapshotStore(memory_limit=30000)
+    for page in range(6):
+        store.put(page, _content(page))
+    store.clear()
+    assert len(store) == 0
+    assert store.memory_usage()["disk_bytes"] == 0
+    store.put(2, b"after clear")
+    assert store.get(2) == b"after clear"
+    store.close()
+    assert len(store) == 0
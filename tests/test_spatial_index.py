@@ -0,0 +1,94 @@
+import random
+
+from word_sys_pdf_editor.spatial_index import SpatialIndex
+
+
+class Box:
+    def __init__(self, bbox):
+        self.bbox = bbox
+
+
+def _random_boxes(count, seed=7):
+    rng = random.Random(seed)
+    boxes = []
+    for _ in range(count):
+        x, y = rng.uniform(0, 600), rng.uniform(0, 800)
+        boxes.append(Box((x, y, x + rng.uniform(1, 120), y + rng.uniform(1, 40))))
+    return boxes
+
+
+def _brute_point(boxes, x, y, tolerance=0.0):
+    return {id(b) for b in boxes
+            if b.bbox[0] - tolerance <= x <= b.bbox[2] + tolerance
+            and b.bbox[1] - tolerance <= y <= b.bbox[3] + tolerance}
+
+
+def _brute_rect(boxes, rect):
+    x1, y1, x2, y2 = rect
+    return {id(b) for b in boxes
+            if b.bbox[0] <= x2 and x1 <= b.bbox[2] and b.bbox[1] <= y2 and y1 <= b.bbox[3]}
+
+
+def test_point_and_rect_queries_match_brute_force():
+    boxes = _random_boxes(300)
+    index = SpatialIndex()
+    for box in boxes:
+        index.insert(box)
+    bulk = SpatialIndex.bulk(boxes, [b.bbox for b in boxes])
+
+    rng = random.Random(3)
+    for _ in range(200):
+        x, y = rng.uniform(-10, 700), rng.uniform(-10, 850)
+        expected = _brute_point(boxes, x, y, 2.0)
+        assert {id(b) for b in index.query_point(x, y, 2.0)} == expected
+        assert {id(b) for b in bulk.query_point(x, y, 2.0)} == expected
+
+        rect = (x, y, x + rng.uniform(0, 200), y + rng.uniform(0, 200))
+        assert {id(b) for b in index.query_rect(rect)} == _brute_rect(boxes, rect)
+
+
+def test_query_rect_accepts_reversed_corners():
+    box = Box((10, 10, 20, 20))
+    index = SpatialIndex()
+    index.insert(box)
+    assert index.query_rect((25, 25, 15, 15)) == [box]
+
+
+def test_hits_are_returned_newest_first():
+    bottom, middle, top = Box((0, 0, 100, 100)), Box((10, 10, 90, 90)), Box((20, 20, 80, 80))
+    index = SpatialIndex()
+    for box in (bottom, middle, top):
+        index.insert(box)
+    assert index.query_point(50, 50) == [top, middle, bottom]
+
+
+def test_update_and_remove():
+    box, other = Box((0, 0, 10, 10)), Box((500, 500, 510, 510))
+    index = SpatialIndex()
+    index.insert(box)
+    index.insert(other)
+
+    box.bbox = (300, 300, 320, 320)
+    index.update(box)
+    assert index.query_point(5, 5) == []
+    assert index.query_point(310, 310) == [box]
+
+    index.remove(box)
+    assert box not in index
+    assert len(index) == 1
+    assert index.query_point(310, 310) == []
+
+    replacement = Box((300, 300, 320, 320))
+    index.insert(replacement)
+    assert index.query_point(310, 310) == [replacement]
+
+
+def test_oversized_items_are_found_everywhere_they_cover():
+    page = Box((-5000, -5000, 5000, 5000))
+    small = Box((100, 100, 110, 110))
+    index = SpatialIndex(cell_size=8)
+    index.insert(page)
+    index.insert(small)
+    assert index.query_point(105, 105) == [small, page]
+    assert index.query_point(4000, -4000) == [page]
+    assert index.query_rect((6000, 6000, 7000, 7000)) == []
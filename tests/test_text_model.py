@@ -0,0 +1,81 @@
+import fitz
+import pytest
+
+from word_sys_pdf_editor.text_model import PageTextModel
+
+
+@pytest.fixture
+def page():
+    doc = fitz.open()
+    page = doc.new_page(width=400, height=300)
+    page.insert_text((40, 60), "Left column first line", fontsize=11)
+    page.insert_text((40, 80), "Left column second", fontsize=11)
+    page.insert_text((230, 60), "Right side text", fontsize=14, fontname="tiro")
+    page.insert_text((40, 200), "A heading that spans the whole page width", fontsize=11)
+    yield page
+    doc.close()
+
+
+def _model(page):
+    return PageTextModel.from_text_dict(page.get_text("dict"), page.get_text("words"))
+
+
+def test_words_match_get_text_words(page):
+    words = page.get_text("words")
+    model = _model(page)
+    assert model.word_count == len(words)
+    for i, word in enumerate(words):
+        assert model.word_text(i) == word[4]
+        assert tuple(model.word_bboxes[i]) == pytest.approx(word[:4])
+        line = model.word_lines[i]
+        assert line >= 0
+        assert word[4] in model.line_text(line)
+
+
+def test_word_hits_agree_with_word_boxes(page):
+    words = page.get_text("words")
+    model = _model(page)
+    for x in range(0, 400, 7):
+        for y in range(0, 300, 7):
+            expected = [i for i, w in enumerate(words) if w[0] <= x <= w[2] and w[1] <= y <= w[3]]
+            assert model.words_at_point(x, y).tolist() == expected
+
+    for word in words:
+        cx, cy = (word[0] + word[2]) / 2, (word[1] + word[3]) / 2
+        hits = model.words_at_point(cx, cy)
+        assert word[4] in [model.word_text(i) for i in hits]
+
+
+def test_line_queries(page):
+    model = _model(page)
+    texts = [model.line_text(i) for i in range(len(model))]
+    assert "Right side text" in texts
+
+    right = texts.index("Right side text")
+    x0, y0, x1, y1 = model.line_bboxes[right]
+    assert right in model.lines_at_point((x0 + x1) / 2, (y0 + y1) / 2).tolist()
+    assert model.font_sizes[right] == pytest.approx(14)
+    assert model.line_font(right) != model.line_font(texts.index("Left column second"))
+
+
+def test_line_hits_use_dict_line_boxes(page):
+    model = _model(page)
+    lines = [line for block in page.get_text("dict")["blocks"] if block["type"] == 0
+             for line in block["lines"]]
+    assert len(lines) == len(model)
+    for line in lines:
+        x0, y0, x1, y1 = line["bbox"]
+        hit = model.lines_at_point((x0 + x1) / 2, (y0 + y1) / 2)[0]
+        assert tuple(model.line_hit_bboxes[hit]) == pytest.approx(line["bbox"])
+        assert model.line_raw_text(hit) == "".join(span["text"] for span in line["spans"])
+
+
+def test_empty_page():
+    doc = fitz.open()
+    page = doc.new_page()
+    model = _model(page)
+    assert len(model) == 0
+    assert model.word_count == 0
+    assert model.words_at_point(10, 10).tolist() == []
+    assert model.lines_at_point(10, 10).tolist() == []
+    doc.close()
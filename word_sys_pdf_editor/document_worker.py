@@ -0,0 +1,49 @@
+import queue
+import threading
+import traceback
+
+from gi.repository import GLib
+
+class WorkerTicket:
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class DocumentWorker:
+    def __init__(self, name="document-worker"):
+        self.name = name
+        self._jobs = queue.Queue()
+        self._thread = None
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def submit(self, func, callback=None, *args):
+        ticket = WorkerTicket()
+        self._jobs.put((ticket, func, callback, args))
+        self._ensure_thread()
+        return ticket
+
+    def _run(self):
+        while True:
+            ticket, func, callback, args = self._jobs.get()
+            if ticket.cancelled:
+                continue
+            result, error = None, None
+            try:
+                result = func(ticket, *args)
+            except Exception as e:
+                traceback.print_exc()
+                error = str(e)
+            if ticket.cancelled or callback is None:
+                continue
+            GLib.idle_add(self._deliver, ticket, callback, result, error)
+
+    def _deliver(self, ticket, callback, result, error):
+        if not ticket.cancelled:
+            callback(ticket, result, error)
+        return GLib.SOURCE_REMOVE
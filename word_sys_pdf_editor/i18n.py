@@ -65,8 +65,28 @@ _STRINGS = {
         "loaded": "Loaded: {}",
         "new_doc_loaded": "New document loaded.",
         "saving": "Saving {}…",
-        "saved": "Saved and reloaded: {}",
+        "saved": "Saved: {}",
         "save_failed": "Save failed.",
+        "saving_progress": "Saving {}… {}%",
+        "save_cancelled": "Save cancelled. The file was not changed.",
+        "save_cancelling": "Cancelling save…",
+        "saving_phase_serialize": "Saving {}: preparing the document…",
+        "saving_phase_compress": "Saving {}: compressing…",
+        "saving_phase_incremental": "Saving {}: appending changes to the file…",
+        "save_in_progress": "A save is already in progress.",
+        "close_after_save": "Closing after the save finishes…",
+        "btn_cancel_save": "Cancel Save",
+        "saved_stats": "Saved: {} ({:.1f} MB in {:.2f} s, {})",
+        "menu_save_profile": "Save Profile",
+        "save_profile_fast": "Fast",
+        "save_profile_balanced": "Balanced",
+        "save_profile_smallest": "Smallest",
+        "save_profile_incremental": "incremental update",
+        "menu_optimize_images": "Optimize Images",
+        "font_subset_stats": " — embedded fonts {:.0f} KB → {:.0f} KB",
+        "optimizing_images": "Optimizing images…",
+        "optimizing_images_progress": "Optimizing images… {}%",
+        "images_optimized": "{} images optimized: {:.1f} MB → {:.1f} MB",
         "doc_load_failed": "Document could not be loaded.",
         "scan_fonts": "Scanning system fonts…",
         "unsaved_changes": "There are unsaved changes. Do you want to save before closing/opening?",
@@ -111,8 +131,11 @@ _STRINGS = {
         "btn_save": "Save",
         "undo_tip": "Undo (Ctrl+Z)",
         "redo_tip": "Redo (Ctrl+Y)",
+        "undo_history_tip": "{} — {} undo / {} redo steps kept ({} MB)",
         "print_tip": "Print (Ctrl+P)",
         "menu_save_as": "Save As…",
+        "menu_optimize_save": "Optimize and Save",
+        "save_tip": "Save (Ctrl+S)",
         "menu_export_as": "Export As…",
         "menu_about": "About",
         "menu_quit": "Quit",
@@ -202,8 +225,28 @@ _STRINGS = {
         "loaded": "Yüklendi: {}",
         "new_doc_loaded": "Yeni belge yüklendi.",
         "saving": "{} kaydediliyor…",
-        "saved": "Kaydedildi ve yeniden yüklendi: {}",
+        "saved": "Kaydedildi: {}",
         "save_failed": "Kaydetme başarısız oldu.",
+        "saving_progress": "{} kaydediliyor… %{}",
+        "save_cancelled": "Kaydetme iptal edildi. Dosya değiştirilmedi.",
+        "save_cancelling": "Kaydetme iptal ediliyor…",
+        "saving_phase_serialize": "{} kaydediliyor: belge hazırlanıyor…",
+        "saving_phase_compress": "{} kaydediliyor: sıkıştırılıyor…",
+        "saving_phase_incremental": "{} kaydediliyor: değişiklikler dosyaya ekleniyor…",
+        "save_in_progress": "Bir kaydetme işlemi zaten sürüyor.",
+        "close_after_save": "Kaydetme bitince kapatılacak…",
+        "btn_cancel_save": "Kaydetmeyi İptal Et",
+        "saved_stats": "Kaydedildi: {} ({:.1f} MB, {:.2f} sn, {})",
+        "menu_save_profile": "Kayıt Profili",
+        "save_profile_fast": "Hızlı",
+        "save_profile_balanced": "Dengeli",
+        "save_profile_smallest": "En Küçük",
+        "save_profile_incremental": "artımlı güncelleme",
+        "menu_optimize_images": "Resimleri İyileştir",
+        "font_subset_stats": " — gömülü fontlar {:.0f} KB → {:.0f} KB",
+        "optimizing_images": "Resimler iyileştiriliyor…",
+        "optimizing_images_progress": "Resimler iyileştiriliyor… %{}",
+        "images_optimized": "{} resim iyileştirildi: {:.1f} MB → {:.1f} MB",
         "doc_load_failed": "Doküman yüklenemedi.",
         "scan_fonts": "Sistem fontları taranıyor…",
         "unsaved_changes": "Kaydedilmemiş değişiklikler var. Kapatmadan/açmadan önce kaydetmek ister misiniz?",
@@ -254,8 +297,11 @@ _STRINGS = {
         "btn_save": "Kaydet",
         "undo_tip": "Geri Al (Ctrl+Z)",
         "redo_tip": "Yinele (Ctrl+Y)",
+        "undo_history_tip": "{} — {} geri alma / {} yineleme adımı saklanıyor ({} MB)",
         "print_tip": "Yazdır (Ctrl+P)",
         "menu_save_as": "Farklı Kaydet…",
+        "menu_optimize_save": "Optimize Et ve Kaydet",
+        "save_tip": "Kaydet (Ctrl+S)",
         "menu_export_as": "Farklı Dışarı Çıkart…",
         "menu_about": "Hakkında",
         "menu_quit": "Kapat",
@@ -312,6 +358,13 @@ def _save_settings(data: dict):
 _settings = _load_settings()
 _active_lang: str = _settings.get("language", "en")
 
+def get_setting(key: str, default=None):
+    return _settings.get(key, default)
+
+def set_setting(key: str, value):
+    _settings[key] = value
+    _save_settings(_settings)
+
 def get_language() -> str:
     return _active_lang
 
@@ -0,0 +1,33 @@
+import time
+import zlib
+
+import fitz
+import numpy as np
+
+LINE_ART_MAX_COLORS = 16
+LINE_ART_SAMPLE = 65536
+
+def _is_line_art(samples, components):
+    pixels = np.frombuffer(samples, dtype=np.uint8).reshape(-1, components)
+    if len(pixels) > LINE_ART_SAMPLE:
+        pixels = pixels[::len(pixels) // LINE_ART_SAMPLE]
+    if components == 1:
+        return len(np.unique(pixels)) <= LINE_ART_MAX_COLORS
+    packed = pixels[:, 0].astype(np.uint32) << 16 | pixels[:, 1].astype(np.uint32) << 8 | pixels[:, 2]
+    return len(np.unique(packed)) <= LINE_ART_MAX_COLORS
+
+def recompress_image(args):
+    samples, width, height, components, target_width, target_height, quality = args
+    started = time.perf_counter()
+    colorspace = fitz.csGRAY if components == 1 else fitz.csRGB
+    pix = fitz.Pixmap(colorspace, width, height, samples, False)
+    if (target_width, target_height) != (width, height):
+        pix = fitz.Pixmap(pix, target_width, target_height, None)
+
+    if _is_line_art(pix.samples, components):
+        data = zlib.compress(pix.samples, 9)
+        image_filter = "FlateDecode"
+    else:
+        data = pix.tobytes("jpeg", jpg_quality=quality)
+        image_filter = "DCTDecode"
+    return data, image_filter, pix.width, pix.height, time.perf_counter() - started
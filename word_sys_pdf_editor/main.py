@@ -38,7 +38,8 @@ class PdfEditorApplication(Adw.Application):
         if self.window:
              if self.window.check_unsaved_changes():
                   return
-             self.window.close_document()
+             if not self.window.close_document(lambda: self.on_quit(action, param)):
+                  return
 
         print("Quitting application.")
         self.quit()
@@ -1,5 +1,6 @@
 from gi.repository import GObject, GdkPixbuf
 from .utils import normalize_color
+from . import text_metrics
 import re
 import copy
 
@@ -15,7 +16,87 @@ BASE14_FALLBACK_MAP = {
     'courier': 'cour', 'couriernew': 'cour', 'mono': 'cour', 'monospace': 'cour', 'consolas': 'cour'
 }
 
+def capture_state(obj):
+    return {name: getattr(obj, name) for name in obj.STATE_FIELDS if hasattr(obj, name)}
+
+def restore_state(obj, state):
+    for name, value in state.items():
+        setattr(obj, name, value)
+
+_STYLE_PATTERNS = [
+    (re.compile(r"([-_ ]?(BoldItalic|BoldOblique|BdI|Z|BI))$", re.IGNORECASE), "BoldItalic"),
+    (re.compile(r"([-_ ]?(Bold|Bd|Heavy|Black|DemiBold|SmBd|SemiBold))$", re.IGNORECASE), "Bold"),
+    (re.compile(r"([-_ ]?(Italic|It|Oblique|Kursiv|I|Obl))$", re.IGNORECASE), "Italic"),
+    (re.compile(r"([-_ ]?(Regular|Roman|Normal|Medium|Book|Rg|Text))$", re.IGNORECASE), "Regular"),
+]
+
+_font_name_cache = {}
+
+def _parse_font_name(pdf_font_name):
+    cached = _font_name_cache.get(pdf_font_name)
+    if cached is not None:
+        return cached
+
+    style_bold = style_italic = False
+    name_after_prefix_removal = re.sub(r'^[A-Z]{6}\+', '', pdf_font_name)
+    temp_name = name_after_prefix_removal
+    for pattern, style_tag in _STYLE_PATTERNS:
+        m = pattern.search(temp_name)
+        if m:
+            if style_tag == "BoldItalic":
+                style_bold = style_italic = True
+            elif style_tag == "Bold":
+                style_bold = True
+            elif style_tag == "Italic":
+                style_italic = True
+            temp_name = temp_name[:m.start()].strip("-_ ")
+
+    cleaned_family_name = temp_name if temp_name else name_after_prefix_removal
+    cleaned_family_name = re.sub(r'(PSMT|PS|MT)$', '', cleaned_family_name, flags=re.IGNORECASE).strip()
+    cleaned_family_name_spaced = re.sub(r"(\w)([A-Z])", r"\1 \2", cleaned_family_name)
+    base_name = ' '.join(word.capitalize() for word in cleaned_family_name_spaced.replace('-', ' ').replace('_', ' ').split())
+
+    font_fallback_used = False
+    lower_base = base_name.lower().replace(" ", "")
+    sans_aliases = ("arial", "helvetica", "calibri")
+    serif_aliases = ("times", "timesnewroman")
+
+    if lower_base in sans_aliases or any(lower_base.startswith(a) for a in sans_aliases):
+        base_name = "Liberation Sans"
+    elif lower_base in serif_aliases or any(lower_base.startswith(a) for a in serif_aliases):
+        base_name = "Liberation Serif"
+    elif lower_base not in ["liberationsans", "liberationserif", "dejavusans", "notosans", "courier", "ubuntu", "comic"]:
+        if "serif" in lower_base:
+            base_name = "Liberation Serif"
+        else:
+            base_name = "Liberation Sans"
+        font_fallback_used = base_name
+
+    if not base_name or base_name == "Unknown":
+        base_name = "Liberation Sans"
+        font_fallback_used = "Liberation Sans"
+
+    normalized_for_base14 = re.sub(r'[^a-zA-Z0-9]', '', base_name).lower()
+    base14 = 'helv'
+    for name_key, base14_val in BASE14_FALLBACK_MAP.items():
+        if name_key in normalized_for_base14:
+            base14 = base14_val
+            break
+
+    cached = (style_bold, style_italic, base_name, font_fallback_used, base14)
+    _font_name_cache[pdf_font_name] = cached
+    return cached
+
 class EditableText:
+    __slots__ = ("x", "y", "text", "original_text", "font_size", "is_new", "original_bbox",
+                 "font_family_original", "is_bold", "is_italic", "is_underline", "font_fallback_used",
+                 "font_family_base", "original_is_bold", "original_is_italic", "pdf_fontname_base14",
+                 "color", "original_color", "selected", "modified", "bbox", "baseline", "page_number",
+                 "is_baked", "_ghost_redacted")
+
+    STATE_FIELDS = ("x", "y", "text", "font_size", "font_family_base", "is_bold", "is_italic",
+                    "is_underline", "color", "bbox", "baseline")
+
     def __init__(self, x, y, text, font_size=11, font_family="Liberation Sans",
                  color=(0, 0, 0), span_data=None, is_new=False, baseline=None):
         
@@ -37,82 +118,16 @@ class EditableText:
 
         self.font_family_original = pdf_font_name_original 
 
-        self.is_bold = bool(flags & FLAG_BOLD) 
-        self.is_italic = bool(flags & FLAG_ITALIC)
+        style_bold, style_italic, base_name, fallback_used, base14 = _parse_font_name(pdf_font_name_original)
+        self.is_bold = bool(flags & FLAG_BOLD) or style_bold
+        self.is_italic = bool(flags & FLAG_ITALIC) or style_italic
         self.is_underline = False
-
-        name_after_prefix_removal = re.sub(r'^[A-Z]{6}\+', '', pdf_font_name_original)
-        
-        potential_family_name = name_after_prefix_removal
-        
-        style_patterns = [
-            (r"(BoldItalic|BoldOblique|BdI|Z|BI)$", "BoldItalic"),
-            (r"(Bold|Bd|Heavy|Black|DemiBold|SmBd|SemiBold)$", "Bold"),
-            (r"(Italic|It|Oblique|Kursiv|I|Obl)$", "Italic"),
-            (r"(Regular|Roman|Normal|Medium|Book|Rg|Text)$", "Regular")
-        ]
-
-        detected_style_parts = [] 
-
-        temp_name = potential_family_name
-        for pattern, style_tag in style_patterns:
-            m = re.search(r"([-_ ]?" + pattern + r")$", temp_name, re.IGNORECASE)
-            if m:
-                if style_tag == "BoldItalic":
-                    if not self.is_bold: self.is_bold = True
-                    if not self.is_italic: self.is_italic = True
-                    detected_style_parts.extend(["Bold", "Italic"])
-                elif style_tag == "Bold":
-                    if not self.is_bold: self.is_bold = True
-                    detected_style_parts.append("Bold")
-                elif style_tag == "Italic":
-                    if not self.is_italic: self.is_italic = True
-                    detected_style_parts.append("Italic")
-                temp_name = temp_name[:m.start()].strip("-_ ")
-        
-        cleaned_family_name = temp_name if temp_name else name_after_prefix_removal
-
-        cleaned_family_name = re.sub(r'(PSMT|PS|MT)$', '', cleaned_family_name, flags=re.IGNORECASE).strip()
-
-        cleaned_family_name_spaced = re.sub(r"(\w)([A-Z])", r"\1 \2", cleaned_family_name)
-        base_name = ' '.join(word.capitalize() for word in cleaned_family_name_spaced.replace('-', ' ').replace('_', ' ').split())
-        
-        self.font_fallback_used = False
-        lower_base = base_name.lower().replace(" ", "")
-        sans_aliases = ("arial", "helvetica", "calibri")
-        serif_aliases = ("times", "timesnewroman")
-        
-        if lower_base in sans_aliases or any(lower_base.startswith(a) for a in sans_aliases):
-            base_name = "Liberation Sans"
-        elif lower_base in serif_aliases or any(lower_base.startswith(a) for a in serif_aliases):
-            base_name = "Liberation Serif"
-        elif lower_base not in ["liberationsans", "liberationserif", "dejavusans", "notosans", "courier", "ubuntu", "comic"]:
-            if "serif" in lower_base:
-                base_name = "Liberation Serif"
-            else:
-                base_name = "Liberation Sans"
-            self.font_fallback_used = base_name
-            
         self.font_family_base = base_name
-        
-        if not self.font_family_base or self.font_family_base == "Unknown":
-            self.font_family_base = "Liberation Sans"
-            self.font_fallback_used = "Liberation Sans"
-        
-        lower_base = self.font_family_base.lower()
-        if not self.is_bold and any(s in lower_base for s in ["bold", "heavy", "black"]):
-             pass 
-        if not self.is_italic and any(s in lower_base for s in ["italic", "oblique"]):
-             pass
+        self.font_fallback_used = fallback_used
+        self.pdf_fontname_base14 = base14
 
         self.original_is_bold = self.is_bold
         self.original_is_italic = self.is_italic
-        normalized_for_base14 = re.sub(r'[^a-zA-Z0-9]', '', self.font_family_base).lower()
-        self.pdf_fontname_base14 = 'helv'
-        for name_key, base14_val in BASE14_FALLBACK_MAP.items():
-            if name_key in normalized_for_base14:
-                self.pdf_fontname_base14 = base14_val
-                break
         
         pdf_color = color
         if span_data and 'color' in span_data:
@@ -122,14 +137,12 @@ class EditableText:
         self.original_color = self.color
 
         self.selected = False
-        self.editing = False
-        self.span_data = span_data
         self.modified = is_new 
 
         if span_data and "bbox" in span_data:
             self.bbox = span_data["bbox"]
         else: 
-            estimated_width = len(self.text) * self.font_size * 0.6 
+            estimated_width = text_metrics.text_width(self.text, self.font_family_base, self.is_bold, self.is_italic, self.font_size)
             self.bbox = (self.x, self.y, self.x + estimated_width, self.y + self.font_size)
 
         if baseline is not None:
@@ -142,11 +155,6 @@ class EditableText:
             self.baseline = float(self.y + (self.font_size * 0.9))
 
         self.page_number = None 
-        self.dragging = False
-        self.drag_start_x = 0
-        self.drag_start_y = 0
-        
-        self.text_spans = []
 
     @property
     def is_link(self):
@@ -159,14 +167,14 @@ class EditableText:
         if start_char >= end_char:
             return [self]
         parts = []
+        xs = text_metrics.char_boundaries(self)
+        x1, y1, x2, y2 = self.bbox
         if start_char > 0:
             pre = copy.deepcopy(self)
             pre.text = text[:start_char]
             pre.original_text = text[:start_char]
             pre.is_new = True
-            x1, y1, x2, y2 = self.bbox
-            ratio = start_char / max(len(text), 1)
-            pre.bbox = (x1, y1, x1 + (x2 - x1) * ratio, y2)
+            pre.bbox = (x1, y1, float(xs[start_char]), y2)
             pre.original_bbox = pre.bbox
             pre.x, pre.y = pre.bbox[0], pre.bbox[1]
             parts.append(pre)
@@ -174,10 +182,7 @@ class EditableText:
         mid.text = text[start_char:end_char]
         mid.original_text = text[start_char:end_char]
         mid.is_new = True
-        x1, y1, x2, y2 = self.bbox
-        r1 = start_char / max(len(text), 1)
-        r2 = end_char / max(len(text), 1)
-        mid.bbox = (x1 + (x2 - x1) * r1, y1, x1 + (x2 - x1) * r2, y2)
+        mid.bbox = (float(xs[start_char]), y1, float(xs[end_char]), y2)
         mid.original_bbox = mid.bbox
         mid.x, mid.y = mid.bbox[0], mid.bbox[1]
         parts.append(mid)
@@ -186,30 +191,58 @@ class EditableText:
             post.text = text[end_char:]
             post.original_text = text[end_char:]
             post.is_new = True
-            x1, y1, x2, y2 = self.bbox
-            ratio = end_char / max(len(text), 1)
-            post.bbox = (x1 + (x2 - x1) * ratio, y1, x2, y2)
+            post.bbox = (float(xs[end_char]), y1, x2, y2)
             post.original_bbox = post.bbox
             post.x, post.y = post.bbox[0], post.bbox[1]
             parts.append(post)
         return parts
 
 class EditableImage:
-    def __init__(self, bbox, page_number, xref, image_bytes, is_new=False):
+    __slots__ = ("bbox", "original_bbox", "x", "y", "page_number", "xref", "_image_bytes", "_image_loader",
+                 "is_new", "selected", "modified", "is_baked", "_ghost_redacted")
+
+    STATE_FIELDS = ("x", "y", "bbox")
+
+    def __init__(self, bbox, page_number, xref, image_bytes=None, is_new=False, image_loader=None):
         self.bbox = bbox
         self.original_bbox = bbox
+        self.x = bbox[0]
+        self.y = bbox[1]
         self.page_number = page_number
         self.xref = xref
-        self.image_bytes = image_bytes
+        self._image_bytes = image_bytes
+        self._image_loader = image_loader
         self.is_new = is_new
         self.selected = False
         self.modified = False
 
+    @property
+    def image_bytes(self):
+        if self._image_bytes is None and self._image_loader is not None:
+            return self._image_loader()
+        return self._image_bytes
+
+    @image_bytes.setter
+    def image_bytes(self, value):
+        self._image_bytes = value
+
+    def pin_image_bytes(self):
+        if self._image_bytes is None:
+            self._image_bytes = self.image_bytes
+        return self._image_bytes
+
 class EditableShape:
     SHAPE_ELLIPSE = "circle"
     SHAPE_RECTANGLE = "rectangle"
     SHAPE_ELLIPSE = "ellipse"
     SHAPE_POLYGON = "polygon"
+
+    __slots__ = ("shape_type", "bbox", "original_bbox", "fill_color", "stroke_color", "original_fill_color",
+                 "original_stroke_color", "stroke_width", "original_stroke_width", "is_transparent", "seqnos",
+                 "source_generation", "paths_loaded", "page_number", "is_new", "selected", "modified", "x", "y",
+                 "is_baked", "_ghost_redacted")
+
+    STATE_FIELDS = ("x", "y", "bbox", "fill_color", "stroke_color", "stroke_width", "is_transparent")
     
     def __init__(self, shape_type, bbox, fill_color=(255, 255, 255), 
                  stroke_color=(0, 0, 0), stroke_width=1.0, page_number=None, is_new=False, is_transparent=True):
@@ -225,16 +258,15 @@ class EditableShape:
         self.stroke_width = float(stroke_width)
         self.original_stroke_width = self.stroke_width
         self.is_transparent = is_transparent
+        self.seqnos = ()
+        self.source_generation = None
+        self.paths_loaded = True
         
         self.page_number = page_number
         self.is_new = is_new
         self.selected = False
         self.modified = is_new
         
-        self.dragging = False
-        self.drag_start_x = 0
-        self.drag_start_y = 0
-        
         self.x = bbox[0]
         self.y = bbox[1]
     
@@ -9,13 +9,271 @@ import shutil
 import tempfile
 import traceback
 import re
+import copy
+import hashlib
+import functools
+import contextlib
+import threading
+import time
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED, ALL_COMPLETED
+import uuid
+from collections import OrderedDict
 
 from gi.repository import GdkPixbuf, Gdk, Pango, PangoCairo
 from .models import EditableText, FLAG_BOLD, FLAG_ITALIC, EditableImage, EditableShape
 from .utils import find_specific_font_variant, get_default_unicode_font_path
+from . import text_metrics
+from . import tracing
+from .text_model import PageTextModel
+from .image_optimizer import recompress_image
+from .snapshot_store import PageSnapshotStore
 
 _surface_cache = {"surface": None, "data_ref": None}
 
+PAGE_MODEL_CACHE_LIMIT = 32
+TEXT_PAGE_CACHE_LIMIT = 8
+IMAGE_STORE_LIMIT = 64 * 1024 * 1024
+SAVE_CHUNK_SIZE = 4 * 1024 * 1024
+
+SAVE_PROFILES = {
+    "fast": {"incremental": True, "subset_fonts": False, "options": {"garbage": 0}},
+    "balanced": {"incremental": True, "subset_fonts": True, "options": {"garbage": 1, "deflate": True}},
+    "smallest": {"incremental": False, "subset_fonts": True,
+                 "options": {"garbage": 4, "deflate": True, "deflate_images": True,
+                             "deflate_fonts": True, "clean": True, "use_objstms": 1}},
+}
+FONT_FILE_KEYS = ("FontFile", "FontFile2", "FontFile3")
+DEFAULT_SAVE_PROFILE = "balanced"
+
+IMAGE_TARGET_DPI = 150
+IMAGE_DPI_THRESHOLD = 1.3
+IMAGE_JPEG_QUALITY = 75
+IMAGE_PARALLEL_MIN_PIXELS = 4 * 1024 * 1024
+IMAGE_OPTIMIZE_WORKERS = 4
+
+LAYER_RESOURCE_PATTERN = re.compile(r"/WsLyr\w*\s+\d+\s+\d+\s+R")
+
+class DocumentSession:
+    def __init__(self, doc):
+        self.doc = doc
+        self.lock = threading.RLock()
+        self.fonts = {}
+        self.page_generations = {}
+        self.page_models = OrderedDict()
+        self.text_pages = OrderedDict()
+        self.text_models = OrderedDict()
+        self.drawings = OrderedDict()
+        self.images = OrderedDict()
+        self.images_size = 0
+        self.snapshots = PageSnapshotStore()
+        self.layers = {}
+        self.redaction_depth = 0
+        self.pending_redactions = {}
+        self.xref_epoch = 0
+        self.last_save = None
+        self.image_registry = {}
+        self.incremental_blocked = False
+
+_sessions: dict = {}
+_sessions_lock = threading.Lock()
+
+def get_session(doc):
+    with _sessions_lock:
+        session = _sessions.get(id(doc))
+        if session is None or session.doc is not doc:
+            session = DocumentSession(doc)
+            _sessions[id(doc)] = session
+        return session
+
+def release_session(doc):
+    with _sessions_lock:
+        session = _sessions.get(id(doc))
+        if session is not None and session.doc is doc:
+            del _sessions[id(doc)]
+            session.snapshots.close()
+
+def document_lock(doc):
+    return get_session(doc).lock
+
+def _serialized(func):
+    @functools.wraps(func)
+    def wrapper(doc, *args, **kwargs):
+        if doc is None:
+            return func(doc, *args, **kwargs)
+        with document_lock(doc):
+            return func(doc, *args, **kwargs)
+    return wrapper
+
+@_serialized
+def xref_epoch(doc):
+    return get_session(doc).xref_epoch
+
+def _xref_fingerprint(doc):
+    return doc.xref_length(), tuple(doc.page_xref(i) for i in range(doc.page_count))
+
+@_serialized
+def _invalidate_xref_caches(doc):
+    session = get_session(doc)
+    session.fonts.clear()
+    session.layers.clear()
+    session.images.clear()
+    session.image_registry.clear()
+    session.images_size = 0
+    session.xref_epoch += 1
+    invalidate_document_cache(doc)
+
+def page_generation(doc, page_num):
+    return get_session(doc).page_generations.get(page_num, 0)
+
+@_serialized
+def mark_page_modified(doc, page_num):
+    session = get_session(doc)
+    session.page_generations[page_num] = session.page_generations.get(page_num, 0) + 1
+    for cache in (session.page_models, session.text_pages, session.text_models, session.drawings):
+        for key in [k for k in cache if k[0] == page_num]:
+            del cache[key]
+
+@_serialized
+def invalidate_document_cache(doc):
+    session = get_session(doc)
+    for page_num in list(session.page_generations):
+        session.page_generations[page_num] += 1
+    session.page_models.clear()
+    session.text_pages.clear()
+    session.text_models.clear()
+    session.drawings.clear()
+    session.snapshots.clear()
+
+@_serialized
+def get_text_page(doc, page_index):
+    session = get_session(doc)
+    key = (page_index, session.page_generations.get(page_index, 0))
+    cached = session.text_pages.get(key)
+    if cached is not None:
+        session.text_pages.move_to_end(key)
+        return cached
+
+    page = doc.load_page(page_index)
+    textpage = page.get_textpage(flags=fitz.TEXTFLAGS_TEXT)
+    session.text_pages[key] = (page, textpage)
+    while len(session.text_pages) > TEXT_PAGE_CACHE_LIMIT:
+        session.text_pages.popitem(last=False)
+    return page, textpage
+
+@_serialized
+def get_page_text_model(doc, page_index):
+    session = get_session(doc)
+    key = (page_index, session.page_generations.get(page_index, 0))
+    model = session.text_models.get(key)
+    if model is not None:
+        session.text_models.move_to_end(key)
+        return model
+
+    page, textpage = get_text_page(doc, page_index)
+    with tracing.span("text_model", page=page_index):
+        model = PageTextModel.from_text_dict(page.get_text("dict", textpage=textpage),
+                                             page.get_text("words", textpage=textpage))
+    session.text_models[key] = model
+    while len(session.text_models) > TEXT_PAGE_CACHE_LIMIT:
+        session.text_models.popitem(last=False)
+    return model
+
+def _cached_page_objects(doc, page_index, kind, extractor):
+    session = get_session(doc)
+    key = (page_index, session.page_generations.get(page_index, 0))
+    entry = session.page_models.get(key)
+    if entry is not None and kind in entry:
+        session.page_models.move_to_end(key)
+        tracing.counter("extract.cache", hit=1)
+        return [copy.copy(obj) for obj in entry[kind]], None
+
+    with tracing.span("extract", kind=kind, page=page_index):
+        objects, error = extractor(doc, page_index)
+    if error:
+        return objects, error
+
+    if entry is None:
+        entry = session.page_models[key] = {}
+        while len(session.page_models) > PAGE_MODEL_CACHE_LIMIT:
+            session.page_models.popitem(last=False)
+    entry[kind] = [copy.copy(obj) for obj in objects]
+    return objects, None
+
+@_serialized
+def get_image_bytes(doc, xref):
+    session = get_session(doc)
+    data = session.images.get(xref)
+    if data is not None:
+        session.images.move_to_end(xref)
+        return data
+
+    image_data = doc.extract_image(xref)
+    if not image_data or 'image' not in image_data:
+        return None
+    data = image_data["image"]
+    session.images[xref] = data
+    session.images_size += len(data)
+    while session.images_size > IMAGE_STORE_LIMIT and len(session.images) > 1:
+        _, evicted = session.images.popitem(last=False)
+        session.images_size -= len(evicted)
+    return data
+
+def _image_loader(doc, xref):
+    return lambda: get_image_bytes(doc, xref)
+
+def _page_resource_path(doc, page, category):
+    res_type, res_val = doc.xref_get_key(page.xref, "Resources")
+    if res_type == "xref":
+        target, prefix = int(res_val.split()[0]), ""
+    else:
+        target, prefix = page.xref, "Resources/"
+    cat_type, cat_val = doc.xref_get_key(target, prefix + category)
+    if cat_type == "xref":
+        return int(cat_val.split()[0]), ""
+    return target, prefix + category + "/"
+
+def _link_page_resource(doc, page, category, name, value):
+    target, prefix = _page_resource_path(doc, page, category)
+    doc.xref_set_key(target, prefix + name, value)
+
+def _has_page_resource(doc, page, category, name):
+    target, prefix = _page_resource_path(doc, page, category)
+    return doc.xref_get_key(target, prefix + name)[0] != "null"
+
+def _link_font_resource(doc, page, fontname, font_xref):
+    _link_page_resource(doc, page, "Font", fontname, f"{font_xref} 0 R")
+
+def _is_font_object(doc, xref, base_font):
+    if not 0 < xref < doc.xref_length():
+        return False
+    return (doc.xref_get_key(xref, "Type") == ("name", "/Font")
+            and doc.xref_get_key(xref, "BaseFont")[1] == base_font)
+
+def _ensure_page_font(doc, page, font_arg):
+    fontfile = font_arg.get("fontfile")
+    fontname = font_arg.get("fontname")
+    if not fontfile:
+        return font_arg
+    if not _has_page_resource(doc, page, "Font", fontname):
+        registry = get_session(doc).fonts
+        key = (fontfile, fontname)
+        font_xref, base_font = registry.get(key, (0, None))
+        if font_xref and not _is_font_object(doc, font_xref, base_font):
+            del registry[key]
+            font_xref = 0
+        if font_xref:
+            try:
+                _link_font_resource(doc, page, fontname, font_xref)
+            except Exception as e:
+                print(f"Warning: could not reuse font xref {font_xref} on page {page.number}: {e}")
+                font_xref = 0
+        if not font_xref:
+            font_xref = page.insert_font(fontname=fontname, fontfile=fontfile)
+            registry[key] = (font_xref, doc.xref_get_key(font_xref, "BaseFont")[1])
+    return {"fontname": fontname}
+
 def _get_font_args_for_pymupdf(text_obj):
     font_arg = {}
     font_to_embed_path = find_specific_font_variant(
@@ -34,14 +292,14 @@ def _get_font_args_for_pymupdf(text_obj):
         internal_font_name = f"word-sys_{safe_family_name}_{style_suffix}"
         
         font_arg = {"fontfile": font_to_embed_path, "fontname": internal_font_name}
-        print(f"DEBUG (FontHelper): Using TTF: {font_to_embed_path} as '{internal_font_name}'")
+        tracing.counter("font.embedded", fontfile=1)
         return font_arg, None
     else:
         generic_unicode_font = get_default_unicode_font_path()
         if generic_unicode_font:
             internal_font_name = "word-sysEditFont_GenericUnicode"
             font_arg = {"fontfile": generic_unicode_font, "fontname": internal_font_name}
-            print(f"DEBUG (FontHelper): WARNING: Could not find specific TTF. Using generic fallback: {generic_unicode_font}")
+            tracing.instant("font.generic_fallback", family=text_obj.font_family_base, fontfile=generic_unicode_font)
             return font_arg, None
         else:
             base14_name = text_obj.pdf_fontname_base14
@@ -64,16 +322,21 @@ def load_pdf_document(filepath):
     except Exception as e:
         return None, f"Error opening PDF: {e}\nPath: {filepath}"
 
+@_serialized
 def close_pdf_document(doc):
     if doc:
+        release_session(doc)
         try:
             doc.close()
         except Exception as e:
             print(f"Error closing PDF document: {e}")
 
+@_serialized
 def get_page_count(doc):
     return doc.page_count if doc else 0
 
+@_serialized
+@tracing.traced("thumbnail")
 def generate_thumbnail(doc, page_index, target_width=150):
     if not doc or not (0 <= page_index < doc.page_count):
         return None
@@ -146,7 +409,9 @@ def pixmap_to_cairo_surface(pix):
         return None, None
 
 
-def draw_page_to_cairo(cr, doc, page_index, zoom_level):
+@_serialized
+@tracing.traced("render")
+def draw_page_to_cairo(cr, doc, page_index, zoom_level, hidden_owner=None):
     if not doc or not (0 <= page_index < doc.page_count):
         cr.set_source_rgb(0.7, 0.7, 0.7)
         cr.paint()
@@ -155,7 +420,8 @@ def draw_page_to_cairo(cr, doc, page_index, zoom_level):
     try:
         page = doc.load_page(page_index)
         zoom_matrix = fitz.Matrix(zoom_level, zoom_level)
-        pix = page.get_pixmap(matrix=zoom_matrix, alpha=True)
+        with _hidden_layer(doc, page, hidden_owner):
+            pix = page.get_pixmap(matrix=zoom_matrix, alpha=True)
         samples_bytes = bytes(pix.samples)
 
         pixbuf = GdkPixbuf.Pixbuf.new_from_data(
@@ -198,72 +464,47 @@ def draw_page_to_cairo(cr, doc, page_index, zoom_level):
         return False, error_msg
 
 
+@_serialized
 def extract_editable_text(doc, page_index):
+    if not doc or not (0 <= page_index < doc.page_count):
+        return _extract_editable_text(doc, page_index)
+    return _cached_page_objects(doc, page_index, "text", _extract_editable_text)
+
+def _extract_editable_text(doc, page_index):
     editable_texts = []
     if not doc or not (0 <= page_index < doc.page_count):
         return [], "Invalid document or page index for text extraction."
     try:
-        page = doc.load_page(page_index)
-        text_dict = page.get_text("dict", flags=0)
-
-        for block in text_dict.get("blocks", []):
-            if block.get("type") == 0:
-                for line in block.get("lines", []):
-                    spans = line.get("spans", [])
-                    if not spans:
-                        continue
-                    
-                    combined_text = ""
-                    min_x = float('inf')
-                    max_x = float('-inf')
-                    min_y = float('inf')
-                    max_y = float('-inf')
-                    first_span = None
-                    
-                    for span in spans:
-                        text = span.get("text", "")
-                        bbox = span.get("bbox")
-                        
-                        if not text:
-                            continue
-                        
-                        if first_span is None:
-                            first_span = span
-                        
-                        combined_text += text
-                        
-                        if bbox:
-                            min_x = min(min_x, bbox[0])
-                            min_y = min(min_y, bbox[1])
-                            max_x = max(max_x, bbox[2])
-                            max_y = max(max_y, bbox[3])
-                    
-                    if not combined_text or first_span is None:
-                        continue
-                    
-                    combined_text = combined_text.strip()
-                    if not combined_text:
-                        continue
-                    
-                    bbox = [min_x, min_y, max_x, max_y] if min_x != float('inf') else first_span.get("bbox", [0, 0, 100, 100])
-                    
-                    span_data = first_span.copy() if first_span else {}
-                    span_data["bbox"] = tuple(bbox)
-                    span_data["text"] = combined_text
-                    
-                    editable = EditableText(
-                        x=bbox[0], y=bbox[1], text=combined_text,
-                        font_size=first_span.get("size", 11) if first_span else 11,
-                        font_family="Liberation Sans",
-                        color=first_span.get("color", 0) if first_span else 0,
-                        span_data=span_data,
-                        baseline=first_span.get("origin", (0, bbox[3]))[1] if first_span else bbox[3]
-                    )
-                    editable.page_number = page_index
-                    editable_texts.append(editable)
-                    print(f"DEBUG: Extracted text: '{combined_text}' bbox={bbox}")
-        
-        print(f"DEBUG: Total text objects extracted from page {page_index}: {len(editable_texts)}")
+        model = get_page_text_model(doc, page_index)
+        bboxes = model.line_bboxes.tolist()
+        baselines = model.baselines.tolist()
+        sizes = model.font_sizes.tolist()
+        colors = model.colors.tolist()
+        flags = model.flags.tolist()
+        font_ids = model.font_ids.tolist()
+
+        for i, bbox in enumerate(bboxes):
+            text = model.line_text(i)
+            if not text:
+                continue
+            span_data = {
+                "font": model.fonts[font_ids[i]],
+                "flags": flags[i],
+                "color": colors[i],
+                "bbox": tuple(bbox),
+            }
+            editable = EditableText(
+                x=bbox[0], y=bbox[1], text=text,
+                font_size=sizes[i],
+                font_family="Liberation Sans",
+                color=colors[i],
+                span_data=span_data,
+                baseline=baselines[i]
+            )
+            editable.page_number = page_index
+            editable_texts.append(editable)
+
+        tracing.counter("extract.text", page=page_index, objects=len(editable_texts))
         return editable_texts, None
     except Exception as e:
         error_msg = f"Error extracting text from page {page_index}: {e}"
@@ -292,6 +533,7 @@ def _get_base14_font_variant(base_name, is_bold, is_italic):
         if pdf_base == 'Courier': return 'Courier'
     return pdf_base
 
+@_serialized
 def apply_text_edit(doc, text_obj: EditableText, new_text: str):
     if not doc or text_obj.page_number is None:
         return False, "Invalid document or page number."
@@ -302,9 +544,7 @@ def apply_text_edit(doc, text_obj: EditableText, new_text: str):
 
     try:
         page = doc.load_page(text_obj.page_number)
-        
-        print(f"DEBUG apply_text_edit: is_new={text_obj.is_new}, new_text='{new_text}'")
-        print(f"DEBUG: text_obj bbox: {text_obj.bbox}")
+        font_arg = _ensure_page_font(doc, page, font_arg)
         
         if new_text.strip():
             text_color = (0, 0, 0)
@@ -317,8 +557,6 @@ def apply_text_edit(doc, text_obj: EditableText, new_text: str):
                     red = ((text_obj.color >> 16) & 255) / 255.0
                     text_color = (red, green, blue)
             
-            print(f"DEBUG: Inserting updated text '{new_text}' at point ({text_obj.x}, {text_obj.baseline})")
-            
             line_point = fitz.Point(text_obj.x, text_obj.baseline)
             rc = page.insert_text(
                 line_point,
@@ -328,10 +566,10 @@ def apply_text_edit(doc, text_obj: EditableText, new_text: str):
                 overlay=True,
                 **font_arg
             )
-            print(f"DEBUG: insert_text returned: {rc}")
             if rc < 0:
                 print(f"ERROR: insert_text failed with rc={rc}")
                 return False, f"PyMuPDF insert_text error: {rc}"
+            mark_page_modified(doc, text_obj.page_number)
 
         return True, None
     except Exception as e:
@@ -339,22 +577,136 @@ def apply_text_edit(doc, text_obj: EditableText, new_text: str):
         traceback.print_exc()
         return False, f"Error during text application: {e}"
 
-def save_document(doc, save_path, incremental=False):
-    if not doc:
-        return False, "Kaydedilecek belge yok."
+@_serialized
+def can_save_incrementally(doc, save_path):
+    if not doc or not doc.name or not save_path:
+        return False
+    try:
+        if get_session(doc).incremental_blocked:
+            return False
+        if not os.path.exists(save_path) or not os.path.samefile(doc.name, save_path):
+            return False
+        return bool(doc.can_save_incrementally())
+    except Exception:
+        return False
 
-    temp_path = f"{save_path}.tmp_save"
+@_serialized
+def _save_incremental(doc, save_path):
+    try:
+        with tracing.span("save.incremental"):
+            doc.save(save_path, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+        return True
+    except Exception as e:
+        print(f"UYARI: Artımlı kayıt başarısız, tam kayda geçiliyor: {e}")
+        return False
 
+def _editor_font_names(doc):
+    names = set()
+    for font_xref, base_font in get_session(doc).fonts.values():
+        if base_font and _is_font_object(doc, font_xref, base_font):
+            names.add(base_font.lstrip("/"))
+    return names
+
+def _has_duplicate_images(doc):
+    by_length = {}
+    for xref in range(1, doc.xref_length()):
+        if not doc.xref_is_image(xref):
+            continue
+        length_type, length = doc.xref_get_key(xref, "Length")
+        length = int(length) if length_type == "int" else len(doc.xref_stream_raw(xref) or b"")
+        by_length.setdefault(length, []).append(xref)
+    for xrefs in by_length.values():
+        if len(xrefs) < 2:
+            continue
+        digests = set()
+        for xref in xrefs:
+            digest = hashlib.sha1(doc.xref_stream_raw(xref) or b"").digest()
+            if digest in digests:
+                return True
+            digests.add(digest)
+    return False
+
+@_serialized
+def _fonts_need_subsetting(doc, profile):
+    return SAVE_PROFILES[profile]["subset_fonts"] and bool(_editor_font_names(doc))
+
+@_serialized
+def _serialize_document(doc, profile=DEFAULT_SAVE_PROFILE):
+    fingerprint = _xref_fingerprint(doc)
+    settings = SAVE_PROFILES[profile]
+    editor_fonts = _editor_font_names(doc) if settings["subset_fonts"] else set()
+    merge_images = _has_duplicate_images(doc)
+    options = settings["options"]
+    rewrite = bool(editor_fonts or merge_images) or options.get("garbage", 0) >= 2 or options.get("clean", False)
+    with tracing.span("save.serialize", profile=profile, rewrite=rewrite):
+        if rewrite:
+            data = doc.tobytes(garbage=0, encryption=fitz.PDF_ENCRYPT_NONE)
+        else:
+            data = doc.tobytes(encryption=fitz.PDF_ENCRYPT_NONE, **options)
+    if _xref_fingerprint(doc) != fingerprint:
+        _invalidate_xref_caches(doc)
+    return data, editor_fonts, merge_images, rewrite
+
+def _subset_editor_fonts(data, editor_fonts, options):
+    copy_doc = fitz.open("pdf", data)
     try:
-        doc.save(
-            temp_path,
-            garbage=4,
-            deflate=True,
-            incremental=False,  
-            encryption=fitz.PDF_ENCRYPT_NONE
-        )
+        editor_files, detached = [], []
+        before = 0
+        for xref in range(1, copy_doc.xref_length()):
+            for key in FONT_FILE_KEYS:
+                value_type, value = copy_doc.xref_get_key(xref, key)
+                if value_type != "xref":
+                    continue
+                name = re.sub(r'^[A-Z]{6}\+', '', copy_doc.xref_get_key(xref, "FontName")[1].lstrip("/"))
+                if name in editor_fonts:
+                    editor_files.append((xref, key))
+                    before += len(copy_doc.xref_stream_raw(int(value.split()[0])) or b"")
+                else:
+                    detached.append((xref, key, value))
+                    copy_doc.xref_set_key(xref, key, "null")
+
+        if editor_files:
+            with tracing.span("save.subset_fonts", fonts=len(editor_files)):
+                copy_doc.subset_fonts()
+        for xref, key, value in detached:
+            copy_doc.xref_set_key(xref, key, value)
+        if not editor_files:
+            return None, None
+
+        after = 0
+        for xref, key in editor_files:
+            value_type, value = copy_doc.xref_get_key(xref, key)
+            if value_type == "xref":
+                after += len(copy_doc.xref_stream_raw(int(value.split()[0])) or b"")
+        options = dict(options, garbage=max(options.get("garbage", 0), 1))
+        return copy_doc.tobytes(encryption=fitz.PDF_ENCRYPT_NONE, **options), (before, after)
+    finally:
+        copy_doc.close()
+
+def _write_document_bytes(doc, data, save_path, progress=None, cancelled=None):
+    overwrites_source = bool(doc.name) and os.path.exists(save_path) and os.path.samefile(doc.name, save_path)
+    temp_path = f"{save_path}.{uuid.uuid4().hex[:8]}.tmp_save"
+    total = len(data)
+    try:
+        with tracing.span("save.write", bytes=total), open(temp_path, "xb") as f:
+            view = memoryview(data)
+            for offset in range(0, total, SAVE_CHUNK_SIZE):
+                if cancelled and cancelled():
+                    break
+                f.write(view[offset:offset + SAVE_CHUNK_SIZE])
+                if progress:
+                    progress("write", min(offset + SAVE_CHUNK_SIZE, total) / total)
+            else:
+                f.flush()
+                os.fsync(f.fileno())
+
+        if cancelled and cancelled():
+            os.remove(temp_path)
+            return False, None
 
         os.replace(temp_path, save_path)
+        if overwrites_source:
+            get_session(doc).incremental_blocked = True
         return True, None
 
     except Exception as e:
@@ -365,14 +717,214 @@ def save_document(doc, save_path, incremental=False):
                 pass
         
         return False, f"PDF kaydedilirken hata oluştu: {e}"
+
+def get_last_save_stats(doc):
+    return get_session(doc).last_save
+
+def _record_save_stats(doc, profile, written, started, font_sizes=None):
+    stats = {"profile": profile, "bytes": written, "seconds": time.perf_counter() - started,
+             "fonts_before": None, "fonts_after": None}
+    if font_sizes:
+        stats["fonts_before"], stats["fonts_after"] = font_sizes
+    get_session(doc).last_save = stats
+    tracing.instant("save.stats", **stats)
+
+@tracing.traced("save")
+def save_document(doc, save_path, incremental=False, profile=DEFAULT_SAVE_PROFILE, progress=None, cancelled=None):
+    if not doc:
+        return False, "Kaydedilecek belge yok."
+    if profile not in SAVE_PROFILES:
+        profile = DEFAULT_SAVE_PROFILE
+    started = time.perf_counter()
+
+    if (incremental and SAVE_PROFILES[profile]["incremental"] and can_save_incrementally(doc, save_path)
+            and not _fonts_need_subsetting(doc, profile)):
+        if cancelled and cancelled():
+            return False, None
+        size_before = os.path.getsize(save_path)
+        if progress:
+            progress("incremental", None)
+        if _save_incremental(doc, save_path):
+            _record_save_stats(doc, "incremental", os.path.getsize(save_path) - size_before, started)
+            return True, None
+
+    if progress:
+        progress("serialize", None)
+    try:
+        data, editor_fonts, merge_images, rewrite = _serialize_document(doc, profile)
+    except Exception as e:
+        return False, f"PDF kaydedilirken hata oluştu: {e}"
+    if cancelled and cancelled():
+        return False, None
+
+    font_sizes = None
+    if rewrite:
+        if progress:
+            progress("compress", None)
+        options = dict(SAVE_PROFILES[profile]["options"])
+        if merge_images:
+            options["garbage"] = max(options.get("garbage", 0), 4)
+        subset_data = None
+        if editor_fonts:
+            try:
+                subset_data, font_sizes = _subset_editor_fonts(data, editor_fonts, options)
+            except Exception as e:
+                print(f"UYARI: Font alt kümesi çıkarılamadı, fontlar tam haliyle kaydediliyor: {e}")
+        try:
+            if subset_data is None:
+                with fitz.open("pdf", data) as copy_doc:
+                    subset_data = copy_doc.tobytes(encryption=fitz.PDF_ENCRYPT_NONE, **options)
+        except Exception as e:
+            return False, f"PDF kaydedilirken hata oluştu: {e}"
+        data = subset_data
+        if cancelled and cancelled():
+            return False, None
+
+    success, error = _write_document_bytes(doc, data, save_path, progress, cancelled)
+    if success:
+        _record_save_stats(doc, profile, len(data), started, font_sizes)
+    return success, error
     
+@_serialized
+def _image_candidates(doc, target_dpi):
+    placements = {}
+    for page_num in range(doc.page_count):
+        for info in doc.load_page(page_num).get_image_info(xrefs=True):
+            xref = info.get("xref", 0)
+            if xref <= 0:
+                continue
+            a, b, c, d = info["transform"][:4]
+            shown_w, shown_h = math.hypot(a, b), math.hypot(c, d)
+            if shown_w <= 0 or shown_h <= 0:
+                continue
+            dpi = min(info["width"] * 72.0 / shown_w, info["height"] * 72.0 / shown_h)
+            entry = placements.setdefault(xref, [dpi, set()])
+            entry[0] = min(entry[0], dpi)
+            entry[1].add(page_num)
+    return [(xref, dpi, pages) for xref, (dpi, pages) in placements.items()
+            if dpi > target_dpi * IMAGE_DPI_THRESHOLD]
+
+@_serialized
+def _decode_image_job(doc, xref, dpi, target_dpi, quality):
+    if doc.xref_get_key(xref, "ImageMask")[1] == "true" or doc.xref_get_key(xref, "Mask")[0] == "array":
+        return None
+    if doc.xref_get_key(xref, "BitsPerComponent")[1] == "1":
+        return None
+    pix = fitz.Pixmap(doc, xref)
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)
+    if pix.n not in (1, 3):
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    scale = target_dpi / dpi
+    target_w = max(1, int(round(pix.width * scale)))
+    target_h = max(1, int(round(pix.height * scale)))
+    return {
+        "xref": xref, "dpi": dpi, "pixels": pix.width * pix.height, "components": pix.n,
+        "before": len(doc.xref_stream_raw(xref) or b""),
+        "args": (pix.samples, pix.width, pix.height, pix.n, target_w, target_h, quality),
+    }
+
+@_serialized
+def _replace_image_stream(doc, job, result, pages):
+    data, image_filter, width, height, seconds = result
+    entry = {"xref": job["xref"], "dpi": round(job["dpi"]), "before": job["before"],
+             "after": job["before"], "seconds": seconds, "filter": image_filter, "replaced": False,
+             "pages": sorted(pages)}
+    if len(data) >= job["before"]:
+        return entry
+
+    xref = job["xref"]
+    doc.update_stream(xref, data, compress=False)
+    doc.xref_set_key(xref, "Filter", f"/{image_filter}")
+    doc.xref_set_key(xref, "Width", str(width))
+    doc.xref_set_key(xref, "Height", str(height))
+    doc.xref_set_key(xref, "BitsPerComponent", "8")
+    doc.xref_set_key(xref, "ColorSpace", "/DeviceGray" if job["components"] == 1 else "/DeviceRGB")
+    for key in ("DecodeParms", "Decode"):
+        doc.xref_set_key(xref, key, "null")
+
+    session = get_session(doc)
+    cached = session.images.pop(xref, None)
+    if cached is not None:
+        session.images_size -= len(cached)
+    for page_num in pages:
+        mark_page_modified(doc, page_num)
+    entry.update(after=len(data), replaced=True)
+    return entry
+
+def optimize_images(doc, target_dpi=IMAGE_TARGET_DPI, quality=IMAGE_JPEG_QUALITY, progress=None, cancelled=None):
+    if not doc:
+        return [], "Belge yok."
+    try:
+        candidates = _image_candidates(doc, target_dpi)
+    except Exception as e:
+        traceback.print_exc()
+        return [], f"Resimler taranamadı: {e}"
+
+    report = []
+    workers = min(IMAGE_OPTIMIZE_WORKERS, os.cpu_count() or 1)
+    executor = None
+    pending = {}
+
+    def _finish(job, pages, result):
+        entry = _replace_image_stream(doc, job, result, pages)
+        report.append(entry)
+        tracing.instant("optimize.image", **entry)
+        if progress:
+            progress(len(report) / len(candidates))
+
+    def _drain(return_when):
+        done, _ = wait(list(pending), return_when=return_when)
+        for future in done:
+            job, pages = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"UYARI: İşçi süreç başarısız, resim bu süreçte kodlanıyor: {e}")
+                result = recompress_image(job["args"])
+            _finish(job, pages, result)
+
+    try:
+        with tracing.span("optimize.images", candidates=len(candidates)):
+            for xref, dpi, pages in candidates:
+                if cancelled and cancelled():
+                    break
+                job = _decode_image_job(doc, xref, dpi, target_dpi, quality)
+                if job is None:
+                    continue
+                if job["pixels"] < IMAGE_PARALLEL_MIN_PIXELS or workers < 2:
+                    _finish(job, pages, recompress_image(job["args"]))
+                    continue
+                try:
+                    if executor is None:
+                        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+                    pending[executor.submit(recompress_image, job["args"])] = (job, pages)
+                except (OSError, RuntimeError) as e:
+                    print(f"UYARI: İşçi süreçler başlatılamadı, resimler sırayla kodlanıyor: {e}")
+                    workers = 1
+                    _finish(job, pages, recompress_image(job["args"]))
+                    continue
+                if len(pending) >= workers * 2:
+                    _drain(FIRST_COMPLETED)
+            if pending:
+                _drain(ALL_COMPLETED)
+        return report, None
+    except Exception as e:
+        traceback.print_exc()
+        return report, f"Resimler iyileştirilirken hata oluştu: {e}"
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+@_serialized
+@tracing.traced("export")
 def _export_via_libreoffice(doc, source_pdf_path, output_path, target_format):
     libreoffice_executable = shutil.which('libreoffice')
     if not libreoffice_executable:
         libreoffice_executable = shutil.which('soffice')
     if not libreoffice_executable:
         return False, f"LibreOffice Not Found. Install 'libreoffice-writer' to enable {target_format.upper()} export."
-    print(f"DEBUG [{target_format.upper()} Export]: Using LibreOffice executable: {libreoffice_executable}")
+    tracing.instant("export", detail=f"Using LibreOffice executable: {libreoffice_executable}")
 
     final_output_dir = Path(output_path).parent
     final_output_dir.mkdir(parents=True, exist_ok=True)
@@ -381,10 +933,11 @@ def _export_via_libreoffice(doc, source_pdf_path, output_path, target_format):
     try:
         fd, temp_pdf_path = tempfile.mkstemp(suffix=".pdf", prefix="word-sys_export_", dir=str(final_output_dir))
         os.close(fd)
-        print(f"DEBUG [{target_format.upper()} Export]: Saving document state to temporary file: {temp_pdf_path}")
+        tracing.instant("export", detail=f"Saving document state to temporary file: {temp_pdf_path}")
 
         try:
-            pdf_bytes = doc.tobytes(garbage=4, clean=True, deflate=True)
+            with fitz.open("pdf", doc.tobytes(garbage=0, encryption=fitz.PDF_ENCRYPT_NONE)) as copy_doc:
+                pdf_bytes = copy_doc.tobytes(garbage=4, clean=True, deflate=True)
             with open(temp_pdf_path, 'wb') as f:
                 f.write(pdf_bytes)
             save_success = True
@@ -401,23 +954,23 @@ def _export_via_libreoffice(doc, source_pdf_path, output_path, target_format):
             if os.path.exists(temp_pdf_path): os.unlink(temp_pdf_path)
             return False, "Failed to create a valid temporary PDF for export."
 
-        print(f"DEBUG [{target_format.upper()} Export]: Temp PDF Path = {temp_pdf_path} (Size: {os.path.getsize(temp_pdf_path)} bytes)")
+        tracing.instant("export", detail=f"Temp PDF Path = {temp_pdf_path} (Size: {os.path.getsize(temp_pdf_path)} bytes)")
         temp_pdf_path_obj = Path(temp_pdf_path)
         temp_pdf_name_no_ext = temp_pdf_path_obj.stem
 
-        print(f"DEBUG [{target_format.upper()} Export]: Final {target_format.upper()} Output Dir = {final_output_dir}")
-        print(f"DEBUG [{target_format.upper()} Export]: Desired Final {target_format.upper()} Path = {output_path}")
+        tracing.instant("export", detail=f"Final {target_format.upper()} Output Dir = {final_output_dir}")
+        tracing.instant("export", detail=f"Desired Final {target_format.upper()} Path = {output_path}")
 
         python_cwd = Path(os.getcwd())
         expected_output_in_python_cwd = python_cwd / f"{temp_pdf_name_no_ext}.{target_format}"
-        print(f"DEBUG [{target_format.upper()} Export]: Python's Current Working Directory (for output): {python_cwd}")
-        print(f"DEBUG [{target_format.upper()} Export]: Expected {target_format.upper()} in Python CWD: {expected_output_in_python_cwd}")
+        tracing.instant("export", detail=f"Python's Current Working Directory (for output): {python_cwd}")
+        tracing.instant("export", detail=f"Expected {target_format.upper()} in Python CWD: {expected_output_in_python_cwd}")
         
         if os.path.exists(expected_output_in_python_cwd):
-            print(f"DEBUG [{target_format.upper()} Export]: Removing leftover in CWD: {expected_output_in_python_cwd}")
+            tracing.instant("export", detail=f"Removing leftover in CWD: {expected_output_in_python_cwd}")
             os.remove(expected_output_in_python_cwd)
         if os.path.exists(output_path):
-            print(f"DEBUG [{target_format.upper()} Export]: Removing leftover final target: {output_path}")
+            tracing.instant("export", detail=f"Removing leftover final target: {output_path}")
             os.remove(output_path)
 
         if target_format == 'odt':
@@ -444,12 +997,12 @@ def _export_via_libreoffice(doc, source_pdf_path, output_path, target_format):
 
         expected_output_location = temp_pdf_path_obj.parent / f"{temp_pdf_name_no_ext}.{target_format}"
 
-        print(f"DEBUG [{target_format.upper()} Export]: Expected {target_format.upper()} at: {expected_output_location}")
+        tracing.instant("export", detail=f"Expected {target_format.upper()} at: {expected_output_location}")
         if os.path.exists(expected_output_location):
-            print(f"DEBUG [{target_format.upper()} Export]: Removing leftover: {expected_output_location}")
+            tracing.instant("export", detail=f"Removing leftover: {expected_output_location}")
             os.remove(expected_output_location)
 
-        print(f"DEBUG [{target_format.upper()} Export]: Running command: {' '.join(command)}")
+        tracing.instant("export", detail=f"Running command: {' '.join(command)}")
 
         current_env = os.environ.copy()
         process = subprocess.run(
@@ -461,11 +1014,8 @@ def _export_via_libreoffice(doc, source_pdf_path, output_path, target_format):
             env=current_env
         )
 
-        print(f"DEBUG [{target_format.upper()} Export]: LibreOffice Return Code: {process.returncode}")
-        if process.stdout:
-            print(f"DEBUG [{target_format.upper()} Export]: LibreOffice stdout:\n---\n{process.stdout.strip()}\n---")
-        if process.stderr:
-            print(f"DEBUG [{target_format.upper()} Export]: LibreOffice stderr:\n---\n{process.stderr.strip()}\n---")
+        tracing.instant("export.libreoffice", returncode=process.returncode,
+                        stdout=process.stdout.strip(), stderr=process.stderr.strip())
 
         if "0xc10" in process.stderr or "SfxBaseModel::impl_store" in process.stderr:
             error_msg = f"LibreOffice I/O Write Error during conversion. Stderr: {process.stderr.strip()}"
@@ -485,11 +1035,11 @@ def _export_via_libreoffice(doc, source_pdf_path, output_path, target_format):
             return False, error_msg
 
         if os.path.exists(expected_output_location):
-            print(f"DEBUG [{target_format.upper()} Export]: Found {target_format.upper()} at: {expected_output_location}")
+            tracing.instant("export", detail=f"Found {target_format.upper()} at: {expected_output_location}")
             try:
                 Path(output_path).parent.mkdir(parents=True, exist_ok=True)
                 shutil.move(str(expected_output_location), str(output_path))
-                print(f"DEBUG [{target_format.upper()} Export]: Moved {target_format.upper()} to final destination: {output_path}")
+                tracing.instant("export", detail=f"Moved {target_format.upper()} to final destination: {output_path}")
                 return True, None
             except Exception as move_e:
                 error_msg = f"Found converted {target_format.upper()} ({expected_output_location}) but failed to move to {output_path}: {move_e}"
@@ -509,7 +1059,7 @@ def _export_via_libreoffice(doc, source_pdf_path, output_path, target_format):
         if temp_pdf_path and os.path.exists(temp_pdf_path):
             try:
                 os.unlink(temp_pdf_path)
-                print(f"DEBUG [{target_format.upper()} Export]: Cleaned up temp PDF: {temp_pdf_path}")
+                tracing.instant("export", detail=f"Cleaned up temp PDF: {temp_pdf_path}")
             except Exception as unlink_e:
                 print(f"Warning: Could not delete temporary file {temp_pdf_path}: {unlink_e}")
 
@@ -546,6 +1096,7 @@ def _export_pdf_via_libreoffice(doc, output_path, target_format, format_label):
     return False, f"Unsupported format: {target_format}"
 
 
+@_serialized
 def export_pdf_as_text(doc, output_txt_path):
     if not doc:
         return False, "No document to export."
@@ -561,7 +1112,13 @@ def export_pdf_as_text(doc, output_txt_path):
     except Exception as e:
         return False, f"Error exporting as text: {e}"
 
+@_serialized
 def extract_editable_images(doc, page_index):
+    if not doc or not (0 <= page_index < doc.page_count):
+        return _extract_editable_images(doc, page_index)
+    return _cached_page_objects(doc, page_index, "images", _extract_editable_images)
+
+def _extract_editable_images(doc, page_index):
     editable_images = []
     if not doc or not (0 <= page_index < doc.page_count):
         return [], "Görüntü çıkarma için geçersiz belge veya sayfa dizini."
@@ -571,7 +1128,6 @@ def extract_editable_images(doc, page_index):
         image_info_list = page.get_image_info(xrefs=True)
         
         if not image_info_list:
-            print(f"DEBUG: No images found via get_image_info on page {page_index}. Trying alternative method...")
             image_info_list = []
         
         for img_info in image_info_list:
@@ -586,30 +1142,19 @@ def extract_editable_images(doc, page_index):
                 if rect.is_empty or not rect.is_valid:
                     continue
 
-                try:
-                    image_data = doc.extract_image(xref)
-                    if not image_data or 'image' not in image_data:
-                        print(f"DEBUG: Could not extract image data for xref {xref}")
-                        continue
-                    
-                    image_bytes = image_data["image"]
-                    
-                    image_obj = EditableImage(
-                        bbox=bbox,
-                        page_number=page_index,
-                        xref=xref,
-                        image_bytes=image_bytes
-                    )
-                    editable_images.append(image_obj)
-                except Exception as extract_error:
-                    print(f"DEBUG: Error extracting image bytes for xref {xref}: {extract_error}")
-                    continue
+                image_obj = EditableImage(
+                    bbox=bbox,
+                    page_number=page_index,
+                    xref=xref,
+                    image_loader=_image_loader(doc, xref)
+                )
+                editable_images.append(image_obj)
                     
             except (ValueError, TypeError) as e:
                 print(f"Uyarı: Sayfa {page_index+1} içindeki bir resim (xref={img_info.get('xref')}) atlandı: {e}")
                 continue
         
-        print(f"DEBUG: Extracted {len(editable_images)} images from page {page_index}")
+        tracing.counter("extract.images", page=page_index, objects=len(editable_images))
         return editable_images, None
     except Exception as e:
         error_msg = f"Sayfa {page_index+1} içinden resimler çıkarılırken hata oluştu: {e}"
@@ -617,12 +1162,15 @@ def extract_editable_images(doc, page_index):
         traceback.print_exc()
         return [], error_msg
 
+@_serialized
 def add_image_to_page(doc, page_number, image_path, rect):
     if not doc or page_number is None:
         return False, "Resim eklemek için geçersiz belge veya sayfa numarası."
     try:
         page = doc.load_page(page_number)
-        page.insert_image(rect, filename=image_path)
+        with open(image_path, "rb") as f:
+            _insert_image_data(doc, page, rect, f.read())
+        mark_page_modified(doc, page_number)
         return True, None
     except FileNotFoundError:
         return False, f"Resim dosyası bulunamadı: {image_path}"
@@ -631,6 +1179,7 @@ def add_image_to_page(doc, page_number, image_path, rect):
         traceback.print_exc()
         return False, f"Resim yerleştirme sırasında hata: {e}"
 
+@_serialized
 def delete_image_from_page(doc, image_obj: EditableImage):
     if not doc or image_obj.page_number is None:
         return False, "Resim silmek için geçersiz belge veya sayfa numarası."
@@ -642,6 +1191,7 @@ def delete_image_from_page(doc, image_obj: EditableImage):
             page.add_redact_annot(redact_rect)
             page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_REMOVE)
             doc.load_page(image_obj.page_number)
+            mark_page_modified(doc, image_obj.page_number)
             return True, None
         else:
             return False, "Resim sınırlayıcı kutusu geçersiz."
@@ -650,6 +1200,7 @@ def delete_image_from_page(doc, image_obj: EditableImage):
         traceback.print_exc()
         return False, f"Resim silme sırasında hata: {e}"
 
+@_serialized
 def delete_shape_from_page(doc, shape_obj: EditableShape):
     if not doc or shape_obj.page_number is None:
         return False, "Şekil silmek için geçersiz belge veya sayfa numarası."
@@ -665,6 +1216,7 @@ def delete_shape_from_page(doc, shape_obj: EditableShape):
             except TypeError:
                 page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_NONE)
             doc.load_page(shape_obj.page_number)
+            mark_page_modified(doc, shape_obj.page_number)
             return True, None
         else:
             return False, "Şekil sınırlayıcı kutusu geçersiz."
@@ -674,36 +1226,60 @@ def delete_shape_from_page(doc, shape_obj: EditableShape):
         return False, f"Şekil silme sırasında hata: {e}"
 
 
+@_serialized
 def extract_editable_shapes(doc, page_index):
+    if not doc or not (0 <= page_index < doc.page_count):
+        return _extract_editable_shapes(doc, page_index)
+    return _cached_page_objects(doc, page_index, "shapes", _extract_editable_shapes)
+
+SHAPE_MIN_SIZE = 2
+SHAPE_MERGE_TOLERANCE = 1.0
+SHAPE_BBOX_ONLY_THRESHOLD = 2000
+
+def _drawing_has_curve(drawing):
+    return any(item[0] == 'c' for item in drawing.get('items', ()))
+
+def _merge_drawings(drawings):
+    tol = SHAPE_MERGE_TOLERANCE
+    groups = []
+    for drawing in drawings:
+        rect = drawing.get('rect')
+        if not rect:
+            continue
+        x0, y0, x1, y1 = rect
+        if x1 - x0 < SHAPE_MIN_SIZE or y1 - y0 < SHAPE_MIN_SIZE:
+            continue
+
+        style = (drawing.get('type'), drawing.get('fill'), drawing.get('color'), drawing.get('width'))
+        if groups:
+            last = groups[-1]
+            gx0, gy0, gx1, gy1 = last["bbox"]
+            if last["style"] == style and x0 <= gx1 + tol and gx0 <= x1 + tol and y0 <= gy1 + tol and gy0 <= y1 + tol:
+                last["bbox"] = (min(gx0, x0), min(gy0, y0), max(gx1, x1), max(gy1, y1))
+                last["drawings"].append(drawing)
+                continue
+        groups.append({"bbox": (x0, y0, x1, y1), "style": style, "drawings": [drawing]})
+    return groups
+
+def _extract_editable_shapes(doc, page_index):
     editable_shapes = []
     if not doc or not (0 <= page_index < doc.page_count):
         return [], "Invalid document or page index for shape extraction."
     try:
         page = doc.load_page(page_index)
-        drawings = page.get_drawings()
-        for drawing in drawings:
-            try:
-                rect = drawing.get('rect')
-                if not rect:
-                    continue
-                r = fitz.Rect(rect)
-                if r.is_empty or not r.is_valid:
-                    continue
-                if r.width < 2 or r.height < 2:
-                    continue
+        groups = _merge_drawings(_page_drawings(doc, page))
+        bbox_only = len(groups) > SHAPE_BBOX_ONLY_THRESHOLD
 
-                bbox = (r.x0, r.y0, r.x1, r.y1)
-
-                items = drawing.get('items', [])
-                shape_type = EditableShape.SHAPE_RECTANGLE  # default
-                for item in items:
-                    if item[0] == 'c':  
-                        shape_type = EditableShape.SHAPE_ELLIPSE
-                        break
+        for group in groups:
+            try:
+                first = group["drawings"][0]
+                shape_type = EditableShape.SHAPE_RECTANGLE
+                if not bbox_only and any(_drawing_has_curve(d) for d in group["drawings"]):
+                    shape_type = EditableShape.SHAPE_ELLIPSE
 
-                raw_fill = drawing.get('fill')     
-                raw_stroke = drawing.get('color')  
-                raw_width = drawing.get('width', 1.0)
+                raw_fill = first.get('fill')     
+                raw_stroke = first.get('color')  
+                raw_width = first.get('width', 1.0)
 
                 is_transparent = (raw_fill is None)
                 fill_color = raw_fill if raw_fill else (1.0, 1.0, 1.0)
@@ -712,7 +1288,7 @@ def extract_editable_shapes(doc, page_index):
 
                 shape_obj = EditableShape(
                     shape_type=shape_type,
-                    bbox=bbox,
+                    bbox=group["bbox"],
                     fill_color=fill_color,
                     stroke_color=stroke_color,
                     stroke_width=stroke_width,
@@ -721,12 +1297,15 @@ def extract_editable_shapes(doc, page_index):
                     is_transparent=is_transparent
                 )
                 shape_obj.is_baked = True
+                shape_obj.seqnos = tuple(d.get('seqno') for d in group["drawings"])
+                shape_obj.source_generation = page_generation(doc, page_index)
+                shape_obj.paths_loaded = not bbox_only
                 editable_shapes.append(shape_obj)
             except Exception as item_err:
                 print(f"Warning: skipping drawing item: {item_err}")
                 continue
 
-        print(f"DEBUG: Extracted {len(editable_shapes)} shapes from page {page_index}")
+        tracing.counter("extract.shapes", page=page_index, objects=len(editable_shapes), bbox_only=int(bbox_only))
         return editable_shapes, None
     except Exception as e:
         error_msg = f"Error extracting shapes from page {page_index}: {e}"
@@ -734,55 +1313,277 @@ def extract_editable_shapes(doc, page_index):
         traceback.print_exc()
         return [], error_msg
 
-_page_snapshots: dict = {}
+@_serialized
+def _page_drawings(doc, page):
+    session = get_session(doc)
+    key = (page.number, session.page_generations.get(page.number, 0))
+    drawings = session.drawings.get(key)
+    if drawings is not None:
+        session.drawings.move_to_end(key)
+        return drawings
+    drawings = session.drawings[key] = page.get_cdrawings()
+    while len(session.drawings) > TEXT_PAGE_CACHE_LIMIT:
+        session.drawings.popitem(last=False)
+    return drawings
+
+def _rect_within(rect, bbox, tol=SHAPE_MERGE_TOLERANCE):
+    return (rect[0] >= bbox[0] - tol and rect[1] >= bbox[1] - tol and
+            rect[2] <= bbox[2] + tol and rect[3] <= bbox[3] + tol)
+
+def _shape_source_drawings(doc, page, shape_obj):
+    bbox = shape_obj.original_bbox
+    drawings = _page_drawings(doc, page)
+    if shape_obj.source_generation == page_generation(doc, page.number):
+        wanted = set(shape_obj.seqnos)
+        matched = [d for d in drawings if d.get('seqno') in wanted and d.get('rect') and _rect_within(d['rect'], bbox)]
+        if len(matched) == len(wanted):
+            return matched
+    for group in _merge_drawings(drawings):
+        if all(abs(a - b) <= SHAPE_MERGE_TOLERANCE for a, b in zip(group["bbox"], bbox)):
+            shape_obj.seqnos = tuple(d.get('seqno') for d in group["drawings"])
+            shape_obj.source_generation = page_generation(doc, page.number)
+            return group["drawings"]
+    return None
+
+@_serialized
+def load_shape_paths(doc, shape_obj):
+    if shape_obj.paths_loaded or shape_obj.is_new or getattr(shape_obj, '_ghost_redacted', False) or not shape_obj.seqnos:
+        return True, None
+    try:
+        page = doc.load_page(shape_obj.page_number)
+        drawings = _shape_source_drawings(doc, page, shape_obj)
+        if drawings and any(_drawing_has_curve(d) for d in drawings):
+            shape_obj.shape_type = EditableShape.SHAPE_ELLIPSE
+        shape_obj.paths_loaded = True
+        return True, None
+    except Exception as e:
+        print(f"Warning: could not load paths for shape on page {shape_obj.page_number}: {e}")
+        return False, str(e)
 
+@_serialized
+@tracing.traced("snapshot")
 def save_page_snapshot(doc, page_num: int, force: bool = False):
-    key = (id(doc), page_num)
-    if key in _page_snapshots and not force:
+    snapshots = get_session(doc).snapshots
+    if page_num in snapshots and not force:
         return  
     try:
         page = doc.load_page(page_num)
-        page.clean_contents()
-        xrefs = page.get_contents()
-        content = b""
-        for xref in xrefs:
-            raw = doc.xref_stream(xref)
-            if raw:
-                content += raw
-        _page_snapshots[key] = content
+        layers = _detach_layers(doc, page)
+        try:
+            _snapshot_base(doc, page, page_num)
+        finally:
+            _attach_layers(doc, page, layers)
     except Exception as e:
         print(f"Warning: could not save snapshot for page {page_num}: {e}")
 
+def _snapshot_base(doc, page, page_num):
+    snapshots = get_session(doc).snapshots
+    page.clean_contents()
+    content = b""
+    for xref in page.get_contents():
+        raw = doc.xref_stream(xref)
+        if raw:
+            content += raw
+    snapshots.put(page_num, content)
+    tracing.counter("snapshot.store", **snapshots.memory_usage())
+
+def _restore_base(doc, page, content):
+    page.clean_contents()
+    xrefs = page.get_contents()
+    if xrefs:
+        doc.update_stream(xrefs[0], content)
+        for extra_xref in xrefs[1:]:
+            try:
+                doc.xref_set_key(extra_xref, "Length", "0")
+            except Exception:
+                pass
+    else:
+        xref = doc.get_new_xref()
+        doc.update_object(xref, "<<>>")
+        doc.update_stream(xref, content)
+        _set_page_contents(doc, page, [xref])
 
-def restore_page_from_snapshot(doc, page_num: int) -> bool:
-    key = (id(doc), page_num)
-    if key not in _page_snapshots:
-        return False
+@_serialized
+def release_page_snapshots(doc):
+    get_session(doc).snapshots.clear()
+
+def _redaction_mode(obj):
+    if isinstance(obj, EditableText):
+        return (fitz.PDF_REDACT_IMAGE_NONE, False)
+    if isinstance(obj, EditableImage):
+        return (fitz.PDF_REDACT_IMAGE_REMOVE, False)
+    return (fitz.PDF_REDACT_IMAGE_NONE, True)
+
+@contextlib.contextmanager
+def redaction_batch(doc):
+    if doc is None:
+        yield
+        return
+    session = get_session(doc)
+    with session.lock:
+        session.redaction_depth += 1
     try:
-        content = _page_snapshots[key]
+        yield
+    finally:
+        with session.lock:
+            session.redaction_depth -= 1
+            if session.redaction_depth == 0 and session.pending_redactions:
+                pending, session.pending_redactions = session.pending_redactions, {}
+                for page_num, entries in pending.items():
+                    success, error = _apply_page_redactions(doc, page_num, entries)
+                    if success:
+                        for _, _, obj in entries:
+                            obj._ghost_redacted = True
+                    else:
+                        print(f"Warning: could not erase ghosts from snapshot for page {page_num}: {error}")
+
+@_serialized
+def erase_original_object(doc, page_num, obj):
+    orig_bbox = getattr(obj, 'original_bbox', None) or obj.bbox
+    if isinstance(obj, EditableShape):
+        x0, y0, x1, y1 = orig_bbox
+        redact_rect = fitz.Rect(x0 - 20, y0 - 20, x1 + 20, y1 + 20)
+    else:
+        redact_rect = fitz.Rect(orig_bbox)
+    if isinstance(obj, EditableImage):
+        obj.pin_image_bytes()
+
+    entry = (redact_rect, _redaction_mode(obj), obj)
+    session = get_session(doc)
+    if session.redaction_depth:
+        entries = session.pending_redactions.setdefault(page_num, [])
+        if not any(queued is obj for _, _, queued in entries):
+            entries.append(entry)
+        return None, None
+    return _apply_page_redactions(doc, page_num, [entry])
+
+def _apply_page_redactions(doc, page_num, entries):
+    page = doc.load_page(page_num)
+    layers = _detach_layers(doc, page)
+    try:
+        content = get_session(doc).snapshots.get(page_num)
+        if content is not None:
+            _restore_base(doc, page, content)
+
+        groups = {}
+        for rect, mode, _ in entries:
+            groups.setdefault(mode, []).append(rect)
+        for (images, graphics), rects in groups.items():
+            for rect in rects:
+                page.add_redact_annot(rect)
+            try:
+                page.apply_redactions(images=images, graphics=graphics)
+            except Exception:
+                if not graphics:
+                    raise
+                page.apply_redactions()
+
         page = doc.load_page(page_num)
-        page.clean_contents()
-        xrefs = page.get_contents()
-        if xrefs:
-            doc.update_stream(xrefs[0], content)
-            for extra_xref in xrefs[1:]:
-                try:
-                    doc.xref_set_key(extra_xref, "Length", "0")
-                except Exception:
-                    pass
-        else:
-            xref = doc._newXref()
-            doc.update_stream(xref, content)
-        return True
+        _snapshot_base(doc, page, page_num)
+        tracing.counter("redactions", page=page_num, rects=len(entries))
+        return True, None
     except Exception as e:
-        print(f"Warning: could not restore snapshot for page {page_num}: {e}")
-        return False
+        return False, str(e)
+    finally:
+        _attach_layers(doc, page, layers)
+        mark_page_modified(doc, page_num)
 
-def release_page_snapshots(doc):
-    doc_id = id(doc)
-    keys_to_remove = [k for k in _page_snapshots if k[0] == doc_id]
-    for k in keys_to_remove:
-        del _page_snapshots[k]
+def _set_page_contents(doc, page, xrefs):
+    doc.xref_set_key(page.xref, "Contents", "[" + " ".join(f"{x} 0 R" for x in xrefs) + "]")
+
+def _detach_layers(doc, page):
+    layers = get_session(doc).layers.get(page.xref)
+    if not layers:
+        return None
+    streams = {layer["stream"] for _, layer in layers.values()}
+    _set_page_contents(doc, page, [x for x in page.get_contents() if x not in streams])
+    return layers
+
+def _attach_layers(doc, page, layers):
+    if not layers:
+        return
+    streams = [layer["stream"] for _, layer in layers.values()]
+    _set_page_contents(doc, page, [x for x in page.get_contents() if x not in streams] + streams)
+    for _, layer in layers.values():
+        _link_page_resource(doc, page, "XObject", layer["name"], f"{layer['form']} 0 R")
+
+def _form_bbox(doc, page):
+    box_type, box_val = doc.xref_get_key(page.xref, "MediaBox")
+    if box_type == "array":
+        return box_val
+    r = page.mediabox
+    return f"[{r.x0:g} {r.y0:g} {r.x1:g} {r.y1:g}]"
+
+def _page_resources_source(doc, page):
+    res_type, res_val = doc.xref_get_key(page.xref, "Resources")
+    if res_type == "xref":
+        return doc.xref_object(int(res_val.split()[0]), compressed=True)
+    return res_val if res_type == "dict" else "<<>>"
+
+def _form_xobjects_source(doc, page):
+    xobj_type, xobj_val = doc.xref_get_key(page.xref, "Resources/XObject")
+    if xobj_type == "xref":
+        xobj_val = doc.xref_object(int(xobj_val.split()[0]), compressed=True)
+    elif xobj_type != "dict":
+        return None
+    return LAYER_RESOURCE_PATTERN.sub("", xobj_val)
+
+def _build_object_layer(doc, page, obj):
+    page.wrap_contents()
+    before = page.get_contents()
+    success, error = _apply_single_object_to_page(doc, page, obj)
+    known = set(before)
+    added = [x for x in page.get_contents() if x not in known]
+    if not added:
+        return None, error
+    content = b"\n".join(doc.xref_stream(x) or b"" for x in added)
+
+    form_xref = doc.get_new_xref()
+    doc.update_object(form_xref, "<< /Type /XObject /Subtype /Form /BBox %s /Resources %s >>"
+                      % (_form_bbox(doc, page), _page_resources_source(doc, page)))
+    xobjects = _form_xobjects_source(doc, page)
+    if xobjects is not None:
+        doc.xref_set_key(form_xref, "Resources/XObject", xobjects)
+    doc.update_stream(form_xref, content)
+    name = f"WsLyr{form_xref}"
+    while _has_page_resource(doc, page, "XObject", name):
+        name += "x"
+    stream_xref = added[0]
+    doc.update_stream(stream_xref, f"q /{name} Do Q".encode())
+    _set_page_contents(doc, page, before + [stream_xref])
+    _link_page_resource(doc, page, "XObject", name, f"{form_xref} 0 R")
+    return {"form": form_xref, "stream": stream_xref, "name": name}, None if success else error
+
+@contextlib.contextmanager
+def _hidden_layer(doc, page, owner):
+    layers = get_session(doc).layers.get(page.xref) if owner is not None else None
+    entry = layers.get(id(owner)) if layers else None
+    if entry is None:
+        yield
+        return
+    contents = page.get_contents()
+    _set_page_contents(doc, page, [x for x in contents if x != entry[1]["stream"]])
+    try:
+        yield
+    finally:
+        _set_page_contents(doc, page, contents)
+
+def _drop_layer(doc, page, layer):
+    _set_page_contents(doc, page, [x for x in page.get_contents() if x != layer["stream"]])
+    _link_page_resource(doc, page, "XObject", layer["name"], "null")
+
+def _insert_image_data(doc, page, rect, data, keep_proportion=True):
+    registry = get_session(doc).image_registry
+    digest = hashlib.sha1(data).digest()
+    entry = registry.get(digest)
+    if entry is not None:
+        xref, length = entry
+        if doc.xref_get_key(xref, "Subtype") == ("name", "/Image") and doc.xref_get_key(xref, "Length")[1] == length:
+            return page.insert_image(rect, xref=xref, keep_proportion=keep_proportion)
+        del registry[digest]
+    xref = page.insert_image(rect, stream=data, keep_proportion=keep_proportion)
+    registry[digest] = (xref, doc.xref_get_key(xref, "Length")[1])
+    return xref
 
 def _apply_single_object_to_page(doc, page, obj):
     if isinstance(obj, EditableText):
@@ -790,6 +1591,8 @@ def _apply_single_object_to_page(doc, page, obj):
             font_arg, error_msg = _get_font_args_for_pymupdf(obj)
             if error_msg:
                 return False, error_msg
+            measure_font = font_arg.get("fontfile") or font_arg.get("fontname", "helv")
+            font_arg = _ensure_page_font(doc, page, font_arg)
             lines = obj.text.split('\n')
             line_height = obj.font_size * 1.2
             for i, line in enumerate(lines):
@@ -798,15 +1601,15 @@ def _apply_single_object_to_page(doc, page, obj):
                                  color=obj.color, overlay=True, **font_arg)
                 
                 if getattr(obj, 'is_underline', False):
-                    calc_font = font_arg.get("fontname", "helv")
-                    if calc_font.startswith("word-sys"):
-                        calc_font = "helv"
-                    text_len = fitz.get_text_length(line, fontname=calc_font, fontsize=obj.font_size)
+                    text_len = text_metrics.text_width_for_font(measure_font, line, obj.font_size)
                     p1 = fitz.Point(obj.x, obj.baseline + (i * line_height) + 1.5)
                     p2 = fitz.Point(obj.x + text_len, obj.baseline + (i * line_height) + 1.5)
                     page.draw_line(p1, p2, color=obj.color, width=0.8)
     elif isinstance(obj, EditableImage):
-        page.insert_image(obj.bbox, stream=obj.image_bytes, keep_proportion=False)
+        image_bytes = obj.image_bytes
+        if not image_bytes:
+            return False, f"Resim verisi okunamadı (xref={obj.xref})."
+        _insert_image_data(doc, page, obj.bbox, image_bytes, keep_proportion=False)
     elif isinstance(obj, EditableShape):
         rect = fitz.Rect(obj.bbox)
         shape = page.new_shape()
@@ -820,41 +1623,58 @@ def _apply_single_object_to_page(doc, page, obj):
         shape.commit()
     return True, None
 
-def rebuild_page(doc, page_num: int, all_texts, all_shapes, all_images,
-                 exclude_obj=None):
-    if not restore_page_from_snapshot(doc, page_num):
-        print(f"Warning: no snapshot for page {page_num}, skipping restore")
-    try:
-        page = doc.load_page(page_num)
-        for obj in all_texts:
-            if getattr(obj, 'page_number', None) == page_num and obj is not exclude_obj:
-                if getattr(obj, 'is_new', False) or getattr(obj, '_ghost_redacted', False):
-                    _apply_single_object_to_page(doc, page, obj)
-        for obj in all_images:
-            if getattr(obj, 'page_number', None) == page_num and obj is not exclude_obj:
-                if getattr(obj, 'is_new', False) or getattr(obj, '_ghost_redacted', False):
-                    _apply_single_object_to_page(doc, page, obj)
-        for obj in all_shapes:
-            if getattr(obj, 'page_number', None) == page_num and obj is not exclude_obj:
-                if getattr(obj, 'is_new', False) or getattr(obj, '_ghost_redacted', False):
-                    _apply_single_object_to_page(doc, page, obj)
-        return True, None
-    except Exception as e:
-        print(f"ERROR: rebuild_page failed for page {page_num}: {e}")
-        traceback.print_exc()
-        return False, str(e)
-
-def apply_object_edit(doc, obj):
+@_serialized
+def apply_object_edit(doc, obj, owner=None):
     if not doc or not hasattr(obj, 'page_number') or obj.page_number is None:
         return False, "Invalid object or page number."
+    owner = obj if owner is None else owner
     try:
         page = doc.load_page(obj.page_number)
-        return _apply_single_object_to_page(doc, page, obj)
+        layers = get_session(doc).layers.setdefault(page.xref, OrderedDict())
+        previous = layers.pop(id(owner), None)
+        if previous is not None:
+            _drop_layer(doc, page, previous[1])
+        layer, error = _build_object_layer(doc, page, obj)
+        if layer is not None:
+            layers[id(owner)] = (owner, layer)
+        mark_page_modified(doc, obj.page_number)
+        return error is None, error
     except Exception as e:
         print(f"ERROR: An error occurred while applying object edit: {e}")
         traceback.print_exc()
         return False, f"Error while applying object edit: {e}"
     
+@_serialized
+def remove_object_edit(doc, owner):
+    page_num = getattr(owner, 'page_number', None)
+    if not doc or page_num is None:
+        return False
+    page = doc.load_page(page_num)
+    layers = get_session(doc).layers.get(page.xref)
+    entry = layers.pop(id(owner), None) if layers else None
+    if entry is None:
+        return False
+    _drop_layer(doc, page, entry[1])
+    mark_page_modified(doc, page_num)
+    return True
+
+@_serialized
+def has_object_layer(doc, owner):
+    page_num = getattr(owner, 'page_number', None)
+    if not doc or page_num is None:
+        return False
+    layers = get_session(doc).layers.get(doc.page_xref(page_num))
+    return bool(layers) and id(owner) in layers
+
+@_serialized
+def flatten_object_layers(doc, page_num):
+    page = doc.load_page(page_num)
+    if not get_session(doc).layers.pop(page.xref, None):
+        return False
+    save_page_snapshot(doc, page_num, force=True)
+    mark_page_modified(doc, page_num)
+    return True
+
 def create_new_pdf():
     try:
         doc = fitz.open()
@@ -863,6 +1683,7 @@ def create_new_pdf():
     except Exception as e:
         return None, f"Yeni PDF oluşturulurken hata: {e}"
 
+@_serialized
 def insert_blank_page(doc, page_index=None, width=None, height=None):
     try:
         if width is None or height is None:
@@ -880,11 +1701,13 @@ def insert_blank_page(doc, page_index=None, width=None, height=None):
                 height = default_height
         
         doc.new_page(width=width, height=height)
+        invalidate_document_cache(doc)
         return True, f"Sayfa sonuna eklendi (Sayfa {doc.page_count})"
     
     except Exception as e:
         return False, f"Sayfa eklenirken hata: {e}"
 
+@_serialized
 def merge_pdf_pages(target_doc, source_pdf_path, insert_position=None):
     try:
         source_doc = fitz.open(source_pdf_path)
@@ -894,6 +1717,7 @@ def merge_pdf_pages(target_doc, source_pdf_path, insert_position=None):
             return False, "Kaynak PDF boş.", 0
         
         target_doc.insert_pdf(source_doc, from_page=0, to_page=source_page_count - 1)
+        invalidate_document_cache(target_doc)
         
         source_doc.close()
         
@@ -902,6 +1726,7 @@ def merge_pdf_pages(target_doc, source_pdf_path, insert_position=None):
     except Exception as e:
         return False, f"PDF birleştirme sırasında hata: {e}", 0
 
+@_serialized
 def move_page(doc, from_index, to_index):
     try:
         if from_index < 0 or from_index >= doc.page_count:
@@ -914,12 +1739,14 @@ def move_page(doc, from_index, to_index):
             return True, "Sayfa zaten bu konumda."
         
         doc.move_page(from_index, to_index)
+        invalidate_document_cache(doc)
         
         return True, f"Sayfa {from_index + 1} → {to_index + 1} konumuna taşındı."
     
     except Exception as e:
         return False, f"Sayfa taşıma sırasında hata: {e}"
 
+@_serialized
 def delete_page(doc, page_index):
     try:
         if not doc:
@@ -932,11 +1759,13 @@ def delete_page(doc, page_index):
             return False, f"Geçersiz sayfa indeksi: {page_index + 1}"
         
         doc.delete_page(page_index)
+        invalidate_document_cache(doc)
         return True, f"Sayfa {page_index + 1} silindi."
     
     except Exception as e:
         return False, f"Sayfa silme sırasında hata: {e}"
 
+@_serialized
 def add_highlight_annotation(doc, page_index, rect_unzoomed, color=(1, 0.93, 0)):
     if not doc or not (0 <= page_index < doc.page_count):
         return False, "Invalid document or page index."
@@ -953,6 +1782,7 @@ def add_highlight_annotation(doc, page_index, rect_unzoomed, color=(1, 0.93, 0))
         traceback.print_exc()
         return False, f"Highlight annotation error: {e}"
 
+@_serialized
 def remove_highlight_annotations(doc, page_index, rect_unzoomed=None):
     if not doc or not (0 <= page_index < doc.page_count):
         return False, "Invalid document or page index."
@@ -978,52 +1808,47 @@ def remove_highlight_annotations(doc, page_index, rect_unzoomed=None):
         traceback.print_exc()
         return False, f"Error removing highlights: {e}"
 
+@_serialized
 def get_text_in_rect(doc, page_index, rect_unzoomed):
     if not doc or not (0 <= page_index < doc.page_count):
         return ""
     try:
-        page = doc.load_page(page_index)
+        page, textpage = get_text_page(doc, page_index)
         r = fitz.Rect(*rect_unzoomed)
-        words = page.get_text("words", clip=r, sort=True)
+        words = page.get_text("words", clip=r, sort=True, textpage=textpage)
         return " ".join(w[4] for w in words)
     except Exception as e:
         print(f"get_text_in_rect error: {e}")
         return ""
 
+@_serialized
 def get_word_at_pos(doc, page_index, pos_unzoomed):
     if not doc or not (0 <= page_index < doc.page_count):
         return None
     try:
-        page = doc.load_page(page_index)
         x, y = pos_unzoomed
-        p = fitz.Point(x, y)
-        words = page.get_text("words")
-        for w in words:
-            r = fitz.Rect(w[0], w[1], w[2], w[3])
-            if r.contains(p):
-                return {'bbox': (w[0], w[1], w[2], w[3]), 'text': w[4]}
-        return None
+        model = get_page_text_model(doc, page_index)
+        hits = model.words_at_point(x, y)
+        if len(hits) == 0:
+            return None
+        i = int(hits[0])
+        return {'bbox': tuple(model.word_bboxes[i].tolist()), 'text': model.word_text(i)}
     except Exception as e:
         print(f"get_word_at_pos error: {e}")
         return None
 
+@_serialized
 def get_block_at_pos(doc, page_index, pos_unzoomed):
     if not doc or not (0 <= page_index < doc.page_count):
         return None
     try:
-        page = doc.load_page(page_index)
         x, y = pos_unzoomed
-        p = fitz.Point(x, y)
-        
-        text_dict = page.get_text("dict")
-        for block in text_dict["blocks"]:
-            if block["type"] == 0:
-                for line in block["lines"]:
-                    r = fitz.Rect(line["bbox"])
-                    if r.contains(p):
-                        line_text = "".join(span["text"] for span in line["spans"])
-                        return {'bbox': line["bbox"], 'text': line_text}
-        return None
+        model = get_page_text_model(doc, page_index)
+        hits = model.lines_at_point(x, y)
+        if len(hits) == 0:
+            return None
+        i = int(hits[0])
+        return {'bbox': tuple(model.line_hit_bboxes[i].tolist()), 'text': model.line_raw_text(i)}
     except Exception as e:
         print(f"get_block_at_pos error: {e}")
         return None
\ No newline at end of file
@@ -9,6 +9,7 @@ from gi.repository import Gtk, Gdk, GLib, GdkPixbuf
 import cairo
 import fitz
 from .i18n import _
+from . import pdf_handler
 
 
 def print_document(parent_window, doc):
@@ -37,20 +38,21 @@ def print_document(parent_window, doc):
             print_width = print_context.get_width()
             print_height = print_context.get_height()
 
-            page = doc.load_page(page_nr)
-            page_rect = page.rect
-            pdf_w = page_rect.width
-            pdf_h = page_rect.height
-
-            if pdf_w <= 0 or pdf_h <= 0:
-                return
-
-            scale_x = print_width / pdf_w
-            scale_y = print_height / pdf_h
-            scale = min(scale_x, scale_y)
-            render_scale = scale * 2.0
-            mat = fitz.Matrix(render_scale, render_scale)
-            pix = page.get_pixmap(matrix=mat, alpha=False)
+            with pdf_handler.document_lock(doc):
+                page = doc.load_page(page_nr)
+                page_rect = page.rect
+                pdf_w = page_rect.width
+                pdf_h = page_rect.height
+
+                if pdf_w <= 0 or pdf_h <= 0:
+                    return
+
+                scale_x = print_width / pdf_w
+                scale_y = print_height / pdf_h
+                scale = min(scale_x, scale_y)
+                render_scale = scale * 2.0
+                mat = fitz.Matrix(render_scale, render_scale)
+                pix = page.get_pixmap(matrix=mat, alpha=False)
             img_w = pix.width
             img_h = pix.height
             samples = pix.samples
@@ -0,0 +1,114 @@
+import tempfile
+import zlib
+from collections import OrderedDict
+
+SNAPSHOT_MEMORY_LIMIT = 32 * 1024 * 1024
+SNAPSHOT_COMPRESS_LEVEL = 1
+
+class PageSnapshotStore:
+    def __init__(self, memory_limit=SNAPSHOT_MEMORY_LIMIT, level=SNAPSHOT_COMPRESS_LEVEL):
+        self.memory_limit = memory_limit
+        self.level = level
+        self._memory = OrderedDict()
+        self._spilled = {}
+        self._raw_sizes = {}
+        self._memory_bytes = 0
+        self._spill_file = None
+        self._spill_end = 0
+        self._spill_dead = 0
+
+    def __contains__(self, page_num):
+        return page_num in self._memory or page_num in self._spilled
+
+    def __len__(self):
+        return len(self._memory) + len(self._spilled)
+
+    def put(self, page_num, content):
+        self.discard(page_num)
+        packed = zlib.compress(content, self.level)
+        self._memory[page_num] = packed
+        self._memory_bytes += len(packed)
+        self._raw_sizes[page_num] = len(content)
+        self._evict()
+
+    def get(self, page_num):
+        packed = self._memory.get(page_num)
+        if packed is not None:
+            self._memory.move_to_end(page_num)
+            return zlib.decompress(packed)
+
+        location = self._spilled.pop(page_num, None)
+        if location is None:
+            return None
+        offset, length = location
+        self._spill_file.seek(offset)
+        packed = self._spill_file.read(length)
+        self._spill_dead += length
+        self._memory[page_num] = packed
+        self._memory_bytes += length
+        self._evict()
+        self._compact_if_needed()
+        return zlib.decompress(packed)
+
+    def discard(self, page_num):
+        packed = self._memory.pop(page_num, None)
+        if packed is not None:
+            self._memory_bytes -= len(packed)
+        location = self._spilled.pop(page_num, None)
+        if location is not None:
+            self._spill_dead += location[1]
+        self._raw_sizes.pop(page_num, None)
+
+    def clear(self):
+        self._memory.clear()
+        self._spilled.clear()
+        self._raw_sizes.clear()
+        self._memory_bytes = 0
+        self._spill_end = 0
+        self._spill_dead = 0
+        if self._spill_file is not None:
+            self._spill_file.seek(0)
+            self._spill_file.truncate()
+
+    def close(self):
+        self.clear()
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    def memory_usage(self):
+        return {
+            "pages": len(self),
+            "raw_bytes": sum(self._raw_sizes.values()),
+            "memory_bytes": self._memory_bytes,
+            "disk_bytes": self._spill_end - self._spill_dead,
+        }
+
+    def _evict(self):
+        while self._memory_bytes > self.memory_limit and len(self._memory) > 1:
+            page_num, packed = self._memory.popitem(last=False)
+            self._memory_bytes -= len(packed)
+            self._spill(page_num, packed)
+
+    def _spill(self, page_num, packed):
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile(prefix="word-sys-pdf-snapshots-")
+        self._spill_file.seek(self._spill_end)
+        self._spill_file.write(packed)
+        self._spilled[page_num] = (self._spill_end, len(packed))
+        self._spill_end += len(packed)
+
+    def _compact_if_needed(self):
+        if self._spill_dead * 2 <= self._spill_end:
+            return
+        entries = []
+        for page_num, (offset, length) in self._spilled.items():
+            self._spill_file.seek(offset)
+            entries.append((page_num, self._spill_file.read(length)))
+        self._spilled.clear()
+        self._spill_file.seek(0)
+        self._spill_file.truncate()
+        self._spill_end = 0
+        self._spill_dead = 0
+        for page_num, packed in entries:
+            self._spill(page_num, packed)
@@ -0,0 +1,167 @@
+import numpy as np
+
+DEFAULT_CELL_SIZE = 48.0
+MAX_CELLS_PER_ITEM = 1024
+
+class SpatialIndex:
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE):
+        self.cell_size = float(cell_size)
+        self._cells = {}
+        self._oversized = set()
+        self._slot_of = {}
+        self._objects = []
+        self._free = []
+        self._bboxes = np.zeros((16, 4), dtype=np.float64)
+        self._seq = np.zeros(16, dtype=np.int64)
+        self._counter = 0
+
+    @classmethod
+    def bulk(cls, objects, bboxes, cell_size=DEFAULT_CELL_SIZE):
+        index = cls(cell_size)
+        n = len(objects)
+        if n == 0:
+            return index
+        arr = np.asarray(bboxes, dtype=np.float64).reshape(n, 4)
+        index._bboxes = np.column_stack((
+            np.minimum(arr[:, 0], arr[:, 2]), np.minimum(arr[:, 1], arr[:, 3]),
+            np.maximum(arr[:, 0], arr[:, 2]), np.maximum(arr[:, 1], arr[:, 3]),
+        ))
+        index._seq = np.arange(n, dtype=np.int64)
+        index._counter = n
+        index._objects = list(objects)
+        for slot, obj in enumerate(index._objects):
+            index._slot_of[id(obj)] = slot
+            index._link(slot)
+        return index
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def __contains__(self, obj):
+        return id(obj) in self._slot_of
+
+    def clear(self):
+        self.__init__(self.cell_size)
+
+    def _cell_span(self, x1, y1, x2, y2):
+        cs = self.cell_size
+        return int(x1 // cs), int(y1 // cs), int(x2 // cs), int(y2 // cs)
+
+    def _link(self, slot):
+        cx1, cy1, cx2, cy2 = self._cell_span(*self._bboxes[slot])
+        if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > MAX_CELLS_PER_ITEM:
+            self._oversized.add(slot)
+            return
+        cells = self._cells
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket is None:
+                    cells[(cx, cy)] = {slot}
+                else:
+                    bucket.add(slot)
+
+    def _unlink(self, slot):
+        if slot in self._oversized:
+            self._oversized.discard(slot)
+            return
+        cx1, cy1, cx2, cy2 = self._cell_span(*self._bboxes[slot])
+        cells = self._cells
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket is not None:
+                    bucket.discard(slot)
+                    if not bucket:
+                        del cells[(cx, cy)]
+
+    def _store_bbox(self, slot, bbox):
+        x1, y1, x2, y2 = bbox
+        self._bboxes[slot] = (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+
+    def insert(self, obj, bbox=None):
+        bbox = obj.bbox if bbox is None else bbox
+        if not bbox:
+            return
+        if id(obj) in self._slot_of:
+            self.remove(obj)
+
+        if self._free:
+            slot = self._free.pop()
+            self._objects[slot] = obj
+        else:
+            slot = len(self._objects)
+            self._objects.append(obj)
+            if slot >= len(self._seq):
+                grow = max(16, len(self._seq))
+                self._bboxes = np.concatenate((self._bboxes, np.zeros((grow, 4), dtype=np.float64)))
+                self._seq = np.concatenate((self._seq, np.zeros(grow, dtype=np.int64)))
+
+        self._slot_of[id(obj)] = slot
+        self._store_bbox(slot, bbox)
+        self._seq[slot] = self._counter
+        self._counter += 1
+        self._link(slot)
+
+    def update(self, obj, bbox=None):
+        slot = self._slot_of.get(id(obj))
+        if slot is None:
+            self.insert(obj, bbox)
+            return
+        bbox = obj.bbox if bbox is None else bbox
+        if not bbox:
+            self.remove(obj)
+            return
+        self._unlink(slot)
+        self._store_bbox(slot, bbox)
+        self._link(slot)
+
+    def remove(self, obj):
+        slot = self._slot_of.pop(id(obj), None)
+        if slot is None:
+            return
+        self._unlink(slot)
+        self._objects[slot] = None
+        self._free.append(slot)
+
+    def _candidates(self, x1, y1, x2, y2):
+        cx1, cy1, cx2, cy2 = self._cell_span(x1, y1, x2, y2)
+        found = set(self._oversized)
+        cells = self._cells
+        if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > len(cells):
+            for (cx, cy), bucket in cells.items():
+                if cx1 <= cx <= cx2 and cy1 <= cy <= cy2:
+                    found |= bucket
+        else:
+            for cx in range(cx1, cx2 + 1):
+                for cy in range(cy1, cy2 + 1):
+                    bucket = cells.get((cx, cy))
+                    if bucket:
+                        found |= bucket
+        if not found:
+            return None
+        return np.fromiter(found, dtype=np.int64, count=len(found))
+
+    def _ordered(self, slots):
+        slots = slots[np.argsort(-self._seq[slots], kind="stable")]
+        return [self._objects[i] for i in slots]
+
+    def query_point(self, x, y, tolerance=0.0):
+        slots = self._candidates(x - tolerance, y - tolerance, x + tolerance, y + tolerance)
+        if slots is None:
+            return []
+        b = self._bboxes[slots]
+        hit = ((b[:, 0] - tolerance <= x) & (x <= b[:, 2] + tolerance) &
+               (b[:, 1] - tolerance <= y) & (y <= b[:, 3] + tolerance))
+        return self._ordered(slots[hit])
+
+    def query_rect(self, rect):
+        x1, y1, x2, y2 = rect
+        x1, x2 = min(x1, x2), max(x1, x2)
+        y1, y2 = min(y1, y2), max(y1, y2)
+        slots = self._candidates(x1, y1, x2, y2)
+        if slots is None:
+            return []
+        b = self._bboxes[slots]
+        hit = (b[:, 0] <= x2) & (x1 <= b[:, 2]) & (b[:, 1] <= y2) & (y1 <= b[:, 3])
+        return self._ordered(slots[hit])
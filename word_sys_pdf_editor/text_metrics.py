@@ -0,0 +1,133 @@
+import os
+import fitz
+import numpy as np
+from collections import OrderedDict
+
+from . import utils
+
+_BASE14_FALLBACK = {
+    (False, False): "helv",
+    (True, False): "hebo",
+    (False, True): "heit",
+    (True, True): "hebi",
+}
+
+LINE_SPACING = 1.2
+
+_fonts = {}
+_variants = {}
+_advances = {}
+_offsets = OrderedDict()
+_OFFSETS_LIMIT = 512
+
+def _load_font(font_key):
+    font = _fonts.get(font_key)
+    if font is not None:
+        return font
+    try:
+        if os.path.isfile(font_key):
+            font = fitz.Font(fontfile=font_key)
+        else:
+            font = fitz.Font(font_key)
+    except Exception as e:
+        print(f"UYARI: Metrik fontu yüklenemedi ({font_key}): {e}")
+        font = _fonts.get("helv") or fitz.Font("helv")
+    _fonts[font_key] = font
+    return font
+
+def resolve_font(family, is_bold=False, is_italic=False):
+    key = (family, bool(is_bold), bool(is_italic))
+    font_key = _variants.get(key)
+    if font_key is not None:
+        return font_key
+
+    path = None
+    if utils.FONT_SCAN_COMPLETED.is_set():
+        path = utils.find_specific_font_variant(family, is_bold, is_italic) or utils.get_default_unicode_font_path()
+    if path:
+        _variants[key] = path
+        return path
+    return _BASE14_FALLBACK[(bool(is_bold), bool(is_italic))]
+
+def _advance_table(font_key, size):
+    table = _advances.get((font_key, size))
+    if table is None:
+        table = _advances[(font_key, size)] = {}
+    return table
+
+def char_offsets_for_font(font_key, text, size):
+    cache_key = (font_key, size, text)
+    offsets = _offsets.get(cache_key)
+    if offsets is not None:
+        _offsets.move_to_end(cache_key)
+        return offsets
+
+    table = _advance_table(font_key, size)
+    missing = set(text).difference(table)
+    if missing:
+        font = _load_font(font_key)
+        for ch in missing:
+            table[ch] = font.glyph_advance(ord(ch)) * size if ch != '\n' else 0.0
+
+    offsets = np.zeros(len(text) + 1, dtype=np.float64)
+    if text:
+        np.cumsum(np.fromiter(map(table.__getitem__, text), dtype=np.float64, count=len(text)), out=offsets[1:])
+    offsets.setflags(write=False)
+
+    _offsets[cache_key] = offsets
+    if len(_offsets) > _OFFSETS_LIMIT:
+        _offsets.popitem(last=False)
+    return offsets
+
+def char_offsets(text, family, is_bold, is_italic, size):
+    return char_offsets_for_font(resolve_font(family, is_bold, is_italic), text, float(size))
+
+def text_width_for_font(font_key, text, size):
+    return float(char_offsets_for_font(font_key, text, float(size))[-1])
+
+def text_width(text, family, is_bold, is_italic, size):
+    return float(char_offsets(text, family, is_bold, is_italic, size)[-1])
+
+def line_height(family, is_bold, is_italic, size):
+    font = _load_font(resolve_font(family, is_bold, is_italic))
+    return (font.ascender - font.descender) * float(size)
+
+def layout_bbox(x, y, text, family, is_bold, is_italic, size):
+    lines = (text or "A").split('\n')
+    width = max(text_width(line, family, is_bold, is_italic, size) for line in lines)
+    height = line_height(family, is_bold, is_italic, size) + (len(lines) - 1) * float(size) * LINE_SPACING
+    return (x, y, x + width, y + height)
+
+def text_bbox(obj, text=None):
+    return layout_bbox(obj.x, obj.y, obj.text if text is None else text,
+                       obj.font_family_base, obj.is_bold, obj.is_italic, obj.font_size)
+
+def char_boundaries(obj):
+    x1, _, x2, _ = obj.bbox
+    offsets = char_offsets(obj.text or "", obj.font_family_base, obj.is_bold, obj.is_italic, obj.font_size)
+    total = offsets[-1]
+    if total <= 0:
+        return np.linspace(x1, x2, len(offsets))
+    return x1 + offsets * ((x2 - x1) / total)
+
+def range_bbox(obj, start_char, end_char):
+    x1, y1, x2, y2 = obj.bbox
+    if not obj.text:
+        return (x1, y1, x2, y2)
+    n = len(obj.text)
+    start_char = max(0, min(start_char, n))
+    end_char = max(start_char, min(end_char, n))
+    xs = char_boundaries(obj)
+    return (float(xs[start_char]), y1, float(xs[end_char]), y2)
+
+def char_index_at(obj, x):
+    if not obj.text:
+        return 0
+    xs = char_boundaries(obj)
+    mids = (xs[:-1] + xs[1:]) * 0.5
+    return int(np.searchsorted(mids, x))
+
+def clear_cache():
+    _variants.clear()
+    _advances.clear()
+    _offsets.clear()
@@ -0,0 +1,123 @@
+import numpy as np
+
+def _empty_boxes():
+    return np.zeros((0, 4), dtype=np.float64)
+
+def _pack_texts(texts):
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    if texts:
+        np.cumsum([len(t) for t in texts], out=offsets[1:])
+    return "".join(texts), offsets
+
+def _point_hits(boxes, x, y, tolerance):
+    return np.flatnonzero((boxes[:, 0] - tolerance <= x) & (x <= boxes[:, 2] + tolerance) &
+                          (boxes[:, 1] - tolerance <= y) & (y <= boxes[:, 3] + tolerance))
+
+class PageTextModel:
+    def __init__(self):
+        self.fonts = []
+        self.line_bboxes = _empty_boxes()
+        self.line_hit_bboxes = _empty_boxes()
+        self.baselines = np.zeros(0, dtype=np.float64)
+        self.font_sizes = np.zeros(0, dtype=np.float64)
+        self.colors = np.zeros(0, dtype=np.uint32)
+        self.flags = np.zeros(0, dtype=np.int32)
+        self.font_ids = np.zeros(0, dtype=np.int32)
+        self.line_blocks = np.zeros(0, dtype=np.int32)
+        self._line_text, self._line_offsets = _pack_texts([])
+        self.word_bboxes = _empty_boxes()
+        self.word_lines = np.zeros(0, dtype=np.int32)
+        self._word_text, self._word_offsets = _pack_texts([])
+
+    @classmethod
+    def from_text_dict(cls, text_dict, words=()):
+        model = cls()
+        font_ids = {}
+        bboxes, hit_bboxes, baselines, sizes, colors, flags, fonts, blocks, texts = [], [], [], [], [], [], [], [], []
+        line_of = {}
+
+        for block_no, block in enumerate(text_dict.get("blocks", [])):
+            if block.get("type") != 0:
+                continue
+            for line_no, line in enumerate(block.get("lines", [])):
+                parts = []
+                first_span = None
+                min_x = min_y = float('inf')
+                max_x = max_y = float('-inf')
+                for span in line.get("spans", []):
+                    text = span.get("text", "")
+                    if not text:
+                        continue
+                    if first_span is None:
+                        first_span = span
+                    parts.append(text)
+                    bbox = span.get("bbox")
+                    if bbox:
+                        min_x = min(min_x, bbox[0])
+                        min_y = min(min_y, bbox[1])
+                        max_x = max(max_x, bbox[2])
+                        max_y = max(max_y, bbox[3])
+
+                if first_span is None:
+                    continue
+                text = "".join(parts)
+
+                bbox = (min_x, min_y, max_x, max_y) if min_x != float('inf') else tuple(first_span.get("bbox", (0, 0, 100, 100)))
+                font = first_span.get("font", "Liberation Sans")
+                font_id = font_ids.get(font)
+                if font_id is None:
+                    font_id = font_ids[font] = len(model.fonts)
+                    model.fonts.append(font)
+
+                line_of[(block_no, line_no)] = len(texts)
+                bboxes.append(bbox)
+                hit_bboxes.append(tuple(line.get("bbox", bbox)))
+                baselines.append(first_span.get("origin", (0, bbox[3]))[1])
+                sizes.append(first_span.get("size", 11))
+                colors.append(first_span.get("color", 0))
+                flags.append(first_span.get("flags", 0))
+                fonts.append(font_id)
+                blocks.append(block_no)
+                texts.append(text)
+
+        if texts:
+            model.line_bboxes = np.asarray(bboxes, dtype=np.float64).reshape(len(texts), 4)
+            model.line_hit_bboxes = np.asarray(hit_bboxes, dtype=np.float64).reshape(len(texts), 4)
+            model.baselines = np.asarray(baselines, dtype=np.float64)
+            model.font_sizes = np.asarray(sizes, dtype=np.float64)
+            model.colors = np.asarray(colors, dtype=np.uint32)
+            model.flags = np.asarray(flags, dtype=np.int32)
+            model.font_ids = np.asarray(fonts, dtype=np.int32)
+            model.line_blocks = np.asarray(blocks, dtype=np.int32)
+        model._line_text, model._line_offsets = _pack_texts(texts)
+
+        if words:
+            model.word_bboxes = np.asarray([w[:4] for w in words], dtype=np.float64).reshape(len(words), 4)
+            model.word_lines = np.asarray([line_of.get((w[5], w[6]), -1) for w in words], dtype=np.int32)
+            model._word_text, model._word_offsets = _pack_texts([w[4] for w in words])
+        return model
+
+    def __len__(self):
+        return len(self._line_offsets) - 1
+
+    @property
+    def word_count(self):
+        return len(self._word_offsets) - 1
+
+    def line_text(self, index):
+        return self.line_raw_text(index).strip()
+
+    def line_raw_text(self, index):
+        return self._line_text[self._line_offsets[index]:self._line_offsets[index + 1]]
+
+    def word_text(self, index):
+        return self._word_text[self._word_offsets[index]:self._word_offsets[index + 1]]
+
+    def line_font(self, index):
+        return self.fonts[self.font_ids[index]]
+
+    def lines_at_point(self, x, y, tolerance=0.0):
+        return _point_hits(self.line_hit_bboxes, x, y, tolerance)
+
+    def words_at_point(self, x, y, tolerance=0.0):
+        return _point_hits(self.word_bboxes, x, y, tolerance)
@@ -0,0 +1,109 @@
+import atexit
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+
+TRACE_ENV = "WORD_SYS_PDF_TRACE"
+
+_trace_target = os.environ.get(TRACE_ENV, "").strip()
+ENABLED = bool(_trace_target) and _trace_target.lower() not in ("0", "false", "no")
+
+_events = []
+_events_lock = threading.Lock()
+_pid = os.getpid()
+_t0 = time.perf_counter()
+
+def _now_us():
+    return (time.perf_counter() - _t0) * 1e6
+
+def _record(event):
+    event["pid"] = _pid
+    event["tid"] = threading.get_ident()
+    with _events_lock:
+        _events.append(event)
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    __slots__ = ("name", "cat", "args", "start")
+
+    def __init__(self, name, cat, args):
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = _now_us()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = _now_us()
+        if exc_type is not None:
+            self.args["error"] = repr(exc)
+        _record({"name": self.name, "cat": self.cat, "ph": "X",
+                 "ts": self.start, "dur": end - self.start, "args": self.args})
+        return False
+
+    def set(self, **args):
+        self.args.update(args)
+
+def span(name, cat="pdf", **args):
+    if not ENABLED:
+        return _NULL_SPAN
+    return _Span(name, cat, args)
+
+def traced(name, cat="pdf"):
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Span(name, cat, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def counter(name, cat="pdf", **values):
+    if ENABLED:
+        _record({"name": name, "cat": cat, "ph": "C", "ts": _now_us(), "args": values})
+
+def instant(name, cat="pdf", **args):
+    if ENABLED:
+        _record({"name": name, "cat": cat, "ph": "i", "s": "t", "ts": _now_us(), "args": args})
+
+def _trace_path():
+    if _trace_target.lower().endswith(".json"):
+        return os.path.expanduser(_trace_target)
+    return os.path.join(tempfile.gettempdir(), f"word-sys-pdf-trace-{_pid}.json")
+
+def write_trace(path=None):
+    path = path or _trace_path()
+    with _events_lock:
+        events = list(_events)
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=str)
+        print(f"İzleme kaydı yazıldı: {path} ({len(events)} olay)")
+    except OSError as e:
+        print(f"HATA: İzleme kaydı yazılamadı ({path}): {e}")
+    return path
+
+if ENABLED:
+    atexit.register(write_trace)
@@ -1,7 +1,27 @@
 import copy
+import contextlib
 from . import pdf_handler
-from .models import EditableText, EditableShape
-from .i18n import _
+from .models import EditableText, EditableShape, restore_state
+from .i18n import _, get_setting
+
+UNDO_MEMORY_BUDGET_MB = 128
+
+def _object_size(obj):
+    size = 512
+    text = getattr(obj, 'text', None)
+    if text:
+        size += 2 * len(text)
+    image_bytes = getattr(obj, '_image_bytes', None)
+    if image_bytes:
+        size += len(image_bytes)
+    return size
+
+def _properties_size(properties):
+    size = 64 * len(properties)
+    for value in properties.values():
+        if isinstance(value, (str, bytes, bytearray)):
+            size += len(value)
+    return size
 
 class Command:
     def __init__(self, window):
@@ -13,41 +33,37 @@ class Command:
     def undo(self):
         raise NotImplementedError
 
+    def subjects(self):
+        obj = (getattr(self, 'target_object', None) or getattr(self, 'new_object', None)
+               or getattr(self, 'deleted_object', None))
+        return [obj] if obj is not None else []
+
+    def payload_size(self):
+        return 0
+
+    @property
+    def page_num(self):
+        for obj in self.subjects():
+            page_num = getattr(obj, 'page_number', None)
+            if page_num is not None:
+                return page_num
+        return None
+
+    def _page_changed(self, page_num):
+        self.window.undo_manager.page_changed(page_num)
+
+    def _redraw(self):
+        self.window.undo_manager.request_redraw()
+
     def _erase_ghost_if_needed(self, target_object, page_num):
         if getattr(target_object, 'is_new', True) or getattr(target_object, '_ghost_redacted', False):
             return
-            
-        import fitz
-        from . import pdf_handler
-        from .models import EditableText, EditableImage, EditableShape
-        
-        pdf_handler.restore_page_from_snapshot(self.window.doc, page_num)
-        
-        orig_bbox = getattr(target_object, 'original_bbox', target_object.bbox)
-        if isinstance(target_object, EditableShape):
-            x0, y0, x1, y1 = orig_bbox
-            redact_rect = fitz.Rect(x0 - 20, y0 - 20, x1 + 20, y1 + 20)
-        else:
-            redact_rect = fitz.Rect(orig_bbox)
-        try:
-            page = self.window.doc.load_page(page_num)
-            page.add_redact_annot(redact_rect)
-            
-            if isinstance(target_object, EditableText):
-                page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_NONE, graphics=False)
-            elif isinstance(target_object, EditableImage):
-                page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_REMOVE, graphics=False)
-            else:
-                try:
-                    page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_NONE, graphics=True)
-                except Exception:
-                    page.apply_redactions()
-                    
-            self.window.doc.load_page(page_num)
-            pdf_handler.save_page_snapshot(self.window.doc, page_num, force=True)
+
+        success, error = pdf_handler.erase_original_object(self.window.doc, page_num, target_object)
+        if success:
             target_object._ghost_redacted = True
-        except Exception as e:
-            print(f"Warning: could not erase ghost from snapshot for page {page_num}: {e}")
+        elif success is False:
+            print(f"Warning: could not erase ghost from snapshot for page {page_num}: {error}")
 
 class UndoManager:
     def __init__(self, window):
@@ -55,120 +71,204 @@ class UndoManager:
         self.undo_stack = []
         self.redo_stack = []
         self._update_ui_callback = self.window._update_undo_redo_buttons
+        self._depth = 0
+        self._pending_commands = []
+        self._dirty_pages = set()
+        self._redraw_pending = False
+        self._subjects = {}
+        self._memory_total = 0
+        self._page_state_sizes = {}
+        self.memory_budget = int(get_setting("undo_memory_budget_mb", UNDO_MEMORY_BUDGET_MB)) * 1024 * 1024
+
+    @contextlib.contextmanager
+    def transaction(self):
+        self._depth += 1
+        try:
+            with pdf_handler.redaction_batch(self.window.doc):
+                yield self
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                self._flush()
+
+    def _flush(self):
+        commands, self._pending_commands = self._pending_commands, []
+        if len(commands) == 1:
+            self._push(commands[0])
+        elif commands:
+            self._push(CompositeCommand(self.window, commands))
+
+        pages, self._dirty_pages = self._dirty_pages, set()
+        for page_num in sorted(pages):
+            self.window._refresh_thumbnail(page_num)
+        if self._redraw_pending:
+            self._redraw_pending = False
+            self.window.pdf_view.queue_draw()
 
-    def add_command(self, command):
+    def page_changed(self, page_num):
+        if page_num is None:
+            return
+        if self._depth:
+            self._dirty_pages.add(page_num)
+        else:
+            self.window._refresh_thumbnail(page_num)
+
+    def request_redraw(self):
+        if self._depth:
+            self._redraw_pending = True
+        else:
+            self.window.pdf_view.queue_draw()
+
+    def _push(self, command):
         self.undo_stack.append(command)
+        self._retain(command)
+        dropped = list(self.redo_stack)
         self.redo_stack.clear()
+        for dropped_command in dropped:
+            self._release(dropped_command)
+        self._trim(dropped)
         self._update_ui_callback()
 
+    def _retain(self, command):
+        self._memory_total += command.payload_size()
+        for obj in command.subjects():
+            entry = self._subjects.get(id(obj))
+            if entry is None:
+                entry = self._subjects[id(obj)] = [0, 256 + _object_size(obj)]
+                self._memory_total += entry[1]
+            entry[0] += 1
+
+    def _release(self, command):
+        self._memory_total -= command.payload_size()
+        for obj in command.subjects():
+            entry = self._subjects.get(id(obj))
+            if entry is None:
+                continue
+            entry[0] -= 1
+            if entry[0] <= 0:
+                del self._subjects[id(obj)]
+                self._memory_total -= entry[1]
+
+    def _resize(self, command):
+        for obj in command.subjects():
+            entry = self._subjects.get(id(obj))
+            if entry is not None:
+                size = 256 + _object_size(obj)
+                self._memory_total += size - entry[1]
+                entry[1] = size
+
+    def _page_states_size(self):
+        sizes = {}
+        for page_num, state in self.window.page_states.items():
+            cached = self._page_state_sizes.get(page_num)
+            if cached is None or cached[0] is not state:
+                cached = (state, sum(256 + _object_size(obj) for objects in state for obj in objects))
+            sizes[page_num] = cached
+        self._page_state_sizes = sizes
+        return sum(size for _, size in sizes.values())
+
+    def memory_usage(self):
+        return self._memory_total + self._page_states_size()
+
+    def has_page(self, page_num):
+        return any(command.page_num == page_num for command in self.undo_stack + self.redo_stack)
+
+    def _trim(self, dropped=()):
+        dropped = list(dropped)
+        budget = self.memory_budget - self._page_states_size()
+        while len(self.undo_stack) > 1 and self._memory_total > budget:
+            command = self.undo_stack.pop(0)
+            self._release(command)
+            dropped.append(command)
+        for page_num in {command.page_num for command in dropped}:
+            if page_num is not None and not self.has_page(page_num):
+                self.window._forget_page_state(page_num)
+
+    def _show_page(self, command):
+        page_num = command.page_num
+        if page_num is not None and page_num != self.window.current_page_index:
+            self.window._load_page(page_num)
+
+    def add_command(self, command):
+        if self._depth:
+            self._pending_commands.append(command)
+        else:
+            self._push(command)
+
     def undo(self):
+        self.window.commit_pending_format_change()
         if not self.undo_stack:
             return
+        self._show_page(self.undo_stack[-1])
         command = self.undo_stack.pop()
-        command.undo()
+        with self.transaction():
+            command.undo()
+            self.request_redraw()
         self.redo_stack.append(command)
+        self._resize(command)
         self._update_ui_callback()
-        self.window.pdf_view.queue_draw()
 
     def redo(self):
+        self.window.commit_pending_format_change()
         if not self.redo_stack:
             return
+        self._show_page(self.redo_stack[-1])
         command = self.redo_stack.pop()
-        command.execute()
+        with self.transaction():
+            command.execute()
+            self.request_redraw()
         self.undo_stack.append(command)
+        self._resize(command)
         self._update_ui_callback()
-        self.window.pdf_view.queue_draw()
 
     def clear(self):
         self.undo_stack.clear()
         self.redo_stack.clear()
+        self._subjects.clear()
+        self._memory_total = 0
+        self.window.page_states.clear()
+        self._page_state_sizes.clear()
         self._update_ui_callback()
 
+def property_delta(old_properties, new_properties):
+    keys = [k for k in new_properties
+            if k == 'bbox' or k not in old_properties or old_properties[k] != new_properties[k]]
+    return ({k: old_properties[k] for k in keys if k in old_properties},
+            {k: new_properties[k] for k in keys})
+
 class EditObjectCommand(Command):
     def __init__(self, window, target_object, old_properties, new_properties):
         super().__init__(window)
         self.target_object = target_object
-        self.old_properties = old_properties
-        self.new_properties = new_properties
+        self.old_properties, self.new_properties = property_delta(old_properties, new_properties)
 
-    def _erase_ghost_if_needed(self, page_num, properties_to_clear):
-        if getattr(self.target_object, 'is_new', True) or getattr(self.target_object, '_ghost_redacted', False):
-            return
-            
-        import fitz
-        from . import pdf_handler
-        from .models import EditableText, EditableImage, EditableShape
-        
-        pdf_handler.restore_page_from_snapshot(self.window.doc, page_num)
-        
-        orig_bbox = getattr(self.target_object, 'original_bbox', self.target_object.bbox)
-        if isinstance(self.target_object, EditableShape):
-            x0, y0, x1, y1 = orig_bbox
-            redact_rect = fitz.Rect(x0 - 20, y0 - 20, x1 + 20, y1 + 20)
-        else:
-            redact_rect = fitz.Rect(orig_bbox)
-        try:
-            page = self.window.doc.load_page(page_num)
-            page.add_redact_annot(redact_rect)
-            
-            if isinstance(self.target_object, EditableText):
-                page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_NONE, graphics=False)
-            elif isinstance(self.target_object, EditableImage):
-                page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_REMOVE, graphics=False)
-            else:
-                try:
-                    page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_NONE, graphics=True)
-                except Exception:
-                    page.apply_redactions()
-                    
-            self.window.doc.load_page(page_num)
-            pdf_handler.save_page_snapshot(self.window.doc, page_num, force=True)
-            self.target_object._ghost_redacted = True
-        except Exception as e:
-            print(f"Warning: could not erase ghost from snapshot for page {page_num}: {e}")
+    def payload_size(self):
+        return _properties_size(self.old_properties) + _properties_size(self.new_properties)
 
     def _apply_properties_to_pdf(self, properties_to_apply, properties_to_clear):
         page_num = getattr(self.target_object, 'page_number', None)
         if page_num is not None:
-            self._erase_ghost_if_needed(page_num, properties_to_clear)
+            self._erase_ghost_if_needed(self.target_object, page_num)
             
         if isinstance(self.target_object, EditableShape):
-            temp_obj = copy.deepcopy(self.target_object)
-            temp_obj.__dict__.update(copy.deepcopy(properties_to_apply))
+            temp_obj = copy.copy(self.target_object)
+            restore_state(temp_obj, properties_to_apply)
             temp_obj.original_bbox = properties_to_clear['bbox']
-            if page_num is not None:
-                pdf_handler.rebuild_page(
-                    self.window.doc, page_num,
-                    self.window.editable_texts,
-                    self.window.editable_shapes,
-                    self.window.editable_images,
-                    exclude_obj=self.target_object
-                )
-            success, msg = pdf_handler.apply_object_edit(self.window.doc, temp_obj)
+            success, msg = pdf_handler.apply_object_edit(self.window.doc, temp_obj, owner=self.target_object)
             if success:
                 self.target_object.is_baked = True
                 if page_num is not None:
-                    self.window._refresh_thumbnail(page_num)
+                    self._page_changed(page_num)
             else:
                 from .ui_components import show_error_dialog
                 show_error_dialog(self.window, f"Şekil taşınırken hata: {msg}")
             return success
             
-        temp_obj_for_pdf = copy.deepcopy(self.target_object)
-        temp_obj_for_pdf.__dict__.update(copy.deepcopy(properties_to_apply))
+        temp_obj_for_pdf = copy.copy(self.target_object)
+        restore_state(temp_obj_for_pdf, properties_to_apply)
         temp_obj_for_pdf.original_bbox = properties_to_clear['bbox']
         
-        page_num_fallback = getattr(self.target_object, 'page_number', None)
-        if page_num_fallback is not None:
-            pdf_handler.rebuild_page(
-                self.window.doc, page_num_fallback,
-                self.window.editable_texts,
-                self.window.editable_shapes,
-                self.window.editable_images,
-                exclude_obj=self.target_object
-            )
-        
-        success, msg = pdf_handler.apply_object_edit(self.window.doc, temp_obj_for_pdf)
+        success, msg = pdf_handler.apply_object_edit(self.window.doc, temp_obj_for_pdf, owner=self.target_object)
         
         if not success:
             from .ui_components import show_error_dialog
@@ -177,26 +277,27 @@ class EditObjectCommand(Command):
         return success
 
     def _update_live_object(self, properties_to_apply):
-        self.target_object.__dict__.update(copy.deepcopy(properties_to_apply))
+        restore_state(self.target_object, properties_to_apply)
         self.target_object.original_bbox = self.target_object.bbox
         self.target_object.modified = False
+        self.window._reindex_object(self.target_object)
         self.window.document_modified = True
         if not isinstance(self.target_object, EditableShape):
             page_num = getattr(self.target_object, 'page_number', None)
             if page_num is not None:
-                self.window._refresh_thumbnail(page_num)
+                self._page_changed(page_num)
 
     def execute(self):
         if self._apply_properties_to_pdf(self.new_properties, self.old_properties):
             self._update_live_object(self.new_properties)
             self.window.status_label.set_text(_("change_applied"))
-            self.window.pdf_view.queue_draw()
+            self._redraw()
 
     def undo(self):
         if self._apply_properties_to_pdf(self.old_properties, self.new_properties):
             self._update_live_object(self.old_properties)
             self.window.status_label.set_text(_("reverted"))
-            self.window.pdf_view.queue_draw()
+            self._redraw()
 
 class AddObjectCommand(Command):
     def __init__(self, window, new_object):
@@ -209,7 +310,7 @@ class AddObjectCommand(Command):
     def _refresh_thumb(self):
         page_num = getattr(self.new_object, 'page_number', None)
         if page_num is not None:
-            self.window._refresh_thumbnail(page_num)
+            self._page_changed(page_num)
 
     def execute(self):
         if self.is_text:
@@ -221,21 +322,16 @@ class AddObjectCommand(Command):
         else:
             if self.new_object not in self.window.editable_images:
                 self.window.editable_images.append(self.new_object)
+        self.window._index_object(self.new_object)
                 
         self.new_object.is_baked = True
-        page_num = getattr(self.new_object, 'page_number', self.window.current_page_index)
-        pdf_handler.rebuild_page(
-            self.window.doc, page_num,
-            self.window.editable_texts,
-            self.window.editable_shapes,
-            self.window.editable_images
-        )
+        pdf_handler.apply_object_edit(self.window.doc, self.new_object)
         self._refresh_thumb()
 
         self.window.document_modified = True
         self.window.status_label.set_text(_("object_added"))
         self.window._update_ui_state()
-        self.window.pdf_view.queue_draw()
+        self._redraw()
 
     def undo(self):
         if self.is_text and self.new_object in self.window.editable_texts:
@@ -244,19 +340,15 @@ class AddObjectCommand(Command):
             self.window.editable_shapes.remove(self.new_object)
         elif self.is_image and self.new_object in self.window.editable_images:
             self.window.editable_images.remove(self.new_object)
+        self.window._unindex_object(self.new_object)
 
         page_num = getattr(self.new_object, 'page_number', self.window.current_page_index)
-        pdf_handler.rebuild_page(
-            self.window.doc, page_num,
-            self.window.editable_texts,
-            self.window.editable_shapes,
-            self.window.editable_images
-        )
+        pdf_handler.remove_object_edit(self.window.doc, self.new_object)
 
         self.window.document_modified = True
         self.window.status_label.set_text(_("reverted"))
-        self.window._refresh_thumbnail(page_num)
-        self.window.pdf_view.queue_draw()
+        self._page_changed(page_num)
+        self._redraw()
 
 
 
@@ -274,22 +366,18 @@ class DeleteObjectCommand(Command):
             self.window.editable_shapes.remove(self.deleted_object)
         elif not self.is_text and not self.is_shape and self.deleted_object in self.window.editable_images:
             self.window.editable_images.remove(self.deleted_object)
+        self.window._unindex_object(self.deleted_object)
 
         page_num = getattr(self.deleted_object, 'page_number', self.window.current_page_index)
         if page_num is not None:
             self._erase_ghost_if_needed(self.deleted_object, page_num)
             
-        pdf_handler.rebuild_page(
-            self.window.doc, page_num,
-            self.window.editable_texts,
-            self.window.editable_shapes,
-            self.window.editable_images
-        )
+        pdf_handler.remove_object_edit(self.window.doc, self.deleted_object)
 
         self.window.document_modified = True
         self.window.status_label.set_text(_("object_deleted"))
-        self.window._refresh_thumbnail(page_num)
-        self.window.pdf_view.queue_draw()
+        self._page_changed(page_num)
+        self._redraw()
 
     def undo(self):
         if self.is_text and self.deleted_object not in self.window.editable_texts:
@@ -298,29 +386,34 @@ class DeleteObjectCommand(Command):
             self.window.editable_shapes.append(self.deleted_object)
         elif not self.is_text and not self.is_shape and self.deleted_object not in self.window.editable_images:
             self.window.editable_images.append(self.deleted_object)
+        self.window._index_object(self.deleted_object)
 
         page_num = getattr(self.deleted_object, 'page_number', self.window.current_page_index)
-        pdf_handler.rebuild_page(
-            self.window.doc, page_num,
-            self.window.editable_texts,
-            self.window.editable_shapes,
-            self.window.editable_images
-        )
+        if getattr(self.deleted_object, 'is_new', False) or getattr(self.deleted_object, '_ghost_redacted', False):
+            pdf_handler.apply_object_edit(self.window.doc, self.deleted_object)
 
         self.window.document_modified = True
         self.window.status_label.set_text(_("delete_reverted"))
-        self.window._refresh_thumbnail(page_num)
-        self.window.pdf_view.queue_draw()
+        self._page_changed(page_num)
+        self._redraw()
 
 class CompositeCommand(Command):
     def __init__(self, window, commands):
         super().__init__(window)
         self.commands = commands
+
+    def subjects(self):
+        return [obj for command in self.commands for obj in command.subjects()]
+
+    def payload_size(self):
+        return sum(command.payload_size() for command in self.commands)
         
     def execute(self):
-        for command in self.commands:
-            command.execute()
+        with self.window.undo_manager.transaction():
+            for command in self.commands:
+                command.execute()
             
     def undo(self):
-        for command in reversed(self.commands):
-            command.undo()
\ No newline at end of file
+        with self.window.undo_manager.transaction():
+            for command in reversed(self.commands):
+                command.undo()
\ No newline at end of file
@@ -1,6 +1,5 @@
-import copy
 from .undo_manager import UndoManager, EditObjectCommand, AddObjectCommand, DeleteObjectCommand
-from .i18n import _, get_language
+from .i18n import _, get_language, get_setting, set_setting
 
 import gi
 import os
@@ -9,6 +8,7 @@ import cairo
 import threading
 import math
 import re
+import copy
 from pathlib import Path
 import fitz
 
@@ -19,11 +19,18 @@ from gi.repository import Gtk, Gio, GLib, Adw, Gdk, GdkPixbuf, Pango, GObject, P
 from . import constants
 from . import pdf_handler
 from . import print_handler
+from . import text_metrics
+from .spatial_index import SpatialIndex
+from .document_worker import DocumentWorker, WorkerTicket
+from . import tracing
 from .welcome_view import WelcomeView 
-from .models import PdfPage, EditableText, BASE14_FALLBACK_MAP, EditableImage, EditableShape
+from .models import PdfPage, EditableText, BASE14_FALLBACK_MAP, EditableImage, EditableShape, capture_state, restore_state
 from .ui_components import PageThumbnailFactory, show_error_dialog, show_confirm_dialog, show_save_changes_dialog
 from . import utils
 
+FORMAT_PREVIEW_DELAY_MS = 350
+PAGE_REDRAW_RETRY_MS = 150
+
 class PdfEditorWindow(Adw.ApplicationWindow):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -41,12 +48,26 @@ class PdfEditorWindow(Adw.ApplicationWindow):
         self.editable_texts = [] 
         self.editable_images = []
         self.editable_shapes = []
+        self.hit_indexes = {EditableText: SpatialIndex(), EditableImage: SpatialIndex(), EditableShape: SpatialIndex()}
+        self.document_worker = DocumentWorker()
+        self.page_objects_ticket = None
+        self.page_objects_ready = False
+        self.format_preview_obj = None
+        self.format_preview_state = None
+        self.format_preview_source = None
         self.selected_text = None
         self.selected_image = None
         self.selected_shape = None
         self.text_edit_popover = None
         self.text_edit_view = None
-        self.is_saving = False
+        self.save_worker = DocumentWorker("save-worker")
+        self.save_ticket = None
+        self.save_finished = None
+        self.last_page_surface = None
+        self.page_redraw_source = None
+        self.pending_close = None
+        self.pending_close_source = None
+        self.modification_count = 0
         self.dragged_object = None
         self.drag_start_pos = (0, 0)
         self.drag_object_start_pos = (0, 0)
@@ -68,6 +89,7 @@ class PdfEditorWindow(Adw.ApplicationWindow):
         self.bold_button = None
         self.italic_button = None
         self.font_scan_in_progress = True
+        self.page_states = {}
         self.undo_manager = UndoManager(self)
         self.pending_format_change_obj = None
         self.before_format_change_state = None
@@ -191,6 +213,7 @@ class PdfEditorWindow(Adw.ApplicationWindow):
         save_button_box.get_style_context().add_class("linked")
 
         self.save_button = Gtk.Button(label=_("btn_save"))
+        self.save_button.set_tooltip_text(_("save_tip"))
         self.save_button.get_style_context().add_class("suggested-action")
         self.save_button.connect("clicked", self.on_save_clicked)
         save_button_box.append(self.save_button)
@@ -227,6 +250,12 @@ class PdfEditorWindow(Adw.ApplicationWindow):
         header.pack_end(self.mode_toggle_button)
         menu = Gio.Menu()
         menu.append(_("menu_save_as"), "win.save_as")
+        menu.append(_("menu_optimize_save"), "win.optimize_save")
+        menu.append(_("menu_optimize_images"), "win.optimize_images")
+        profile_menu = Gio.Menu()
+        for profile in pdf_handler.SAVE_PROFILES:
+            profile_menu.append(_("save_profile_" + profile), f"win.save_profile::{profile}")
+        menu.append_submenu(_("menu_save_profile"), profile_menu)
         menu.append(_("menu_export_as"), "win.export_as")
         menu.append_section(None, Gio.Menu())
         menu.append(_("menu_about"), "win.about")
@@ -275,6 +304,11 @@ class PdfEditorWindow(Adw.ApplicationWindow):
         status_bar_box.add_css_class('statusbar')
         self.status_label = Gtk.Label(label=_('new_doc_loaded'), xalign=0.0)
         status_bar_box.append(self.status_label)
+        self.save_cancel_button = Gtk.Button(label=_("btn_cancel_save"))
+        self.save_cancel_button.add_css_class("flat")
+        self.save_cancel_button.set_visible(False)
+        self.save_cancel_button.connect("clicked", self.on_cancel_save)
+        status_bar_box.append(self.save_cancel_button)
         self.main_box.append(status_bar_box)
 
     def _create_sidebar(self):
@@ -541,6 +575,24 @@ class PdfEditorWindow(Adw.ApplicationWindow):
         self.thumbnails_list.add_controller(thumbnail_drop)
 
     def _connect_actions(self):
+        action_save = Gio.SimpleAction.new('save', None)
+        action_save.connect('activate', self.on_save)
+        self.add_action(action_save)
+
+        action_optimize_save = Gio.SimpleAction.new('optimize_save', None)
+        action_optimize_save.connect('activate', self.on_optimize_save)
+        self.add_action(action_optimize_save)
+
+        profile = get_setting("save_profile", pdf_handler.DEFAULT_SAVE_PROFILE)
+        action_save_profile = Gio.SimpleAction.new_stateful(
+            'save_profile', GLib.VariantType.new("s"), GLib.Variant.new_string(profile))
+        action_save_profile.connect('activate', self.on_save_profile_changed)
+        self.add_action(action_save_profile)
+
+        action_optimize_images = Gio.SimpleAction.new('optimize_images', None)
+        action_optimize_images.connect('activate', self.on_optimize_images)
+        self.add_action(action_optimize_images)
+
         action_save_as = Gio.SimpleAction.new('save_as', None)
         action_save_as.connect('activate', self.on_save_as)
         self.add_action(action_save_as)
@@ -571,6 +623,8 @@ class PdfEditorWindow(Adw.ApplicationWindow):
 
         app = self.get_application()
         if app:
+            app.set_accels_for_action("win.save", ["<Control>s"])
+            app.set_accels_for_action("win.save_as", ["<Control><Shift>s"])
             app.set_accels_for_action("win.undo", ["<Control>z"])
             app.set_accels_for_action("win.redo", ["<Control>y", "<Control><Shift>z"])
             app.set_accels_for_action("win.print", ["<Control>p"])
@@ -582,8 +636,12 @@ class PdfEditorWindow(Adw.ApplicationWindow):
         can_go_prev = has_pages and self.current_page_index > 0
         can_go_next = has_pages and self.current_page_index < page_count - 1
 
-        self.save_button.set_sensitive(has_doc and self.document_modified)
+        can_save = has_doc and self.document_modified and self.save_ticket is None
+        self.save_button.set_sensitive(can_save)
+        self.lookup_action("save").set_enabled(can_save)
         self.lookup_action("save_as").set_enabled(has_doc)
+        self.lookup_action("optimize_save").set_enabled(has_doc and bool(self.current_file_path))
+        self.lookup_action("optimize_images").set_enabled(has_doc and self.save_ticket is None)
         self.lookup_action("export_as").set_enabled(has_doc)
         self.lookup_action("print").set_enabled(has_doc)
         self.print_button.set_sensitive(has_doc)
@@ -771,7 +829,8 @@ class PdfEditorWindow(Adw.ApplicationWindow):
         if self.check_unsaved_changes():
             return
 
-        self.close_document()
+        if not self.close_document(lambda: self.load_document(filepath, target_page)):
+            return
 
         self.status_label.set_text(_("loading").format(os.path.basename(filepath)))
         GLib.idle_add(self._show_loading_state)
@@ -787,7 +846,10 @@ class PdfEditorWindow(Adw.ApplicationWindow):
     def _show_loading_state(self):
         self.open_button.set_sensitive(False)
         self.save_button.set_sensitive(False)
+        self.lookup_action("save").set_enabled(False)
         self.lookup_action("save_as").set_enabled(False)
+        self.lookup_action("optimize_save").set_enabled(False)
+        self.lookup_action("optimize_images").set_enabled(False)
         self.lookup_action("export_as").set_enabled(False)
         self.prev_button.set_sensitive(False)
         self.next_button.set_sensitive(False)
@@ -811,7 +873,7 @@ class PdfEditorWindow(Adw.ApplicationWindow):
                 print("DEBUG: Bu PDF dosyası açılırken onarıldı.")
             self.current_file_path = filepath
             self.original_file_path = filepath
-            self.allow_incremental_save = True
+            self.allow_incremental_save = not self.is_repaired_file
             
             self.current_page_index = target_page 
             
@@ -879,7 +941,8 @@ class PdfEditorWindow(Adw.ApplicationWindow):
             return
 
         self.commit_pending_format_change()
-        self.undo_manager.clear()
+        if self.page_objects_ready and self.undo_manager.has_page(self.current_page_index):
+            self.page_states[self.current_page_index] = (self.editable_texts, self.editable_images, self.editable_shapes)
 
         self.current_page_index = page_index
         self.selected_text = None
@@ -887,43 +950,101 @@ class PdfEditorWindow(Adw.ApplicationWindow):
         self.selected_shape = None
         self.hide_text_editor()
 
-        texts, error = pdf_handler.extract_editable_text(self.doc, page_index)
+        self.editable_texts = []
+        self.editable_images = []
+        self.editable_shapes = []
+        self._rebuild_hit_indexes()
+
+        with pdf_handler.document_lock(self.doc):
+            page_rect = self.doc.load_page(page_index).rect
+        self.current_pdf_page_width = int(page_rect.width * self.zoom_level)
+        self.current_pdf_page_height = int(page_rect.height * self.zoom_level)
+
+        self.pdf_view.set_content_width(self.current_pdf_page_width)
+        self.pdf_view.set_content_height(self.current_pdf_page_height)
+
+        self.pdf_view.queue_draw()
+        
+        if preserve_scroll:
+            GLib.idle_add(self.pdf_scroll.get_vadjustment().set_value, current_v_scroll)
+            GLib.idle_add(self.pdf_scroll.get_hadjustment().set_value, current_h_scroll)
+
+        self._sync_thumbnail_selection()
+        state = self.page_states.pop(page_index, None)
+        if state is not None:
+            self._cancel_page_objects()
+            self.editable_texts, self.editable_images, self.editable_shapes = state
+            self._rebuild_hit_indexes()
+            self.page_objects_ready = True
+        else:
+            self._request_page_objects(page_index)
+        self._update_ui_state()
+
+    def _cancel_page_objects(self):
+        if self.page_objects_ticket:
+            self.page_objects_ticket.cancel()
+            self.page_objects_ticket = None
+        self.page_objects_ready = False
+
+    def _request_page_objects(self, page_index):
+        self._cancel_page_objects()
+        doc = self.doc
+        lock = pdf_handler.document_lock(doc)
+
+        def _extract(ticket):
+            with lock:
+                if ticket.cancelled:
+                    return None
+                pdf_handler.flatten_object_layers(doc, page_index)
+                pdf_handler.save_page_snapshot(doc, page_index)
+            results = {}
+            for kind, extractor in (("texts", pdf_handler.extract_editable_text),
+                                    ("images", pdf_handler.extract_editable_images),
+                                    ("shapes", pdf_handler.extract_editable_shapes)):
+                with lock:
+                    if ticket.cancelled:
+                        return None
+                    results[kind] = extractor(doc, page_index)
+            return results
+
+        def _on_done(ticket, results, error):
+            if self.page_redraw_source is not None:
+                GLib.source_remove(self.page_redraw_source)
+                self._queue_page_redraw()
+            if ticket is not self.page_objects_ticket or self.doc is not doc or page_index != self.current_page_index:
+                return
+            self.page_objects_ticket = None
+            if results is None:
+                print(f"Warning: Page {page_index + 1} object extraction failed: {error}")
+                return
+            self._on_page_objects_ready(page_index, results)
+
+        self.page_objects_ticket = self.document_worker.submit(_extract, _on_done)
+
+    def _on_page_objects_ready(self, page_index, results):
+        texts, error = results["texts"]
         if error:
             show_error_dialog(self, f"Could not extract text structure from page {page_index + 1}.\n{error}")
             self.editable_texts = []
         else:
             self.editable_texts = texts
             
-        images, error = pdf_handler.extract_editable_images(self.doc, page_index)
+        images, error = results["images"]
         if error:
             show_error_dialog(self, _("image_extract_error").format(page_index + 1, error))
             self.editable_images = []
         else:
             self.editable_images = images
 
-        shapes, shapes_error = pdf_handler.extract_editable_shapes(self.doc, page_index)
+        shapes, shapes_error = results["shapes"]
         if shapes_error:
             print(f"Warning: Could not extract shapes from page {page_index + 1}: {shapes_error}")
             self.editable_shapes = []
         else:
             self.editable_shapes = shapes
 
-        page = self.doc.load_page(page_index)
-        self.current_pdf_page_width = int(page.rect.width * self.zoom_level)
-        self.current_pdf_page_height = int(page.rect.height * self.zoom_level)
-
-        print(f"DEBUG: Setting pdf_view content size: {self.current_pdf_page_width} x {self.current_pdf_page_height}")
-        self.pdf_view.set_content_width(self.current_pdf_page_width)
-        self.pdf_view.set_content_height(self.current_pdf_page_height)
-
-        self.pdf_view.queue_draw()
-        
-        if preserve_scroll:
-            GLib.idle_add(self.pdf_scroll.get_vadjustment().set_value, current_v_scroll)
-            GLib.idle_add(self.pdf_scroll.get_hadjustment().set_value, current_h_scroll)
-
-        self._sync_thumbnail_selection()
-        self._update_ui_state()
+        self._rebuild_hit_indexes()
+        self.page_objects_ready = True
         
         fallback_font = None
         for text_obj in self.editable_texts:
@@ -932,21 +1053,48 @@ class PdfEditorWindow(Adw.ApplicationWindow):
                 break
         if fallback_font:
             self.status_label.set_text(f"font cannot be determinated, using {fallback_font}")
-        
-        GLib.idle_add(lambda: pdf_handler.save_page_snapshot(self.doc, page_index) if self.doc else None)
 
-    def close_document(self):
+        self._update_ui_state()
+        self.pdf_view.queue_draw()
+
+    def _forget_page_state(self, page_index):
+        self.page_states.pop(page_index, None)
+
+    def _reset_history(self):
+        self.undo_manager.clear()
+
+    @property
+    def document_modified(self):
+        return self._document_modified
+
+    @document_modified.setter
+    def document_modified(self, value):
+        if value:
+            self.modification_count += 1
+        self._document_modified = value
+
+    def close_document(self, on_closed=None):
+        if self.save_finished is not None and not self.save_finished.is_set():
+            if self.pending_close_source is None:
+                self.pending_close_source = GLib.timeout_add(PAGE_REDRAW_RETRY_MS, self._close_after_save)
+            self.pending_close = on_closed
+            self.status_label.set_text(_("close_after_save"))
+            return False
+        self._cancel_page_objects()
+        self._commit_format_preview()
         self.undo_manager.clear()
         self.is_repaired_file = False
         if self.doc:
             pdf_handler.release_page_snapshots(self.doc)
         pdf_handler.close_pdf_document(self.doc)
         self.doc = None
+        self.last_page_surface = None
         self.current_file_path = None
         self.current_page_index = 0
         self.editable_texts = []
         self.editable_images = []
         self.editable_shapes = []
+        self._rebuild_hit_indexes()
         self.selected_text = None
         self.selected_image = None
         self.selected_shape = None
@@ -957,17 +1105,26 @@ class PdfEditorWindow(Adw.ApplicationWindow):
         self.pdf_view.set_content_height(1)
         self.pdf_view.queue_draw()
         self._update_ui_state()
+        return True
+
+    def _close_after_save(self):
+        if not self.save_finished.is_set() or self.save_ticket is not None:
+            return GLib.SOURCE_CONTINUE
+        self.pending_close_source = None
+        on_closed, self.pending_close = self.pending_close, None
+        if self.close_document(on_closed) and on_closed is not None:
+            on_closed()
+        return GLib.SOURCE_REMOVE
 
     def go_to_welcome(self):
+        self._commit_format_preview()
         if self.doc and self.document_modified:
             response = show_save_changes_dialog(self)
             if response == "save":
                 if self.current_file_path:
-                    if self.inline_editor_widget is not None:
-                        self._apply_and_hide_editor(force_apply=True)
-                    success, err = pdf_handler.save_document(self.doc, self.current_file_path)
-                    if not success:
-                        show_error_dialog(self, f"Save failed: {err}", "Save Error")
+                    self.save_document(self.current_file_path, incremental=self.allow_incremental_save,
+                                       background=False)
+                    if self.document_modified:
                         return
                 else:
                     self.on_save_as(None, None)
@@ -976,7 +1133,8 @@ class PdfEditorWindow(Adw.ApplicationWindow):
             elif response == "cancel":
                 return
 
-        self.close_document()
+        if not self.close_document(self.go_to_welcome):
+            return
         old_welcome = self.stack.get_child_by_name("welcome")
         if old_welcome:
             self.stack.remove(old_welcome)
@@ -988,29 +1146,149 @@ class PdfEditorWindow(Adw.ApplicationWindow):
 
 
 
-    def save_document(self, save_path, incremental=False):
-        if not self.doc or self.is_saving:
+    def save_document(self, save_path, incremental=False, profile=None, background=True):
+        if not self.doc:
             return
-        page_to_restore = self.current_page_index
-        self.is_saving = True
-        self.status_label.set_text(_("saving").format(os.path.basename(save_path)))
+        pending = self.save_finished
+        if pending is not None and not pending.is_set():
+            if background:
+                self.status_label.set_text(_("save_in_progress"))
+                return
+            pending.wait()
         if self.inline_editor_widget is not None:
             self._apply_and_hide_editor(force_apply=True)
 
-        success, error_msg = pdf_handler.save_document(self.doc, save_path, incremental=False)
-        self.is_saving = False
-        
-        if success:
-            print(f"DEBUG: Kayıt başarılı. Dosya yeniden yükleniyor: {save_path}")
-            self.document_modified = False 
-            self.load_document(save_path, target_page=page_to_restore)
-            self.status_label.set_text(_("saved").format(os.path.basename(save_path)))
+        doc = self.doc
+        name = os.path.basename(save_path)
+        profile = profile or get_setting("save_profile", pdf_handler.DEFAULT_SAVE_PROFILE)
+        epoch = pdf_handler.xref_epoch(doc)
+        modification_count = self.modification_count
+        finished = threading.Event()
+        self.save_finished = finished
+        self.status_label.set_text(_("saving").format(name))
+
+        def _save(ticket):
+            try:
+                result = pdf_handler.save_document(
+                    doc, save_path, incremental=incremental, profile=profile,
+                    progress=lambda phase, fraction: GLib.idle_add(self._on_save_progress, ticket, name, phase, fraction),
+                    cancelled=lambda: ticket.cancelled)
+            finally:
+                finished.set()
+            if ticket.cancelled:
+                GLib.idle_add(self._finish_cancelled_save, doc, save_path, epoch, modification_count, result)
+            return result
+
+        def _on_done(ticket, result, error):
+            self._finish_save(ticket, doc, save_path, epoch, modification_count, result or (False, error))
+
+        if background:
+            self.save_ticket = self.save_worker.submit(_save, _on_done)
+            self.save_cancel_button.set_visible(True)
+            self._update_ui_state()
         else:
+            self.save_ticket = WorkerTicket()
+            _on_done(self.save_ticket, _save(self.save_ticket), None)
+
+    def _on_save_progress(self, ticket, name, phase, fraction):
+        if ticket is self.save_ticket and not ticket.cancelled:
+            if phase == "write":
+                self.status_label.set_text(_("saving_progress").format(name, int(fraction * 100)))
+            else:
+                self.status_label.set_text(_("saving_phase_" + phase).format(name))
+        return GLib.SOURCE_REMOVE
+
+    def on_cancel_save(self, button):
+        if self.save_ticket is None:
+            return
+        self.save_ticket.cancel()
+        self.save_ticket = None
+        self.save_cancel_button.set_visible(False)
+        self.status_label.set_text(_("save_cancelling"))
+        self._update_ui_state()
+
+    def _finish_save(self, ticket, doc, save_path, epoch, modification_count, result):
+        if ticket is not self.save_ticket:
+            return
+        self.save_ticket = None
+        self.save_cancel_button.set_visible(False)
+        self._apply_save_result(doc, save_path, epoch, modification_count, result)
+
+    def _finish_cancelled_save(self, doc, save_path, epoch, modification_count, result):
+        success, error_msg = result
+        if success or error_msg:
+            self._apply_save_result(doc, save_path, epoch, modification_count, result)
+        elif doc is self.doc:
+            self.status_label.set_text(_("save_cancelled"))
+        return GLib.SOURCE_REMOVE
+
+    def _apply_save_result(self, doc, save_path, epoch, modification_count, result):
+        self.pdf_view.queue_draw()
+        if doc is not self.doc:
+            return
+
+        success, error_msg = result
+        if success:
+            if self.modification_count == modification_count:
+                self.document_modified = False
+            self.current_file_path = save_path
+            self.original_file_path = save_path
+            self.set_title(f"{constants.APP_NAME} - {os.path.basename(save_path)}")
+            self._sync_after_rewrite(epoch)
+            stats = pdf_handler.get_last_save_stats(doc)
+            if stats:
+                message = _("saved_stats").format(
+                    os.path.basename(save_path), stats["bytes"] / (1024 * 1024), stats["seconds"],
+                    _("save_profile_" + stats["profile"]))
+                if stats["fonts_before"] is not None:
+                    message += _("font_subset_stats").format(stats["fonts_before"] / 1024, stats["fonts_after"] / 1024)
+                self.status_label.set_text(message)
+            else:
+                self.status_label.set_text(_("saved").format(os.path.basename(save_path)))
+        elif error_msg:
             show_error_dialog(self, f"PDF kaydedilirken hata oluştu: {error_msg}")
             self.status_label.set_text(_("save_failed"))
 
         self._update_ui_state()
 
+    def _sync_after_rewrite(self, epoch):
+        if pdf_handler.xref_epoch(self.doc) == epoch:
+            return
+        self._reset_history()
+        self._load_page(self.current_page_index, preserve_scroll=True)
+
+    def _draw_page_contents(self, page_cr):
+        hidden = self.format_preview_obj
+        if hidden is not None and hidden.page_number != self.current_page_index:
+            hidden = None
+        key = (self.current_page_index, self.zoom_level,
+               pdf_handler.page_generation(self.doc, self.current_page_index), id(hidden))
+        lock = pdf_handler.document_lock(self.doc)
+        if not lock.acquire(blocking=False):
+            self._defer_page_redraw()
+            if self.last_page_surface and self.last_page_surface[0] == key:
+                return self.last_page_surface[1]
+            page_cr.set_source_rgb(1.0, 1.0, 1.0)
+            page_cr.paint()
+            return None
+        try:
+            pdf_handler.draw_page_to_cairo(page_cr, self.doc, self.current_page_index, self.zoom_level,
+                                           hidden_owner=hidden)
+        finally:
+            lock.release()
+        self.last_page_surface = (key, page_cr.get_target())
+        return None
+
+    def _defer_page_redraw(self):
+        if self.page_redraw_source is None:
+            self.page_redraw_source = GLib.timeout_add(PAGE_REDRAW_RETRY_MS, self._queue_page_redraw)
+
+    def _queue_page_redraw(self):
+        self.page_redraw_source = None
+        self.pdf_view.queue_draw()
+        return GLib.SOURCE_REMOVE
+
+    @tracing.traced("draw", cat="ui")
     def draw_pdf_page(self, area, cr, width, height):
         if not self.doc or self.current_pdf_page_width <= 0:
             cr.set_source_rgb(0.42, 0.42, 0.42)
@@ -1039,7 +1317,9 @@ class PdfEditorWindow(Adw.ApplicationWindow):
             page_surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, int(page_w), int(page_h))
 
         page_cr = cairo.Context(page_surface)
-        pdf_handler.draw_page_to_cairo(page_cr, self.doc, self.current_page_index, self.zoom_level)
+        cached_surface = self._draw_page_contents(page_cr)
+        if cached_surface is not None:
+            page_surface = cached_surface
 
         cr.set_source_surface(page_surface, 0, 0)
         cr.paint()
@@ -1159,9 +1439,10 @@ class PdfEditorWindow(Adw.ApplicationWindow):
         for text_obj in self.editable_texts:
             if text_obj.page_number != self.current_page_index:
                 continue
-            if not text_obj.is_new:
+            previewing = text_obj is self.format_preview_obj
+            if not previewing and not text_obj.is_new:
                 continue 
-            if getattr(text_obj, 'is_baked', False):
+            if not previewing and getattr(text_obj, 'is_baked', False):
                 continue
             if text_obj is self.dragged_object:
                 continue
@@ -1226,7 +1507,8 @@ class PdfEditorWindow(Adw.ApplicationWindow):
         for shape in self.editable_shapes:
             if shape.page_number != self.current_page_index:
                 continue
-            if getattr(shape, 'is_baked', False):
+            previewing = shape is self.format_preview_obj
+            if not previewing and getattr(shape, 'is_baked', False):
                 continue
             
             x1, y1, x2, y2 = shape.bbox
@@ -1334,12 +1616,7 @@ class PdfEditorWindow(Adw.ApplicationWindow):
 
             x1, y1, x2, y2 = selected_obj.bbox
             if getattr(self, 'word_selection_mode', False) and hasattr(self, 'selected_word_start_char') and isinstance(selected_obj, EditableText):
-                text = selected_obj.text
-                r1 = self.selected_word_start_char / max(len(text), 1)
-                r2 = self.selected_word_end_char / max(len(text), 1)
-                x1_word = x1 + (x2 - x1) * r1
-                x2_word = x1 + (x2 - x1) * r2
-                x1, x2 = x1_word, x2_word
+                x1, y1, x2, y2 = text_metrics.range_bbox(selected_obj, self.selected_word_start_char, self.selected_word_end_char)
 
             padding = 3.0
             rect_x = page_offset_x + (x1 * self.zoom_level) - padding
@@ -1407,34 +1684,39 @@ class PdfEditorWindow(Adw.ApplicationWindow):
             cr.stroke()
             cr.restore()
 
+    def _rebuild_hit_indexes(self):
+        for kind, objects in ((EditableText, self.editable_texts),
+                              (EditableImage, self.editable_images),
+                              (EditableShape, self.editable_shapes)):
+            objects = [obj for obj in objects if obj.bbox]
+            self.hit_indexes[kind] = SpatialIndex.bulk(objects, [obj.bbox for obj in objects])
+
+    def _index_object(self, obj):
+        index = self.hit_indexes.get(type(obj))
+        if index is not None:
+            index.insert(obj)
+
+    def _reindex_object(self, obj):
+        index = self.hit_indexes.get(type(obj))
+        if index is not None and obj in index:
+            index.update(obj)
+
+    def _unindex_object(self, obj):
+        index = self.hit_indexes.get(type(obj))
+        if index is not None:
+            index.remove(obj)
+
     def _find_text_at_pos(self, page_x, page_y):
-        for text_obj in reversed(self.editable_texts):
-            if not text_obj.bbox: continue
-            x1, y1, x2, y2 = text_obj.bbox
-            tolerance = 2 / self.zoom_level
-            if (x1 - tolerance) <= page_x <= (x2 + tolerance) and \
-               (y1 - tolerance) <= page_y <= (y2 + tolerance):
-                return text_obj
-        return None
+        hits = self.hit_indexes[EditableText].query_point(page_x, page_y, 2 / self.zoom_level)
+        return hits[0] if hits else None
 
     def _find_image_at_pos(self, page_x, page_y):
-        for img_obj in reversed(self.editable_images):
-            if not img_obj.bbox: continue
-            x1, y1, x2, y2 = img_obj.bbox
-            if x1 <= page_x <= x2 and y1 <= page_y <= y2:
-                return img_obj
-        return None
+        hits = self.hit_indexes[EditableImage].query_point(page_x, page_y)
+        return hits[0] if hits else None
 
     def _find_shape_at_pos(self, page_x, page_y):
-        for shape_obj in reversed(self.editable_shapes):
-            if shape_obj.page_number != self.current_page_index:
-                continue
-            if not shape_obj.bbox: 
-                continue
-            x1, y1, x2, y2 = shape_obj.bbox
-            tolerance = 3 / self.zoom_level
-            if (x1 - tolerance) <= page_x <= (x2 + tolerance) and \
-               (y1 - tolerance) <= page_y <= (y2 + tolerance):
+        for shape_obj in self.hit_indexes[EditableShape].query_point(page_x, page_y, 3 / self.zoom_level):
+            if shape_obj.page_number == self.current_page_index:
                 return shape_obj
         return None
 
@@ -1512,8 +1794,7 @@ class PdfEditorWindow(Adw.ApplicationWindow):
                         )
 
                         command = AddObjectCommand(self, new_image_obj)
-                        command.execute()  
-                        self.undo_manager.add_command(command) 
+                        self._run_command(command)
 
                     except Exception as e:
                         show_error_dialog(self, f"Resim dosyası işlenirken bir hata oluştu:\n{e}", "Resim Hatası")
@@ -1734,55 +2015,29 @@ class PdfEditorWindow(Adw.ApplicationWindow):
             return
 
         text_obj_to_apply = self.inline_editor_text_obj
-        old_properties = copy.deepcopy(text_obj_to_apply.__dict__)
+        old_properties = capture_state(text_obj_to_apply)
 
         buf = self.inline_editor_tv.get_buffer()
         new_text = buf.get_text(buf.get_start_iter(), buf.get_end_iter(), True)
 
         self._hide_inline_editor()
 
-        def _calc_bbox(obj, text):
-            x1, y1 = obj.x, obj.y
-            _surf = cairo.ImageSurface(cairo.FORMAT_ARGB32, 1, 1)
-            _cr = cairo.Context(_surf)
-            layout = PangoCairo.create_layout(_cr)
-            desc = Pango.FontDescription.from_string(obj.font_family_base)
-            if obj.is_bold: desc.set_weight(Pango.Weight.BOLD)
-            if obj.is_italic: desc.set_style(Pango.Style.ITALIC)
-            desc.set_absolute_size(int(obj.font_size * Pango.SCALE))
-            layout.set_font_description(desc)
-            layout.set_text(text or "A", -1)
-            pw, ph = layout.get_size()
-            return (x1, y1, x1 + pw / Pango.SCALE, y1 + ph / Pango.SCALE)
-
         if text_obj_to_apply.is_new:
             text_obj_to_apply.text = new_text
             text_obj_to_apply.is_baked = True
-            text_obj_to_apply.bbox = _calc_bbox(text_obj_to_apply, new_text)
+            text_obj_to_apply.bbox = text_metrics.text_bbox(text_obj_to_apply, new_text)
             command = AddObjectCommand(self, text_obj_to_apply)
-            command.execute()
-            self.undo_manager.add_command(command)
-            self._refresh_thumbnail(self.current_page_index)
+            self._run_command(command)
         else:
-            new_properties = copy.deepcopy(text_obj_to_apply.__dict__)
+            new_properties = capture_state(text_obj_to_apply)
             new_properties['text'] = new_text
             if old_properties['text'] != new_text:
-                x1, y1 = new_properties['bbox'][0], new_properties['bbox'][1]
-                _surf = cairo.ImageSurface(cairo.FORMAT_ARGB32, 1, 1)
-                _cr = cairo.Context(_surf)
-                layout = PangoCairo.create_layout(_cr)
-                desc = Pango.FontDescription.from_string(new_properties['font_family_base'])
-                if new_properties.get('is_bold'): desc.set_weight(Pango.Weight.BOLD)
-                if new_properties.get('is_italic'): desc.set_style(Pango.Style.ITALIC)
-                desc.set_absolute_size(int(new_properties['font_size'] * Pango.SCALE))
-                layout.set_font_description(desc)
-                layout.set_text(new_text or "A", -1)
-                pw, ph = layout.get_size()
-                new_properties['bbox'] = (x1, y1, x1 + pw / Pango.SCALE, y1 + ph / Pango.SCALE)
+                new_properties['bbox'] = text_metrics.layout_bbox(
+                    new_properties['bbox'][0], new_properties['bbox'][1], new_text,
+                    new_properties['font_family_base'], new_properties.get('is_bold'),
+                    new_properties.get('is_italic'), new_properties['font_size'])
                 command = EditObjectCommand(self, text_obj_to_apply, old_properties, new_properties)
-                command.execute()
-                self.undo_manager.add_command(command)
-                self._refresh_thumbnail(self.current_page_index)
+                self._run_command(command)
 
         self._update_ui_state()
         self.pdf_view.queue_draw()
@@ -1813,13 +2068,15 @@ class PdfEditorWindow(Adw.ApplicationWindow):
         self._commit_inline_edit()
 
     def check_unsaved_changes(self):
+        self._commit_format_preview()
         if self.document_modified:
             response = show_save_changes_dialog(self)
             
             if response == Gtk.ResponseType.ACCEPT:
                  if self.current_file_path:
-                     self.save_document(self.current_file_path, incremental=False)
-                     return False
+                     self.save_document(self.current_file_path, incremental=self.allow_incremental_save,
+                                        background=False)
+                     return self.document_modified
                  else:
                      self.on_save_as(None, None)
                      return True
@@ -1878,6 +2135,7 @@ class PdfEditorWindow(Adw.ApplicationWindow):
         if success:
             self.document_modified = True
             self.status_label.set_text(message)
+            self._reset_history()
             self._load_thumbnails()
             self._load_page(insert_position)
             self._update_ui_state()
@@ -1920,7 +2178,87 @@ class PdfEditorWindow(Adw.ApplicationWindow):
         dialog.present()
 
     def on_save_clicked(self, button):
-        self.on_save_as(None, None)
+        self.on_save(None, None)
+
+    def on_save(self, action, param):
+        self.commit_pending_format_change()
+        if not self.doc: return
+        if not self.current_file_path:
+            self.on_save_as(None, None)
+            return
+        self.save_document(self.current_file_path, incremental=self.allow_incremental_save)
+
+    def on_optimize_images(self, action, param):
+        self.commit_pending_format_change()
+        if not self.doc or self.save_ticket is not None:
+            return
+        pending = self.save_finished
+        if pending is not None and not pending.is_set():
+            self.status_label.set_text(_("save_in_progress"))
+            return
+
+        doc = self.doc
+        finished = threading.Event()
+        self.save_finished = finished
+        self.status_label.set_text(_("optimizing_images"))
+
+        def _optimize(ticket):
+            try:
+                result = pdf_handler.optimize_images(
+                    doc,
+                    progress=lambda fraction: GLib.idle_add(self._on_optimize_progress, ticket, fraction),
+                    cancelled=lambda: ticket.cancelled)
+            finally:
+                finished.set()
+            if ticket.cancelled:
+                GLib.idle_add(_apply_report, result, None)
+            return result
+
+        def _on_done(ticket, result, error):
+            if ticket is not self.save_ticket:
+                return
+            self.save_ticket = None
+            self.save_cancel_button.set_visible(False)
+            _apply_report(result, error)
+
+        def _apply_report(result, error):
+            if doc is not self.doc:
+                return GLib.SOURCE_REMOVE
+            report, error_msg = result or ([], error)
+            replaced = [entry for entry in report if entry["replaced"]]
+            if replaced:
+                self.document_modified = True
+                for page_index in sorted({p for entry in replaced for p in entry["pages"]}):
+                    self._refresh_thumbnail(page_index)
+                self.pdf_view.queue_draw()
+            if error_msg:
+                show_error_dialog(self, error_msg)
+            before = sum(entry["before"] for entry in replaced) / (1024 * 1024)
+            after = sum(entry["after"] for entry in replaced) / (1024 * 1024)
+            self.status_label.set_text(_("images_optimized").format(len(replaced), before, after))
+            self._update_ui_state()
+            return GLib.SOURCE_REMOVE
+
+        self.save_ticket = self.save_worker.submit(_optimize, _on_done)
+        self.save_cancel_button.set_visible(True)
+        self._update_ui_state()
+
+    def _on_optimize_progress(self, ticket, fraction):
+        if ticket is self.save_ticket and not ticket.cancelled:
+            self.status_label.set_text(_("optimizing_images_progress").format(int(fraction * 100)))
+        return GLib.SOURCE_REMOVE
+
+    def on_save_profile_changed(self, action, param):
+        action.set_state(param)
+        set_setting("save_profile", param.get_string())
+
+    def on_optimize_save(self, action, param):
+        self.commit_pending_format_change()
+        if not self.doc: return
+        if not self.current_file_path:
+            self.on_save_as(None, None)
+            return
+        self.save_document(self.current_file_path, profile="smallest")
 
     def on_save_as(self, action, param):
         self.commit_pending_format_change()
@@ -1934,6 +2272,10 @@ class PdfEditorWindow(Adw.ApplicationWindow):
         filter_pdf.add_pattern("*.pdf")
         filter_pdf.add_mime_type("application/pdf")
         dialog.add_filter(filter_pdf)
+        profiles = list(pdf_handler.SAVE_PROFILES)
+        dialog.add_choice("profile", _("menu_save_profile"), profiles,
+                          [_("save_profile_" + p) for p in profiles])
+        dialog.set_choice("profile", get_setting("save_profile", pdf_handler.DEFAULT_SAVE_PROFILE))
 
         def on_response(d, response):
             if response == Gtk.ResponseType.ACCEPT:
@@ -1941,13 +2283,14 @@ class PdfEditorWindow(Adw.ApplicationWindow):
                 if file:
                     path = file.get_path()
                     if not path.lower().endswith('.pdf'): path += '.pdf'
-                    self.save_document(path, incremental=False)
+                    self.save_document(path, incremental=False, profile=d.get_choice("profile"))
             d.destroy()
 
         dialog.connect("response", on_response)
         dialog.present()
 
     def on_export_as(self, action, param):
+        self.commit_pending_format_change()
         if not self.doc: return
 
         dialog = Gtk.FileChooserDialog(title="Farklı Dışa Aktar...", transient_for=self, modal=True,
@@ -2011,8 +2354,10 @@ class PdfEditorWindow(Adw.ApplicationWindow):
                 success, error_msg = pdf_handler.export_pdf_as_text(self.doc, output_path)
             elif format_name == "PDF":
                 if not output_path.lower().endswith('.pdf'): output_path += '.pdf'
+                epoch = pdf_handler.xref_epoch(self.doc)
                 success, error_msg = pdf_handler.save_document(self.doc, output_path, incremental=False)
                 if success:
+                    self._sync_after_rewrite(epoch)
                     self._update_ui_state()
             else:
                  success = False
@@ -2032,6 +2377,7 @@ class PdfEditorWindow(Adw.ApplicationWindow):
             show_error_dialog(self, _("print_no_doc"), _("print_no_doc_title"))
             return
         
+        self.commit_pending_format_change()
         success, message = print_handler.print_document(self, self.doc)
         
         if success:
@@ -2076,15 +2422,17 @@ class PdfEditorWindow(Adw.ApplicationWindow):
             show_error_dialog(self, "Lütfen önce bir belge açın veya oluşturun.", "Belge Yok")
             return
 
-        current_page = self.doc.load_page(self.current_page_index)
-        page_width = current_page.rect.width
-        page_height = current_page.rect.height
+        with pdf_handler.document_lock(self.doc):
+            current_rect = self.doc.load_page(self.current_page_index).rect
+        page_width = current_rect.width
+        page_height = current_rect.height
         insert_position = self.current_page_index + 1
         success, message = pdf_handler.insert_blank_page(self.doc, insert_position, page_width, page_height)
 
         if success:
             self.document_modified = True
             self.status_label.set_text(message)
+            self._reset_history()
             self._load_thumbnails()
             self._load_page(insert_position)
             self._update_ui_state()
@@ -2120,6 +2468,7 @@ class PdfEditorWindow(Adw.ApplicationWindow):
             self.status_label.set_text(message)
             new_page_count = pdf_handler.get_page_count(self.doc)
             new_page_index = min(page_to_delete, new_page_count - 1)
+            self._reset_history()
             self._load_thumbnails()
             self._load_page(new_page_index)
             self._update_ui_state()
@@ -2151,6 +2500,7 @@ class PdfEditorWindow(Adw.ApplicationWindow):
         if success:
             self.document_modified = True
             self.status_label.set_text(message)
+            self._reset_history()
             self._load_thumbnails()
             self._load_page(to_index)
             self._update_ui_state()
@@ -2161,6 +2511,8 @@ class PdfEditorWindow(Adw.ApplicationWindow):
     def on_pdf_view_pressed(self, gesture, n_press, x, y):
         if not self.doc or self.current_pdf_page_width == 0 or self.current_pdf_page_height == 0:
             return
+        if not self.view_mode and not self.page_objects_ready:
+            return
 
         drawing_area_width = self.pdf_view.get_allocated_width()
         drawing_area_height = self.pdf_view.get_allocated_height()
@@ -2255,9 +2607,10 @@ class PdfEditorWindow(Adw.ApplicationWindow):
                     self.pending_format_change_obj = self.selected_text
                 if self.selected_text:
                     self.pending_format_change_obj = self.selected_text
-                    self.before_format_change_state = copy.deepcopy(self.selected_text.__dict__)
+                    self.before_format_change_state = capture_state(self.selected_text)
                     self._update_text_format_controls(self.selected_text)
             elif clicked_shape:
+                pdf_handler.load_shape_paths(self.doc, clicked_shape)
                 self.selected_shape = clicked_shape
                 self.selected_text = None
                 self.selected_image = None
@@ -2380,8 +2733,7 @@ class PdfEditorWindow(Adw.ApplicationWindow):
                         commands.append(AddObjectCommand(self, span))
                     
                     batch_cmd = CompositeCommand(self, commands)
-                    batch_cmd.execute()
-                    self.undo_manager.add_command(batch_cmd)
+                    self._run_command(batch_cmd)
                     self.selected_text = mid_span
                     self.pending_format_change_obj = mid_span
                     self._update_ui_state()
@@ -2410,14 +2762,13 @@ class PdfEditorWindow(Adw.ApplicationWindow):
                     commands.append(AddObjectCommand(self, span))
                 
                 batch_cmd = CompositeCommand(self, commands)
-                batch_cmd.execute()
-                self.undo_manager.add_command(batch_cmd)
+                self._run_command(batch_cmd)
                 
                 self.selected_text = mid_span
                 self.pending_format_change_obj = mid_span
                 self.selected_text = mid_span
                 self.pending_format_change_obj = mid_span
-                self.before_format_change_state = copy.deepcopy(mid_span.__dict__)
+                self.before_format_change_state = capture_state(mid_span)
                 
                 self.selected_word_start_char = 0
                 self.selected_word_end_char = len(mid_span.text)
@@ -2436,31 +2787,6 @@ class PdfEditorWindow(Adw.ApplicationWindow):
             if self.pending_format_change_obj.font_size != font_size:
                 self.pending_format_change_obj.font_size = font_size
                 changed = True
-                obj = self.pending_format_change_obj
-                if obj.bbox:
-                    x1, y1, x2, y2 = obj.bbox
-                    old_h = y2 - y1
-                    old_w = x2 - x1
-                    try:
-                        _surf = cairo.ImageSurface(cairo.FORMAT_ARGB32, 1, 1)
-                        _cr = cairo.Context(_surf)
-                        _layout = PangoCairo.create_layout(_cr)
-                        _fd_str = f"{obj.font_family_base} {font_size}"
-                        if obj.is_bold: _fd_str += " Bold"
-                        if obj.is_italic: _fd_str += " Italic"
-                        _layout.set_font_description(Pango.FontDescription.from_string(_fd_str))
-                        _layout.set_text(obj.text if obj.text else "Ay", -1)
-                        _p_w, _p_h = _layout.get_size()
-                        
-                        _w = (_p_w / Pango.SCALE) * 0.75
-                        _h = (_p_h / Pango.SCALE) * 0.75
-                        
-                        new_w = max(_w, old_w) if _w > 0 else old_w
-                        new_h = _h if _h > 0 else old_h
-                        obj.bbox = (x1, y1, x1 + new_w, y1 + new_h)
-                    except Exception as e:
-                        print(f"DEBUG: Error recalculating text bbox: {e}")
-                        pass
                 
             if self.pending_format_change_obj.is_bold != is_bold:
                 self.pending_format_change_obj.is_bold = is_bold
@@ -2478,38 +2804,15 @@ class PdfEditorWindow(Adw.ApplicationWindow):
                 
             if changed and self.pending_format_change_obj.bbox:
                 obj = self.pending_format_change_obj
-                x1, y1, x2, y2 = obj.bbox
-                try:
-                    _surf = cairo.ImageSurface(cairo.FORMAT_ARGB32, 1, 1)
-                    _cr = cairo.Context(_surf)
-                    _layout = PangoCairo.create_layout(_cr)
-                    font_desc = Pango.FontDescription.from_string(obj.font_family_base)
-                    if obj.is_bold: font_desc.set_weight(Pango.Weight.BOLD)
-                    if obj.is_italic: font_desc.set_style(Pango.Style.ITALIC)
-                    font_desc.set_absolute_size(int(obj.font_size * Pango.SCALE))
-                    _layout.set_font_description(font_desc)
-                    _layout.set_text(obj.text if obj.text else "Ay", -1)
-                    _p_w, _p_h = _layout.get_size()
-                    _w = (_p_w / Pango.SCALE)
-                    _h = (_p_h / Pango.SCALE)
-                    if _w > 0 and _h > 0:
-                        obj.bbox = (x1, y1, x1 + _w, y1 + _h)
-                except Exception as e:
-                    print(f"DEBUG: Error recalculating text bbox on format change: {e}")
+                obj.bbox = text_metrics.layout_bbox(obj.bbox[0], obj.bbox[1], obj.text or "Ay",
+                                                    obj.font_family_base, obj.is_bold, obj.is_italic, obj.font_size)
 
             if changed:
                 obj = self.pending_format_change_obj
                 if self.inline_editor_widget is not None:
                     self._apply_and_hide_editor(force_apply=True)
                 else:
-                    new_properties = copy.deepcopy(obj.__dict__)
-                    obj.__dict__.update(self.before_format_change_state)
-                    command = EditObjectCommand(self, obj, self.before_format_change_state, new_properties)
-                    command.execute()
-                    self.undo_manager.add_command(command)
-                    self.before_format_change_state = copy.deepcopy(obj.__dict__)
-                    self.pdf_view.queue_draw()
-                    self._update_ui_state()
+                    self._schedule_format_preview(obj, self.before_format_change_state)
 
     def on_shape_format_changed(self, widget, *args):
         fill_rgba = self.shape_fill_button.get_rgba()
@@ -2524,7 +2827,7 @@ class PdfEditorWindow(Adw.ApplicationWindow):
         self.next_shape_transparent = is_transparent
 
         if self.selected_shape:
-            old_properties = copy.deepcopy(self.selected_shape.__dict__)
+            old_properties = capture_state(self.selected_shape)
             changed = False
             if self.selected_shape.fill_color != fill_color:
                 self.selected_shape.fill_color = fill_color
@@ -2540,14 +2843,7 @@ class PdfEditorWindow(Adw.ApplicationWindow):
                 changed = True
 
             if changed:
-                new_properties = copy.deepcopy(self.selected_shape.__dict__)
-                self.selected_shape.__dict__.update(old_properties)
-                
-                command = EditObjectCommand(self, self.selected_shape, old_properties, new_properties)
-                command.execute()
-                self.undo_manager.add_command(command)
-                self.pdf_view.queue_draw()
-                self._update_ui_state()
+                self._schedule_format_preview(self.selected_shape, old_properties)
 
     def on_text_edit_done(self, button):
         self._apply_and_hide_editor(force_apply=True)
@@ -2651,6 +2947,10 @@ class PdfEditorWindow(Adw.ApplicationWindow):
             self.pdf_view.queue_draw()
             return
 
+        if not self.page_objects_ready:
+            gesture.set_state(Gtk.EventSequenceState.DENIED)
+            return
+
         if self.tool_mode == "add_ellipse":
             gesture.set_state(Gtk.EventSequenceState.CLAIMED)
             self.dragging_to_create = True
@@ -2697,7 +2997,7 @@ class PdfEditorWindow(Adw.ApplicationWindow):
                 self.dragged_object = selected_obj
                 gesture.set_state(Gtk.EventSequenceState.CLAIMED)
                 self.drag_start_pos = (start_x, start_y)
-                self.drag_begin_state = copy.deepcopy(selected_obj.__dict__)
+                self.drag_begin_state = capture_state(selected_obj)
                 return
 
         if self.tool_mode == "drag":
@@ -2705,6 +3005,8 @@ class PdfEditorWindow(Adw.ApplicationWindow):
             if not self.dragged_object:
                 gesture.set_state(Gtk.EventSequenceState.DENIED)
                 return
+            if isinstance(self.dragged_object, EditableShape):
+                pdf_handler.load_shape_paths(self.doc, self.dragged_object)
         elif self.tool_mode == "select":
             gesture.set_state(Gtk.EventSequenceState.DENIED)
             return
@@ -2715,7 +3017,7 @@ class PdfEditorWindow(Adw.ApplicationWindow):
         if self.dragged_object:
             gesture.set_state(Gtk.EventSequenceState.CLAIMED)
             self.drag_start_pos = (start_x, start_y)
-            self.drag_begin_state = copy.deepcopy(self.dragged_object.__dict__)
+            self.drag_begin_state = capture_state(self.dragged_object)
 
         if self.dragged_object:
             if not hasattr(self.dragged_object, 'original_bbox') or not self.dragged_object.original_bbox:
@@ -2897,13 +3199,11 @@ class PdfEditorWindow(Adw.ApplicationWindow):
                 self.selected_image = None
                 
                 command = AddObjectCommand(self, self.temp_shape)
-                command.execute()
-                self.undo_manager.add_command(command)
+                self._run_command(command)
                 self.document_modified = True
                 
                 self.temp_shape.is_baked = True
                 self.temp_shape = None
-                self._refresh_thumbnail(self.current_page_index)
                 
                 self.pdf_view.queue_draw()
                 self._update_ui_state()
@@ -2944,8 +3244,7 @@ class PdfEditorWindow(Adw.ApplicationWindow):
                                 self.selected_text = None
                                 self.selected_shape = None
                                 command = AddObjectCommand(self, image_obj)
-                                command.execute()
-                                self.undo_manager.add_command(command)
+                                self._run_command(command)
                                 self.document_modified = True
                                 self.pdf_view.queue_draw()
                                 self._update_ui_state()
@@ -2971,7 +3270,7 @@ class PdfEditorWindow(Adw.ApplicationWindow):
 
         old_properties = self.drag_begin_state
         
-        new_properties = copy.deepcopy(self.dragged_object.__dict__)
+        new_properties = capture_state(self.dragged_object)
 
         dragged_obj_ref = self.dragged_object
         self.dragged_object = None
@@ -2986,8 +3285,8 @@ class PdfEditorWindow(Adw.ApplicationWindow):
         print("DEBUG: Sürükleme işlemi için bir komut oluşturuluyor.")
         command = EditObjectCommand(self, dragged_obj_ref, old_properties, new_properties)
         
-        command.execute()
-        self.undo_manager.add_command(command)
+        self._run_command(command)
+        self._reindex_object(dragged_obj_ref)
 
         if isinstance(dragged_obj_ref, EditableText):
             self.selected_text = dragged_obj_ref
@@ -3059,8 +3358,17 @@ class PdfEditorWindow(Adw.ApplicationWindow):
         dialog.present()
 
     def _update_undo_redo_buttons(self, *args):
-        self.undo_button.set_sensitive(bool(self.undo_manager.undo_stack))
-        self.redo_button.set_sensitive(bool(self.undo_manager.redo_stack))
+        undo_count = len(self.undo_manager.undo_stack)
+        redo_count = len(self.undo_manager.redo_stack)
+        self.undo_button.set_sensitive(bool(undo_count))
+        self.redo_button.set_sensitive(bool(redo_count))
+        if undo_count or redo_count:
+            size_mb = f"{self.undo_manager.memory_usage() / (1024 * 1024):.1f}"
+            self.undo_button.set_tooltip_text(_("undo_history_tip").format(_("undo_tip"), undo_count, redo_count, size_mb))
+            self.redo_button.set_tooltip_text(_("undo_history_tip").format(_("redo_tip"), undo_count, redo_count, size_mb))
+        else:
+            self.undo_button.set_tooltip_text(_("undo_tip"))
+            self.redo_button.set_tooltip_text(_("redo_tip"))
 
     def _refresh_thumbnail(self, page_index):
         if not self.doc or not (0 <= page_index < pdf_handler.get_page_count(self.doc)):
@@ -3080,15 +3388,71 @@ class PdfEditorWindow(Adw.ApplicationWindow):
         except Exception as e:
             print(f"Warning: Could not refresh thumbnail for page {page_index + 1}: {e}")
     
+    def _run_command(self, command):
+        self._commit_format_preview()
+        with self.undo_manager.transaction():
+            command.execute()
+            self.undo_manager.add_command(command)
+
+    def _schedule_format_preview(self, obj, committed_state):
+        if self.format_preview_obj is not obj:
+            self._commit_format_preview()
+            self._isolate_preview_source(obj, committed_state)
+            self.format_preview_obj = obj
+            self.format_preview_state = committed_state
+        if self.format_preview_source:
+            GLib.source_remove(self.format_preview_source)
+        self.format_preview_source = GLib.timeout_add(FORMAT_PREVIEW_DELAY_MS, self._on_format_preview_timeout)
+        self.pdf_view.queue_draw()
+
+    def _on_format_preview_timeout(self):
+        self.format_preview_source = None
+        self._commit_format_preview()
+        return GLib.SOURCE_REMOVE
+
+    def _commit_format_preview(self):
+        obj = self.format_preview_obj
+        if obj is None:
+            return
+        if self.format_preview_source:
+            GLib.source_remove(self.format_preview_source)
+            self.format_preview_source = None
+        committed_state = self.format_preview_state
+        self.format_preview_obj = None
+        self.format_preview_state = None
+
+        new_properties = capture_state(obj)
+        if new_properties != committed_state:
+            restore_state(obj, committed_state)
+            command = EditObjectCommand(self, obj, committed_state, new_properties)
+            self._run_command(command)
+        if obj is self.pending_format_change_obj:
+            self.before_format_change_state = capture_state(obj)
+        self.pdf_view.queue_draw()
+        self._update_ui_state()
+
+    def _isolate_preview_source(self, obj, committed_state):
+        if pdf_handler.has_object_layer(self.doc, obj):
+            return
+        committed = copy.copy(obj)
+        restore_state(committed, committed_state)
+        if not getattr(obj, 'is_new', True) and not getattr(obj, '_ghost_redacted', False):
+            success, error = pdf_handler.erase_original_object(self.doc, obj.page_number, committed)
+            if not success:
+                print(f"Warning: could not isolate preview source on page {obj.page_number}: {error}")
+                return
+            obj._ghost_redacted = True
+        pdf_handler.apply_object_edit(self.doc, committed, owner=obj)
+
     def commit_pending_format_change(self):
+        self._commit_format_preview()
         if self.pending_format_change_obj and self.before_format_change_state:
-            current_state = copy.deepcopy(self.pending_format_change_obj.__dict__)
+            current_state = capture_state(self.pending_format_change_obj)
             
             if self.before_format_change_state != current_state:
                 print("DEBUG: Bekleyen format değişikliği bir komut olarak kaydediliyor.")
                 command = EditObjectCommand(self, self.pending_format_change_obj, self.before_format_change_state, current_state)
-                command.execute()
-                self.undo_manager.add_command(command)
+                self._run_command(command)
 
         self.pending_format_change_obj = None
         self.before_format_change_state = None
@@ -3097,7 +3461,8 @@ class PdfEditorWindow(Adw.ApplicationWindow):
         if self.check_unsaved_changes():
             return
 
-        self.close_document()
+        if not self.close_document(self.on_new_clicked):
+            return
 
         doc, error_msg = pdf_handler.create_new_pdf()
 
@@ -3119,8 +3484,7 @@ class PdfEditorWindow(Adw.ApplicationWindow):
         if self.check_unsaved_changes():
             return True
         else:
-            self.close_document()
-            return False
+            return not self.close_document(self.close)
     def on_stroke_width_scroll(self, controller, dx, dy):
         if not self.selected_shape:
             return False
@@ -3158,11 +3522,7 @@ class PdfEditorWindow(Adw.ApplicationWindow):
             target_rect = self.view_sel_rect
         elif not self.view_mode and self.selected_text and self.selected_text.bbox:
             if getattr(self, 'word_selection_mode', False) and hasattr(self, 'selected_word_start_char'):
-                text = self.selected_text.text
-                r1 = self.selected_word_start_char / max(len(text), 1)
-                r2 = self.selected_word_end_char / max(len(text), 1)
-                x1, y1, x2, y2 = self.selected_text.bbox
-                target_rect = (x1 + (x2 - x1) * r1, y1, x1 + (x2 - x1) * r2, y2)
+                target_rect = text_metrics.range_bbox(self.selected_text, self.selected_word_start_char, self.selected_word_end_char)
             else:
                 target_rect = self.selected_text.bbox
             
@@ -3191,11 +3551,7 @@ class PdfEditorWindow(Adw.ApplicationWindow):
             target_rect = self.view_sel_rect
         elif not self.view_mode and self.selected_text and self.selected_text.bbox:
             if getattr(self, 'word_selection_mode', False) and hasattr(self, 'selected_word_start_char'):
-                text = self.selected_text.text
-                r1 = self.selected_word_start_char / max(len(text), 1)
-                r2 = self.selected_word_end_char / max(len(text), 1)
-                x1, y1, x2, y2 = self.selected_text.bbox
-                target_rect = (x1 + (x2 - x1) * r1, y1, x1 + (x2 - x1) * r2, y2)
+                target_rect = text_metrics.range_bbox(self.selected_text, self.selected_word_start_char, self.selected_word_end_char)
             else:
                 target_rect = self.selected_text.bbox
             
@@ -3240,7 +3596,7 @@ class PdfEditorWindow(Adw.ApplicationWindow):
                 self.word_selection_mode = True
                 self.pdf_view.queue_draw()
                 self._update_ui_state()
-        else:
+        elif self.page_objects_ready:
             clicked_text = self._find_text_at_pos(page_x, page_y)
             if clicked_text:
                 self.selected_text = clicked_text
@@ -3253,23 +3609,20 @@ class PdfEditorWindow(Adw.ApplicationWindow):
                         self.selected_word_end_char = idx + len(self.selected_word)
                         self.word_selection_mode = True
                         self.pending_format_change_obj = clicked_text
-                        self.before_format_change_state = copy.deepcopy(clicked_text.__dict__)
+                        self.before_format_change_state = capture_state(clicked_text)
                         self.pdf_view.queue_draw()
                         self._update_ui_state()
                 else:
-                    x1, y1, x2, y2 = clicked_text.bbox
-                    relative_x = (page_x - x1) / (x2 - x1) if (x2 - x1) > 0 else 0
-                    approx_char_pos = int(relative_x * len(clicked_text.text))
-                    approx_char_pos = max(0, min(approx_char_pos, len(clicked_text.text)))
+                    char_pos = text_metrics.char_index_at(clicked_text, page_x)
                     
-                    word, start_pos, end_pos = self._extract_word_at_position(clicked_text.text, approx_char_pos)
+                    word, start_pos, end_pos = self._extract_word_at_position(clicked_text.text, char_pos)
                     if word:
                         self.selected_word = word
                         self.selected_word_start_char = start_pos
                         self.selected_word_end_char = end_pos
                         self.word_selection_mode = True
                         self.pending_format_change_obj = clicked_text
-                        self.before_format_change_state = copy.deepcopy(clicked_text.__dict__)
+                        self.before_format_change_state = capture_state(clicked_text)
                         self.pdf_view.queue_draw()
                         self._update_ui_state()
 
@@ -3393,6 +3746,7 @@ class PdfEditorWindow(Adw.ApplicationWindow):
             popover_box.append(btn_del)
             
         elif clicked_shape:
+            pdf_handler.load_shape_paths(self.doc, clicked_shape)
             self.selected_shape = clicked_shape
             self.selected_text = None
             self.selected_image = None
@@ -3458,8 +3812,7 @@ class PdfEditorWindow(Adw.ApplicationWindow):
             if self.selected_text or self.selected_shape:
                 obj_to_delete = self.selected_text or self.selected_shape
                 command = DeleteObjectCommand(self, obj_to_delete)
-                command.execute()
-                self.undo_manager.add_command(command)
+                self._run_command(command)
                 self.selected_text = None
                 self.selected_shape = None
                 self._update_ui_state()
@@ -3476,11 +3829,12 @@ class PdfEditorWindow(Adw.ApplicationWindow):
                 self._remove_highlight_at_region(obj.bbox)
         elif action == "paste_new_text":
             page_x, page_y = obj
+            page_index = self.current_page_index
             clipboard = self.get_clipboard()
             def _on_paste_finished(cb, task):
                 try:
                     text = cb.read_text_finish(task)
-                    if text and text.strip():
+                    if text and text.strip() and page_index == self.current_page_index:
                         self._create_text_from_paste(page_x, page_y, text)
                 except Exception:
                     pass
@@ -3514,8 +3868,7 @@ class PdfEditorWindow(Adw.ApplicationWindow):
         new_obj.page_number = self.current_page_index
         
         command = AddObjectCommand(self, new_obj)
-        command.execute()
-        self.undo_manager.add_command(command)
+        self._run_command(command)
         self.selected_text = new_obj
         self.view_sel_rect = None
         self.view_selected_text = None
@@ -3528,8 +3881,7 @@ class PdfEditorWindow(Adw.ApplicationWindow):
             old_properties = {'is_bold': text_obj.is_bold, 'bbox': text_obj.bbox}
             new_properties = {'is_bold': not text_obj.is_bold, 'bbox': text_obj.bbox}
             command = EditObjectCommand(self, text_obj, old_properties, new_properties)
-            command.execute()
-            self.undo_manager.add_command(command)
+            self._run_command(command)
             self.document_modified = True
             self.pdf_view.queue_draw()
             if hasattr(self, 'context_popover') and self.context_popover:
@@ -3541,8 +3893,7 @@ class PdfEditorWindow(Adw.ApplicationWindow):
             old_properties = {'is_italic': text_obj.is_italic, 'bbox': text_obj.bbox}
             new_properties = {'is_italic': not text_obj.is_italic, 'bbox': text_obj.bbox}
             command = EditObjectCommand(self, text_obj, old_properties, new_properties)
-            command.execute()
-            self.undo_manager.add_command(command)
+            self._run_command(command)
             self.document_modified = True
             self.pdf_view.queue_draw()
             if hasattr(self, 'context_popover') and self.context_popover:
@@ -3555,8 +3906,7 @@ class PdfEditorWindow(Adw.ApplicationWindow):
             old_properties = {'is_underline': old_val, 'bbox': text_obj.bbox}
             new_properties = {'is_underline': not old_val, 'bbox': text_obj.bbox}
             command = EditObjectCommand(self, text_obj, old_properties, new_properties)
-            command.execute()
-            self.undo_manager.add_command(command)
+            self._run_command(command)
             self.document_modified = True
             self.pdf_view.queue_draw()
             if hasattr(self, 'context_popover') and self.context_popover:
@@ -3579,8 +3929,7 @@ class PdfEditorWindow(Adw.ApplicationWindow):
             
         if show_confirm_dialog(self, confirm_text, confirm_title, destructive=True):
             command = DeleteObjectCommand(self, obj)
-            command.execute()
-            self.undo_manager.add_command(command)
+            self._run_command(command)
             self.selected_text = None
             self.selected_image = None
             self.selected_shape = None
@@ -3591,31 +3940,17 @@ class PdfEditorWindow(Adw.ApplicationWindow):
     def _remove_highlight_at_region(self, bbox):
         if not self.doc:
             return
-        try:
-            page = self.doc.load_page(self.current_page_index)
-            x1, y1, x2, y2 = bbox
-            rect = fitz.Rect(x1, y1, x2, y2)
-            annots = page.annots()
-            removed_count = 0
-            if annots:
-                for annot in annots:
-                    annot_type = annot.type[0]
-                    if annot_type == 8:
-                        annot_rect = annot.rect
-                        if rect.intersects(annot_rect):
-                            page.delete_annot(annot)
-                            removed_count += 1
-            
-            if removed_count > 0:
-                self.document_modified = True
-                self._refresh_thumbnail(self.current_page_index)
-                self._update_ui_state()
-                self.pdf_view.queue_draw()
-        except Exception as e:
-            print(f"Error removing highlight: {e}")
+        success, removed_count = pdf_handler.remove_highlight_annotations(self.doc, self.current_page_index, bbox)
+        if not success:
+            print(f"Error removing highlight: {removed_count}")
+        elif removed_count > 0:
+            self.document_modified = True
+            self._refresh_thumbnail(self.current_page_index)
+            self._update_ui_state()
+            self.pdf_view.queue_draw()
 
     def _create_text_from_paste(self, page_x, page_y, text):
-        if not self.doc or not text or not text.strip():
+        if not self.doc or not self.page_objects_ready or not text or not text.strip():
             return
         
         try:
@@ -3641,11 +3976,9 @@ class PdfEditorWindow(Adw.ApplicationWindow):
             
             self.editable_texts.append(new_text)
             command = AddObjectCommand(self, new_text)
-            command.execute()
-            self.undo_manager.add_command(command)
+            self._run_command(command)
             
             self.document_modified = True
-            self._refresh_thumbnail(self.current_page_index)
             self._update_ui_state()
             self.pdf_view.queue_draw()
             